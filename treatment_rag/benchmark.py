@@ -0,0 +1,357 @@
+"""
+检索基准测试脚本
+
+生成合成的病例报告/指南语料，构建索引并报告：
+- 入库吞吐（文件加载、分块、向量化、索引构建）
+- 索引磁盘占用
+- hybrid_search / metadata_filtered_search 的 p50/p95/p99 延迟
+- 向量检索相对精确检索的 recall@k
+
+用法:
+    python benchmark.py --cases 2000 --guideline-parts 500 --model BAAI/bge-small-zh-v1.5
+"""
+
+import argparse
+import json
+import logging
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+# 添加模块路径
+sys.path.append(str(Path(__file__).parent))
+
+from rag_modules import (
+    DataPreparationModule,
+    GuidelineDataPreparationModule,
+    IndexConstructionModule,
+    RetrievalOptimizationModule,
+    VectorIndexParams
+)
+
+logger = logging.getLogger(__name__)
+
+# 合成语料使用的词表
+CONDITIONS = {
+    'fracture': ['胸腰椎骨折', '压缩性骨折', 'burst fracture', 'odontoid fracture', 'Chance fracture'],
+    'hemangioma': ['椎体血管瘤', 'aggressive hemangioma', 'vertebral hemangioma'],
+    'infection': ['脊柱结核', '化脓性脊柱炎', 'spondylodiscitis', 'epidural abscess'],
+    'intervertebral': ['腰椎间盘突出', '颈椎病', 'disc herniation', 'cervical spondylotic myelopathy'],
+    'malignant_tumor': ['脊柱转移瘤', '多发性骨髓瘤', 'chordoma', 'metastatic spinal cord compression'],
+    'others': ['强直性脊柱炎', '脊柱侧弯', 'ankylosing spondylitis', 'degenerative scoliosis'],
+}
+LEVELS = ['C1-C2', 'C4-C5', 'C5-C6', 'T4', 'T11-T12', 'L1', 'L3-L4', 'L4-L5', 'L5-S1']
+FINDINGS = ['MRI显示脊髓受压', 'CT提示椎体骨质破坏', 'X-ray showed kyphotic deformity', '神经功能ASIA分级C级',
+            'elevated CRP and ESR', 'VAS评分7分', 'JOA score improved', '术后随访12个月无复发']
+TREATMENTS = ['后路椎弓根螺钉内固定', '前路椎间盘切除融合术(ACDF)', 'percutaneous vertebroplasty',
+              '经皮椎体后凸成形术(PKP)', 'stereotactic body radiotherapy', '抗结核治疗12个月',
+              'decompressive laminectomy', '保守治疗联合支具固定']
+GUIDELINE_BOOKS = ['AdultIsthmicSpondylolisthesis', 'LumbarDiscHerniationWithRadiculopathy',
+                   'CervicalSpondyloticMyelopathy', 'MetastaticSpineDisease']
+GUIDELINE_CHAPTERS = ['A_Definition_Natural_History', 'B_Diagnosis_Imaging', 'C_Outcome_Measures',
+                      'D_Medical_Interventional_Treatment', 'E_Surgical_Treatment']
+
+
+def _sentence(rng: random.Random, condition: str) -> str:
+    """生成一句合成的临床描述"""
+    return (f"{rng.choice(LEVELS)} {condition}，{rng.choice(FINDINGS)}，"
+            f"给予{rng.choice(TREATMENTS)}，{rng.choice(FINDINGS)}。")
+
+
+def generate_synthetic_corpus(root: Path, num_cases: int, num_guideline_parts: int, seed: int = 42) -> Dict[str, Path]:
+    """
+    生成合成语料
+
+    病例报告: root/case_reports/<分类>/<病例ID>/pubmed_pdf.md（与清洗脚本产出的目录结构一致）
+    指南: root/guidelines/<书名>/<序号_章节名>/partN.md
+
+    Args:
+        root: 输出根目录
+        num_cases: 病例报告数量
+        num_guideline_parts: 指南分卷文件数量
+        seed: 随机种子
+
+    Returns:
+        两个语料的根目录
+    """
+    rng = random.Random(seed)
+    case_root = root / "case_reports"
+    guideline_root = root / "guidelines"
+
+    categories = list(CONDITIONS.keys())
+    for i in range(num_cases):
+        category = categories[i % len(categories)]
+        condition = rng.choice(CONDITIONS[category])
+        case_dir = case_root / category / f"case_{i:06d}"
+        case_dir.mkdir(parents=True, exist_ok=True)
+
+        sections = [f"# {condition}病例报告 {i}"]
+        for header in ['病例资料', '影像学检查', '治疗经过', '讨论']:
+            body = "".join(_sentence(rng, condition) for _ in range(rng.randint(3, 8)))
+            sections.append(f"## {header}\n\n{body}")
+        (case_dir / "pubmed_pdf.md").write_text("\n\n".join(sections), encoding="utf-8")
+
+    for i in range(num_guideline_parts):
+        book = GUIDELINE_BOOKS[i % len(GUIDELINE_BOOKS)]
+        chapter = GUIDELINE_CHAPTERS[(i // len(GUIDELINE_BOOKS)) % len(GUIDELINE_CHAPTERS)]
+        part_index = i // (len(GUIDELINE_BOOKS) * len(GUIDELINE_CHAPTERS)) + 1
+        chapter_dir = guideline_root / book / chapter
+        chapter_dir.mkdir(parents=True, exist_ok=True)
+
+        condition = rng.choice(rng.choice(list(CONDITIONS.values())))
+        sections = [f"# {chapter.split('_', 1)[1].replace('_', ' ')}"]
+        for q in range(rng.randint(2, 4)):
+            sections.append(f"## Question {q + 1}\n\nWhat is the role of {rng.choice(TREATMENTS)} in {condition}?")
+            sections.append("### Recommendation\n\n" + " ".join(_sentence(rng, condition) for _ in range(rng.randint(2, 5))))
+        (chapter_dir / f"part{part_index}.md").write_text("\n\n".join(sections), encoding="utf-8")
+
+    return {"case_report": case_root, "guidelines": guideline_root}
+
+
+def _dir_size(path: Path) -> int:
+    """目录占用字节数"""
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+    """延迟分位数（毫秒）"""
+    values = np.asarray(latencies) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+    }
+
+
+def _time_calls(fn, queries: List[Any], warmup: int = 3) -> Dict[str, float]:
+    """逐条计时，先预热若干次"""
+    for query in queries[:warmup]:
+        fn(query)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        latencies.append(time.perf_counter() - start)
+    return _percentiles(latencies)
+
+
+def _make_queries(chunks, num_queries: int, rng: random.Random) -> List[str]:
+    """从文档块中截取片段作为查询"""
+    queries = []
+    for chunk in rng.sample(chunks, min(num_queries, len(chunks))):
+        text = " ".join(chunk.page_content.split())
+        start = rng.randint(0, max(0, len(text) - 40))
+        queries.append(text[start:start + 40])
+    return queries
+
+
+def recall_at_k(index_module: IndexConstructionModule, chunk_vectors: np.ndarray, chunk_ids: List[str],
+                queries: List[str], k: int) -> float:
+    """
+    向量检索相对精确检索（全量内积/L2暴力搜索）的 recall@k
+
+    Args:
+        index_module: 已构建向量索引的索引构建模块
+        chunk_vectors: 全部文档块向量（与chunk_ids对齐）
+        chunk_ids: 文档块ID
+        queries: 查询列表
+        k: 截断位置
+
+    Returns:
+        平均召回率
+    """
+    recalls = []
+    for query in queries:
+        query_vector = np.asarray(index_module.embeddings.embed_query(query), dtype=np.float32)
+        distances = ((chunk_vectors - query_vector) ** 2).sum(axis=1)
+        exact = {chunk_ids[i] for i in np.argsort(distances)[:k]}
+        approx = index_module.vectorstore.similarity_search_by_vector(query_vector.tolist(), k=k)
+        found = {doc.metadata.get("chunk_id") for doc in approx}
+        recalls.append(len(exact & found) / len(exact))
+    return float(np.mean(recalls))
+
+
+def benchmark_corpus(name: str, data_module, args, work_dir: Path, rng: random.Random) -> Dict[str, Any]:
+    """对单个语料执行入库、建索引和检索测试"""
+    result: Dict[str, Any] = {"corpus": name}
+    data_bytes = _dir_size(data_module.data_path)
+
+    start = time.perf_counter()
+    documents = data_module.load_documents()
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunks = data_module.chunk_documents()
+    chunk_seconds = time.perf_counter() - start
+
+    index_dir = work_dir / f"{name}_index"
+    index_module = IndexConstructionModule(
+        model_name=args.model,
+        index_save_path=str(index_dir),
+        bm25_tokenizer=args.bm25_tokenizer,
+        embedding_cache_path=str(work_dir / f"{name}_embedding_cache"),
+        index_params=VectorIndexParams(
+            index_type=args.index_type,
+            nlist=args.nlist,
+            nprobe=args.nprobe,
+            pq_m=args.pq_m,
+            hnsw_m=args.hnsw_m,
+            hnsw_ef_search=args.ef_search
+        ),
+        embedding_dim=args.embedding_dim
+    )
+
+    # 先单独向量化（写入嵌入缓存），再构建索引，分别计时
+    texts = [chunk.page_content for chunk in chunks]
+    start = time.perf_counter()
+    chunk_vectors = index_module.embed_texts(texts)
+    embed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_module.build_vector_index(chunks)
+    vector_index_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_module.build_bm25_index(chunks)
+    bm25_seconds = time.perf_counter() - start
+
+    index_module.save_index()
+    faiss_bytes = sum((index_dir / f).stat().st_size for f in ("index.faiss", "index.pkl") if (index_dir / f).exists())
+
+    result["ingest"] = {
+        "files": len(documents),
+        "chunks": len(chunks),
+        "data_mb": data_bytes / 1024 / 1024,
+        "load_files_per_s": len(documents) / max(load_seconds, 1e-9),
+        "load_mb_per_s": data_bytes / 1024 / 1024 / max(load_seconds, 1e-9),
+        "chunk_seconds": chunk_seconds,
+        "embed_chunks_per_s": len(chunks) / max(embed_seconds, 1e-9),
+        "vector_index_seconds": vector_index_seconds,
+        "bm25_index_seconds": bm25_seconds,
+    }
+    result["index_size"] = {
+        "faiss_mb": faiss_bytes / 1024 / 1024,
+        "total_mb": _dir_size(index_dir) / 1024 / 1024,
+        "vector_dim": int(index_module.vectorstore.index.d),
+        "index_type": args.index_type,
+    }
+
+    retrieval_module = RetrievalOptimizationModule(
+        index_module.vectorstore,
+        chunks,
+        bm25_index=index_module.bm25_index,
+        tokenizer=index_module.tokenizer,
+        token_cache=index_module.token_cache,
+        concurrent=not args.sequential
+    )
+    try:
+        queries = _make_queries(chunks, args.queries, rng)
+        result["hybrid_search"] = _time_calls(lambda q: retrieval_module.hybrid_search(q, args.top_k), queries)
+
+        if name == "case_report":
+            categories = sorted({chunk.metadata.get("category") for chunk in chunks if chunk.metadata.get("category")})
+            filtered_queries = [(query, {"category": rng.choice(categories)}) for query in queries]
+            result["metadata_filtered_search"] = _time_calls(
+                lambda item: retrieval_module.metadata_filtered_search(item[0], item[1], args.top_k),
+                filtered_queries
+            )
+
+        chunk_ids = [chunk.metadata.get("chunk_id") for chunk in chunks]
+        result[f"recall@{args.recall_k}"] = recall_at_k(
+            index_module, chunk_vectors, chunk_ids, queries[:args.recall_queries], args.recall_k
+        )
+    finally:
+        retrieval_module.close()
+
+    return result
+
+
+def print_report(results: List[Dict[str, Any]]):
+    """打印测试报告"""
+    for result in results:
+        print(f"\n===== {result['corpus']} =====")
+        ingest = result["ingest"]
+        print(f"📥 入库: {ingest['files']} 个文件 ({ingest['data_mb']:.1f} MB), {ingest['chunks']} 个文档块")
+        print(f"   加载 {ingest['load_files_per_s']:.1f} 文件/秒 ({ingest['load_mb_per_s']:.2f} MB/秒), "
+              f"分块 {ingest['chunk_seconds']:.2f} 秒")
+        print(f"   向量化 {ingest['embed_chunks_per_s']:.1f} 块/秒, 向量索引 {ingest['vector_index_seconds']:.2f} 秒, "
+              f"BM25索引 {ingest['bm25_index_seconds']:.2f} 秒")
+
+        size = result["index_size"]
+        print(f"💾 索引: {size['index_type']} (维度 {size['vector_dim']}), FAISS {size['faiss_mb']:.2f} MB, "
+              f"目录总计 {size['total_mb']:.2f} MB")
+
+        for key in ("hybrid_search", "metadata_filtered_search"):
+            if key in result:
+                stats = result[key]
+                print(f"⏱️  {key}: p50 {stats['p50_ms']:.2f} ms, p95 {stats['p95_ms']:.2f} ms, "
+                      f"p99 {stats['p99_ms']:.2f} ms")
+
+        for key, value in result.items():
+            if key.startswith("recall@"):
+                print(f"🎯 {key}: {value:.4f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="RAG检索基准测试（合成语料，离线运行）")
+    parser.add_argument("--cases", type=int, default=1000, help="合成病例报告数量")
+    parser.add_argument("--guideline-parts", type=int, default=200, help="合成指南分卷文件数量")
+    parser.add_argument("--model", default="BAAI/bge-small-zh-v1.5", help="嵌入模型名称或本地路径")
+    parser.add_argument("--embedding-dim", type=int, default=None, help="Matryoshka截断维度")
+    parser.add_argument("--index-type", default="flat", help="向量索引类型: flat / ivf_flat / ivf_pq / hnsw / sq8 / fp16")
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--pq-m", type=int, default=64)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--bm25-tokenizer", default="mixed")
+    parser.add_argument("--workers", type=int, default=1, help="加载文件的并行进程数")
+    parser.add_argument("--sequential", action="store_true", help="两路检索串行执行")
+    parser.add_argument("--queries", type=int, default=200, help="延迟测试的查询数")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--recall-k", type=int, default=10)
+    parser.add_argument("--recall-queries", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--work-dir", default=None, help="工作目录（默认使用临时目录，结束后删除）")
+    parser.add_argument("--output", default=None, help="结果JSON输出路径")
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix="rag_benchmark_"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(args.seed)
+
+    try:
+        print(f"📝 正在生成合成语料: {args.cases} 个病例报告, {args.guideline_parts} 个指南分卷 -> {work_dir}")
+        roots = generate_synthetic_corpus(work_dir / "data", args.cases, args.guideline_parts, args.seed)
+
+        data_modules = {
+            "case_report": DataPreparationModule(str(roots["case_report"]), num_workers=args.workers),
+            "guidelines": GuidelineDataPreparationModule(str(roots["guidelines"]), num_workers=args.workers),
+        }
+        results = [benchmark_corpus(name, module, args, work_dir, rng) for name, module in data_modules.items()]
+        print_report(results)
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            print(f"\n结果已保存到: {args.output}")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ RAG系统配置文件
 """
 
 from dataclasses import dataclass
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 @dataclass
 class RAGConfig:
@@ -14,17 +14,65 @@ class RAGConfig:
     guidelines_data_path = "/home/syd/remote/rag/English_guidelines_data"
     index_save_path: str = "/home/syd/remote/rag/case_report_vector_index"
     guidelines_index_save_path: str = "/home/syd/remote/rag/guidelines_vector_index"
+    embedding_cache_path: str = "/home/syd/remote/rag/embedding_cache"  # 文档嵌入缓存目录，为空时不使用缓存
+
+    # 数据加载配置
+    ingest_workers: int = 1  # 并行加载/清洗文件的进程数，1表示串行
+    ingest_batch_size: int = 64  # 每批分发给工作进程的文件数
+    parent_cache_size: int = 128  # 父文档正文按需读取时的LRU缓存大小
 
     # 模型配置
     embedding_model: str = "/data/24T/Sunyuandong/Qwen3-Embedding-8B"
     llm_model: str = "deepseek-chat"
+    embedding_dim: Optional[int] = None  # Matryoshka截断维度（如256/512/1024），为空时使用模型完整维度
+
+    # 向量索引配置
+    vector_index_type: str = "flat"  # 索引类型: flat / ivf_flat / ivf_pq / hnsw / sq8 / fp16
+    ivf_nlist: int = 1024  # IVF聚类中心数
+    ivf_nprobe: int = 16  # IVF查询探测的聚类数，越大召回越高、越慢
+    pq_m: int = 64  # PQ子空间数，需整除向量维度
+    pq_nbits: int = 8  # PQ每个子空间的编码位数
+    hnsw_m: int = 32  # HNSW每个节点的邻居数
+    hnsw_ef_construction: int = 200  # HNSW构建时的搜索宽度
+    hnsw_ef_search: int = 64  # HNSW查询时的搜索宽度
+    index_train_sample_size: int = 100000  # 训练量化/聚类使用的采样向量数
 
     # 检索配置
     top_k: int = 3
+    bm25_tokenizer: str = "mixed"  # BM25分词器: whitespace / mixed（中英文混合）
+    concurrent_hybrid_search: bool = True  # 向量检索与BM25检索并发执行
+    retrieval_workers: int = 4  # 检索线程池大小（两个语料的检索模块共用）
+    async_workers: int = 16  # 异步问答中嵌入、检索等阻塞步骤的线程池大小
+    query_cache_mb: float = 64  # 查询向量缓存内存上限（MB），0表示不缓存
+    query_cache_ttl: Optional[float] = 3600  # 查询向量缓存过期秒数，为空时不过期
+
+    # 查询分析配置
+    combined_query_analysis: bool = True  # 一次LLM调用同时完成查询路由和重写（JSON输出）
+    local_query_router: bool = True  # 优先使用本地嵌入原型路由，置信度不足时再调用LLM
+    router_min_similarity: float = 0.3  # 本地路由的最低相似度
+    router_min_margin: float = 0.05  # 本地路由最高与次高相似度的最小差值
+    speculative_retrieval: bool = True  # LLM分析查询的同时用原问题预检索
+    speculative_reuse_threshold: float = 0.97  # 重写查询与原问题的向量相似度不低于该值时复用预检索结果
+
+    # 语义回答缓存配置
+    answer_cache_enabled: bool = True  # 是否启用语义回答缓存
+    answer_cache_threshold: float = 0.95  # 问题向量余弦相似度阈值
+    answer_cache_max_entries: int = 1000  # 最大缓存条目数
+    answer_cache_ttl: Optional[float] = 86400  # 缓存过期秒数，为空时不过期
+
+    # 服务配置
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    max_concurrent_requests: int = 32  # 同时处理的请求数上限
+    request_queue_timeout: float = 1.0  # 请求等待空闲处理槽的最长秒数，超时返回503
+    request_timeout: float = 120.0  # 单个请求的处理超时秒数，超时返回504
+    max_pending_blocking_tasks: int = 32  # 线程池中未完成的阻塞任务上限（含超时请求遗留的任务），达到时新请求返回503
 
     # 生成配置
     temperature: float = 0.1
     max_tokens: int = 2048
+    context_max_tokens: int = 3000  # 上下文token预算，按检索分数在文档之间分配
+    context_tokenizer: Optional[str] = "cl100k_base"  # 计算上下文token数的tiktoken编码名，未安装tiktoken时按字符估算
 
     def __post_init__(self):
         """初始化后的处理"""
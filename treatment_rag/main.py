@@ -4,21 +4,30 @@ RAG系统主程序
 
 import os
 import sys
+import asyncio
 import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+import numpy as np
 
 # 添加模块路径
 sys.path.append(str(Path(__file__).parent))
 
 from dotenv import load_dotenv
+from langchain_core.documents import Document
 from config import DEFAULT_CONFIG, RAGConfig
 from rag_modules import (
     DataPreparationModule,
     GuidelineDataPreparationModule,
     IndexConstructionModule,
     RetrievalOptimizationModule,
-    GenerationIntegrationModule
+    GenerationIntegrationModule,
+    EmbeddingQueryRouter,
+    SemanticAnswerCache,
+    VectorIndexParams
 )
 
 
@@ -50,6 +59,13 @@ class RecipeRAGSystem:
         self.case_report_retrieval_module = None
         self.guideline_retrieval_module = None
         self.generation_module = None
+        self.answer_cache = None
+        self.query_router = None
+        self.async_executor = None
+        self.search_executor = None  # 两个语料的检索模块共用，知识库刷新后继续复用
+        # 已提交到线程池、尚未完成的阻塞任务数（含排队中和执行中）
+        self.pending_blocking_tasks = 0
+        self._pending_lock = threading.Lock()
 
         # 检查数据路径
         if not Path(self.config.case_report_data_path).exists():
@@ -65,18 +81,40 @@ class RecipeRAGSystem:
 
         # 1. 初始化数据准备模块
         print("初始化数据准备模块...")
-        self.case_report_data_module = DataPreparationModule(self.config.case_report_data_path)
-        self.guideline_data_module = GuidelineDataPreparationModule(self.config.guidelines_data_path)
+        self.case_report_data_module = DataPreparationModule(
+            self.config.case_report_data_path,
+            num_workers=self.config.ingest_workers,
+            batch_size=self.config.ingest_batch_size,
+            parent_cache_size=self.config.parent_cache_size
+        )
+        self.guideline_data_module = GuidelineDataPreparationModule(
+            self.config.guidelines_data_path,
+            num_workers=self.config.ingest_workers,
+            batch_size=self.config.ingest_batch_size,
+            parent_cache_size=self.config.parent_cache_size
+        )
 
         # 2. 初始化索引构建模块
         print("初始化索引构建模块...")
         self.index_module = IndexConstructionModule(
             model_name=self.config.embedding_model,
-            index_save_path=self.config.index_save_path
+            index_save_path=self.config.index_save_path,
+            bm25_tokenizer=self.config.bm25_tokenizer,
+            embedding_cache_path=self._embedding_cache_dir("case_report"),
+            index_params=self._vector_index_params(),
+            embedding_dim=self.config.embedding_dim,
+            query_cache_mb=self.config.query_cache_mb,
+            query_cache_ttl=self.config.query_cache_ttl
         )
         self.guideline_index_module = IndexConstructionModule(
             model_name=self.config.embedding_model,
-            index_save_path=self.config.guidelines_index_save_path
+            index_save_path=self.config.guidelines_index_save_path,
+            bm25_tokenizer=self.config.bm25_tokenizer,
+            embedding_cache_path=self._embedding_cache_dir("guidelines"),
+            index_params=self._vector_index_params(),
+            embedding_dim=self.config.embedding_dim,
+            query_cache_mb=self.config.query_cache_mb,
+            query_cache_ttl=self.config.query_cache_ttl
         )
 
         # 3. 初始化生成集成模块
@@ -84,28 +122,75 @@ class RecipeRAGSystem:
         self.generation_module = GenerationIntegrationModule(
             model_name=self.config.llm_model,
             temperature=self.config.temperature,
-            max_tokens=self.config.max_tokens
+            max_tokens=self.config.max_tokens,
+            context_max_tokens=self.config.context_max_tokens,
+            context_tokenizer=self.config.context_tokenizer
         )
 
+        if self.config.local_query_router:
+            self.query_router = EmbeddingQueryRouter(
+                self.index_module.embeddings,
+                min_similarity=self.config.router_min_similarity,
+                min_margin=self.config.router_min_margin
+            )
+
+        if self.config.answer_cache_enabled:
+            self.answer_cache = SemanticAnswerCache(
+                threshold=self.config.answer_cache_threshold,
+                max_entries=self.config.answer_cache_max_entries,
+                ttl=self.config.answer_cache_ttl
+            )
+
         print("✅ 系统初始化完成！")
     
+    def _embedding_cache_dir(self, corpus_name: str):
+        """每个语料使用独立的嵌入缓存子目录"""
+        if not self.config.embedding_cache_path:
+            return None
+        return str(Path(self.config.embedding_cache_path) / corpus_name)
+
+    def _vector_index_params(self) -> VectorIndexParams:
+        """根据配置生成向量索引参数"""
+        return VectorIndexParams(
+            index_type=self.config.vector_index_type,
+            nlist=self.config.ivf_nlist,
+            nprobe=self.config.ivf_nprobe,
+            pq_m=self.config.pq_m,
+            pq_nbits=self.config.pq_nbits,
+            hnsw_m=self.config.hnsw_m,
+            hnsw_ef_construction=self.config.hnsw_ef_construction,
+            hnsw_ef_search=self.config.hnsw_ef_search,
+            train_sample_size=self.config.index_train_sample_size
+        )
+
     def build_knowledge_base(self):
         """构建知识库"""
         print("\n正在构建知识库...")
 
-        # 1. 尝试加载已保存的索引
+        # 1. 尝试加载已保存的索引（BM25索引随向量索引一同加载）
         vectorstore = self.index_module.load_index()
-        guidelines_vectorstore = self.guideline_data_module.load_index()
+        guidelines_vectorstore = self.guideline_index_module.load_index()
 
-        if vectorstore is not None:
+        if vectorstore is not None and guidelines_vectorstore is not None:
             print("✅ 成功加载已保存的向量索引！")
-            # 仍需要加载文档和分块用于检索模块
-            print("加载case_report文档...")
-            self.case_report_data_module.load_documents()
-            self.guideline_data_module.load_documents()
-            print("进行文本分块...")
-            chunks = self.case_report_data_module.chunk_documents()
-            guidelines_chunks = self.guideline_data_module.chunk_documents()
+            # 优先从索引目录下的文档存储加载父文档和子块，不再读取原始Markdown
+            for data_module, index_module in self._corpus_pairs():
+                if not data_module.load_store(index_module.index_save_path):
+                    print(f"未找到文档存储，重新加载并分块: {data_module.data_path}")
+                    data_module.load_documents()
+                    data_module.chunk_documents()
+                    data_module.save_store(index_module.index_save_path)
+
+                    # 旧索引没有语料清单时，按当前文件和索引中的子块补建
+                    if not index_module.manifest.entries:
+                        index_module.record_manifest(Path(data_module.data_path), data_module.documents)
+                        index_module.manifest.save(index_module.index_save_path)
+
+                # 向量库与数据模块共用同一批子块对象，正文不在内存中保留两份
+                index_module.share_chunk_documents(data_module.chunks)
+
+            chunks = self.case_report_data_module.chunks
+            guidelines_chunks = self.guideline_data_module.chunks
         else:
             print("未找到已保存的索引，开始构建新索引...")
 
@@ -119,19 +204,27 @@ class RecipeRAGSystem:
             chunks = self.case_report_data_module.chunk_documents()
             guidelines_chunks = self.guideline_data_module.chunk_documents()
 
-            # 4. 构建向量索引
+            # 4. 构建向量索引和BM25索引
             print("构建向量索引...")
             vectorstore = self.index_module.build_vector_index(chunks)
-            guidelines_vectorstore = self.guideline_data_module.build_vector_index(guidelines_chunks)
-
-            # 5. 保存索引
+            guidelines_vectorstore = self.guideline_index_module.build_vector_index(guidelines_chunks)
+            self.index_module.build_bm25_index(chunks)
+            self.guideline_index_module.build_bm25_index(guidelines_chunks)
+
+            # 5. 记录语料清单并保存索引
+            self.index_module.record_manifest(Path(self.case_report_data_module.data_path),
+                                              self.case_report_data_module.documents)
+            self.guideline_index_module.record_manifest(Path(self.guideline_data_module.data_path),
+                                                        self.guideline_data_module.documents)
             print("保存向量索引...")
             self.index_module.save_index()
+            self.guideline_index_module.save_index()
+            self.case_report_data_module.save_store(self.index_module.index_save_path)
+            self.guideline_data_module.save_store(self.guideline_index_module.index_save_path)
 
         # 6. 初始化检索优化模块
         print("初始化检索优化...")
-        self.case_report_retrieval_module = RetrievalOptimizationModule(vectorstore, chunks)
-        self.guideline_retrieval_module = RetrievalOptimizationModule(guidelines_vectorstore, guidelines_chunks)
+        self._setup_retrieval_modules(vectorstore, chunks, guidelines_vectorstore, guidelines_chunks)
 
         # 7. 显示统计信息
         stats = self.case_report_data_module.get_statistics()
@@ -142,6 +235,81 @@ class RecipeRAGSystem:
         # print(f"   疾病分类: {list(stats['categories'].keys())}")
 
         print("✅ 知识库构建完成！")
+
+    def _corpus_pairs(self):
+        """(数据准备模块, 索引构建模块) 对"""
+        return [
+            (self.case_report_data_module, self.index_module),
+            (self.guideline_data_module, self.guideline_index_module)
+        ]
+
+    def _setup_retrieval_modules(self, vectorstore, chunks, guidelines_vectorstore, guidelines_chunks):
+        """初始化两个语料的检索优化模块"""
+        for retrieval_module in [self.case_report_retrieval_module, self.guideline_retrieval_module]:
+            if retrieval_module is not None:
+                retrieval_module.close()
+        # 检索线程池独立于 async_executor：检索本身在 async_executor 中执行，再向同一线程池提交子任务可能死锁
+        if self.config.concurrent_hybrid_search and self.search_executor is None:
+            self.search_executor = ThreadPoolExecutor(
+                max_workers=self.config.retrieval_workers, thread_name_prefix="hybrid-search"
+            )
+
+        self.case_report_retrieval_module = RetrievalOptimizationModule(
+            vectorstore, chunks,
+            bm25_index=self.index_module.bm25_index,
+            tokenizer=self.index_module.tokenizer,
+            token_cache=self.index_module.token_cache,
+            concurrent=self.config.concurrent_hybrid_search,
+            vector_bitmaps=self.index_module.vector_bitmaps,
+            executor=self.search_executor
+        )
+        self.guideline_retrieval_module = RetrievalOptimizationModule(
+            guidelines_vectorstore, guidelines_chunks,
+            bm25_index=self.guideline_index_module.bm25_index,
+            tokenizer=self.guideline_index_module.tokenizer,
+            token_cache=self.guideline_index_module.token_cache,
+            concurrent=self.config.concurrent_hybrid_search,
+            vector_bitmaps=self.guideline_index_module.vector_bitmaps,
+            executor=self.search_executor
+        )
+
+        # 已保存的BM25索引缺失或过期时，持久化检索模块重建的索引
+        for index_module, retrieval_module in [
+            (self.index_module, self.case_report_retrieval_module),
+            (self.guideline_index_module, self.guideline_retrieval_module)
+        ]:
+            if retrieval_module.bm25_index is not index_module.bm25_index:
+                index_module.bm25_index = retrieval_module.bm25_index
+                index_module.save_bm25_index()
+
+    def refresh_knowledge_base(self):
+        """
+        增量刷新知识库：只读取、清洗、分块和向量化新增或修改的文件，并删除已删除文件的向量
+        """
+        if not all([self.case_report_retrieval_module, self.guideline_retrieval_module]):
+            raise ValueError("请先构建知识库")
+
+        print("\n正在增量刷新知识库...")
+        for data_module, index_module in self._corpus_pairs():
+            new_chunks, removed_chunk_ids = data_module.refresh_documents(index_module.manifest)
+            if not new_chunks and not removed_chunk_ids:
+                index_module.manifest.save(index_module.index_save_path)
+                continue
+
+            if removed_chunk_ids:
+                index_module.delete_documents(removed_chunk_ids)
+            if new_chunks:
+                index_module.add_documents(new_chunks)
+            index_module.build_bm25_index(data_module.chunks)
+            index_module.save_index()
+            data_module.save_store(index_module.index_save_path)
+            print(f"   {Path(data_module.data_path).name}: 新增 {len(new_chunks)} 个文本块，删除 {len(removed_chunk_ids)} 个文本块")
+
+        self._setup_retrieval_modules(
+            self.index_module.vectorstore, self.case_report_data_module.chunks,
+            self.guideline_index_module.vectorstore, self.guideline_data_module.chunks
+        )
+        print("✅ 知识库刷新完成！")
     
     def ask_question(self, question: str, stream: bool = False):
         """
@@ -159,28 +327,295 @@ class RecipeRAGSystem:
         
         print(f"\n❓ 用户问题: {question}")
 
-        # 1. 查询路由
-        route_type = self.generation_module.query_router(question)
-        print(f"🎯 查询类型: {route_type}")
+        # 0. 语义缓存：相似问题且索引未变化时直接返回已有回答
+        filters = self._extract_filters_from_query(question)
+        index_version = self._index_version()
+        cached, question_embedding = self._lookup_answer_cache(question, filters, index_version)
+        if cached is not None:
+            return iter([cached.answer]) if stream else cached.answer
+
+        # 1. 本地嵌入路由，置信度不足时交由LLM
+        route_type = self._route_locally(question, question_embedding)
 
-        # 2. 智能查询重写（根据路由类型）
-        if route_type == 'list':
-            # 列表查询保持原查询
-            rewritten_query = question
-            print(f"📝 列表查询保持原样: {question}")
-        else:
-            # 详细查询和一般查询使用智能重写
+        # 预检索：需要LLM分析查询时，先用原问题检索，与LLM调用并行
+        speculative = None
+        if self.config.speculative_retrieval and route_type != 'list':
+            speculative = self._submit_speculative(question, filters)
+
+        if self.config.combined_query_analysis and route_type is None:
+            # 1-2. 一次LLM调用同时完成查询路由和查询重写
             print("🤖 智能分析查询...")
-            rewritten_query = self.generation_module.query_rewrite(question)
+            route_type, rewritten_query = self.generation_module.analyze_query(question)
+            print(f"🎯 查询类型: {route_type}")
+        else:
+            # 1. 查询路由
+            if route_type is None:
+                route_type = self.generation_module.query_router(question)
+            print(f"🎯 查询类型: {route_type}")
+
+            # 2. 智能查询重写（根据路由类型）
+            if route_type == 'list':
+                # 列表查询保持原查询
+                rewritten_query = question
+                print(f"📝 列表查询保持原样: {question}")
+            else:
+                # 详细查询和一般查询使用智能重写
+                print("🤖 智能分析查询...")
+                rewritten_query = self.generation_module.query_rewrite(question)
+
+        # 3-5. 检索相关子块并获取完整文档（重写结果与原问题相同或相近时复用预检索结果）
+        relevant_chunks = None
+        if speculative is not None:
+            if self._can_reuse_speculative(question, rewritten_query, question_embedding):
+                relevant_chunks = self._speculative_result(speculative)
+            else:
+                # 尽力取消：尚未开始执行时直接取消，已在执行时让其完成并丢弃结果
+                speculative.cancel()
+        relevant_chunks, relevant_docs = self._retrieve_documents(rewritten_query, filters, relevant_chunks)
+        if not relevant_chunks:
+            return "抱歉，没有找到相关的疾病信息。请尝试其他疾病名称或关键词。"
 
-        # 3. 检索相关子块（自动应用元数据过滤）
-        print("🔍 检索相关文档...")
+        print("✍️ 生成详细回答...")
+
+        # 根据路由类型自动选择回答模式
+        if route_type == "detail":
+            # 详细查询使用分步指导模式
+            if stream:
+                answer = self.generation_module.generate_step_by_step_answer_stream(question, relevant_docs, relevant_chunks)
+            else:
+                answer = self.generation_module.generate_step_by_step_answer(question, relevant_docs, relevant_chunks)
+        else:
+            # 一般查询使用基础回答模式
+            if stream:
+                answer = self.generation_module.generate_basic_answer_stream(question, relevant_docs, relevant_chunks)
+            else:
+                answer = self.generation_module.generate_basic_answer(question, relevant_docs, relevant_chunks)
+
+        if question_embedding is None:
+            return answer
+
+        cache_entry = self._cache_entry(question, question_embedding, route_type, relevant_docs, index_version, filters)
+        if stream:
+            return self._cache_answer_stream(answer, cache_entry)
+        self.answer_cache.add(answer=answer, **cache_entry)
+        return answer
+
+    async def aask_question(self, question: str, stream: bool = False):
+        """
+        回答用户问题（异步）
+
+        LLM调用使用异步接口，嵌入、检索和读取父文档等阻塞步骤放到有界线程池执行，
+        单个事件循环可以同时处理多个问题。流程与 ask_question 一致。
+
+        Args:
+            question: 用户问题
+            stream: 是否使用流式输出
+
+        Returns:
+            生成的回答或异步生成器
+        """
+        if not all([self.case_report_retrieval_module, self.generation_module, self.guideline_retrieval_module]):
+            raise ValueError("请先构建知识库")
+
+        print(f"\n❓ 用户问题: {question}")
+
+        # 0. 语义缓存
         filters = self._extract_filters_from_query(question)
-        if filters:
-            print(f"应用过滤条件: {filters}")
-            relevant_chunks = self.case_report_retrieval_module.metadata_filtered_search(rewritten_query, filters, top_k=self.config.top_k)
+        index_version = self._index_version()
+        cached, question_embedding = await self._run_blocking(
+            self._lookup_answer_cache, question, filters, index_version
+        )
+        if cached is not None:
+            return self._aiter_answer(cached.answer) if stream else cached.answer
+
+        # 1. 本地嵌入路由，置信度不足时交由LLM
+        route_type = await self._run_blocking(self._route_locally, question, question_embedding)
+
+        # 预检索：需要LLM分析查询时，先用原问题检索，与LLM调用并行
+        speculative = None
+        if self.config.speculative_retrieval and route_type != 'list':
+            speculative = self._submit_speculative(question, filters)
+
+        if self.config.combined_query_analysis and route_type is None:
+            # 1-2. 一次LLM调用同时完成查询路由和查询重写
+            print("🤖 智能分析查询...")
+            route_type, rewritten_query = await self.generation_module.aanalyze_query(question)
+            print(f"🎯 查询类型: {route_type}")
         else:
-            relevant_chunks = self.case_report_retrieval_module.hybrid_search(rewritten_query, top_k=self.config.top_k)
+            # 1. 查询路由
+            if route_type is None:
+                route_type = await self.generation_module.aquery_router(question)
+            print(f"🎯 查询类型: {route_type}")
+
+            # 2. 智能查询重写（根据路由类型）
+            if route_type == 'list':
+                rewritten_query = question
+                print(f"📝 列表查询保持原样: {question}")
+            else:
+                print("🤖 智能分析查询...")
+                rewritten_query = await self.generation_module.aquery_rewrite(question)
+
+        # 3-5. 检索相关子块并获取完整文档（重写结果与原问题相同或相近时复用预检索结果）
+        relevant_chunks = None
+        if speculative is not None:
+            if await self._run_blocking(self._can_reuse_speculative, question, rewritten_query, question_embedding):
+                relevant_chunks = await self._aspeculative_result(speculative)
+            else:
+                # 尽力取消：尚未开始执行时直接取消，已在执行时让其完成并丢弃结果
+                speculative.cancel()
+        relevant_chunks, relevant_docs = await self._run_blocking(
+            self._retrieve_documents, rewritten_query, filters, relevant_chunks
+        )
+        if not relevant_chunks:
+            return "抱歉，没有找到相关的疾病信息。请尝试其他疾病名称或关键词。"
+
+        print("✍️ 生成详细回答...")
+
+        # 根据路由类型自动选择回答模式
+        if route_type == "detail":
+            if stream:
+                answer = self.generation_module.agenerate_step_by_step_answer_stream(
+                    question, relevant_docs, relevant_chunks
+                )
+            else:
+                answer = await self.generation_module.agenerate_step_by_step_answer(
+                    question, relevant_docs, relevant_chunks
+                )
+        else:
+            if stream:
+                answer = self.generation_module.agenerate_basic_answer_stream(question, relevant_docs, relevant_chunks)
+            else:
+                answer = await self.generation_module.agenerate_basic_answer(question, relevant_docs, relevant_chunks)
+
+        if question_embedding is None:
+            return answer
+
+        cache_entry = self._cache_entry(question, question_embedding, route_type, relevant_docs, index_version, filters)
+        if stream:
+            return self._acache_answer_stream(answer, cache_entry)
+        self.answer_cache.add(answer=answer, **cache_entry)
+        return answer
+
+    async def asearch(self, query: str, top_k: int = None) -> List[Document]:
+        """
+        仅检索（异步），不调用LLM；自动应用从查询中提取的元数据过滤条件
+
+        Args:
+            query: 查询文本
+            top_k: 返回数量，默认使用配置的top_k
+
+        Returns:
+            相关文档块列表
+        """
+        if not self.case_report_retrieval_module:
+            raise ValueError("请先构建知识库")
+
+        filters = self._extract_filters_from_query(query)
+        return await self._run_blocking(self._search_chunks, query, filters, top_k)
+
+    def _lookup_answer_cache(self, question: str, filters: dict, index_version: str):
+        """
+        查询语义缓存
+
+        Returns:
+            (命中的缓存条目或None, 问题向量)；未启用语义缓存时均为None
+        """
+        if self.answer_cache is None:
+            return None, None
+        question_embedding = self.index_module.embeddings.embed_query(question)
+        cached = self.answer_cache.lookup(question_embedding, index_version, filters)
+        if cached is not None:
+            print(f"⚡ 命中语义缓存: {cached.question}")
+        return cached, question_embedding
+
+    def _route_locally(self, question: str, question_embedding=None):
+        """本地嵌入路由，未启用或置信度不足时返回None"""
+        if self.query_router is None:
+            return None
+        route_type, _ = self.query_router.route(question, question_embedding)
+        return route_type
+
+    def _search_chunks(self, query: str, filters: dict, top_k: int = None) -> List[Document]:
+        """检索相关子块（有过滤条件时使用元数据过滤检索）"""
+        top_k = top_k or self.config.top_k
+        if filters:
+            return self.case_report_retrieval_module.metadata_filtered_search(query, filters, top_k=top_k)
+        return self.case_report_retrieval_module.hybrid_search(query, top_k=top_k)
+
+    def _submit_speculative(self, question: str, filters: dict) -> Future:
+        """提交预检索（用原问题检索），失败时只记录日志，不影响后续重新检索"""
+        future = self._submit_blocking(self._search_chunks, question, filters)
+        future.add_done_callback(self._log_speculative_failure)
+        return future
+
+    @staticmethod
+    def _log_speculative_failure(future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"预检索失败: {future.exception()}")
+
+    @staticmethod
+    def _speculative_result(future: Future):
+        """等待预检索结果，失败时返回None（改用重写后的查询重新检索）"""
+        try:
+            return future.result()
+        except Exception:
+            return None
+
+    @staticmethod
+    async def _aspeculative_result(future: Future):
+        """_speculative_result 的异步版本（不占用线程池等待）"""
+        try:
+            return await asyncio.wrap_future(future)
+        except Exception:
+            return None
+
+    def _can_reuse_speculative(self, question: str, rewritten_query: str, question_embedding=None) -> bool:
+        """
+        预检索结果是否可以复用：重写后的查询与原问题相同，或两者向量的余弦相似度不低于阈值
+
+        Args:
+            question: 原问题
+            rewritten_query: 重写后的查询
+            question_embedding: 已计算的原问题向量
+
+        Returns:
+            是否复用预检索结果
+        """
+        if rewritten_query.strip() == question.strip():
+            print("♻️ 查询未重写，复用预检索结果")
+            return True
+
+        embeddings = self.index_module.embeddings
+        if question_embedding is None:
+            question_embedding = embeddings.embed_query(question)
+        question_vector = np.asarray(question_embedding, dtype=np.float32)
+        rewritten_vector = np.asarray(embeddings.embed_query(rewritten_query), dtype=np.float32)
+        similarity = float(question_vector @ rewritten_vector) / max(
+            float(np.linalg.norm(question_vector) * np.linalg.norm(rewritten_vector)), 1e-12
+        )
+        if similarity >= self.config.speculative_reuse_threshold:
+            print(f"♻️ 重写查询与原问题相近 (相似度 {similarity:.3f})，复用预检索结果")
+            return True
+        return False
+
+    def _retrieve_documents(self, rewritten_query: str, filters: dict, relevant_chunks: List[Document] = None):
+        """
+        检索相关子块（自动应用元数据过滤）并获取对应的完整文档
+
+        Args:
+            rewritten_query: 重写后的查询
+            filters: 元数据过滤条件
+            relevant_chunks: 可复用的预检索结果，为None时重新检索
+
+        Returns:
+            (相关子块列表, 完整文档列表)；未检索到相关内容时均为空列表
+        """
+        # 3. 检索相关子块（自动应用元数据过滤）
+        if relevant_chunks is None:
+            print("🔍 检索相关文档...")
+            if filters:
+                print(f"应用过滤条件: {filters}")
+            relevant_chunks = self._search_chunks(rewritten_query, filters)
 
         # 显示检索到的子块信息
         if relevant_chunks:
@@ -203,9 +638,9 @@ class RecipeRAGSystem:
 
         # 4. 检查是否找到相关内容
         if not relevant_chunks:
-            return "抱歉，没有找到相关的疾病信息。请尝试其他疾病名称或关键词。"
+            return [], []
 
-        # 5. 生成回答方式
+        # 5. 获取完整文档
         print("获取完整文档...")
         relevant_docs = self.case_report_data_module.get_parent_documents(relevant_chunks)
 
@@ -220,21 +655,98 @@ class RecipeRAGSystem:
         else:
             print(f"对应 {len(relevant_docs)} 个完整文档")
 
-        print("✍️ 生成详细回答...")
+        return relevant_chunks, relevant_docs
+
+    @staticmethod
+    def _cache_entry(question: str, question_embedding, route_type: str, relevant_docs: list,
+                     index_version: str, filters: dict) -> dict:
+        """语义缓存条目（不含回答）"""
+        return {
+            "question": question,
+            "embedding": question_embedding,
+            "route": route_type,
+            "parent_ids": [doc.metadata.get("parent_id") for doc in relevant_docs],
+            "index_version": index_version,
+            "filters": filters
+        }
+
+    def _cache_answer_stream(self, answer_stream: Iterator[str], cache_entry: dict) -> Iterator[str]:
+        """边输出边收集流式回答，完整输出后写入语义缓存"""
+        parts = []
+        for chunk in answer_stream:
+            parts.append(chunk)
+            yield chunk
+        self.answer_cache.add(answer="".join(parts), **cache_entry)
+
+    async def _acache_answer_stream(self, answer_stream: AsyncIterator[str], cache_entry: dict) -> AsyncIterator[str]:
+        """异步流式回答版本的 _cache_answer_stream"""
+        parts = []
+        async for chunk in answer_stream:
+            parts.append(chunk)
+            yield chunk
+        self.answer_cache.add(answer="".join(parts), **cache_entry)
+
+    @staticmethod
+    async def _aiter_answer(answer: str) -> AsyncIterator[str]:
+        """将完整回答包装为异步生成器（缓存命中时的流式输出）"""
+        yield answer
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """有界线程池（异步问答的阻塞步骤和预检索共用）"""
+        if self.async_executor is None:
+            self.async_executor = ThreadPoolExecutor(
+                max_workers=self.config.async_workers, thread_name_prefix="rag-async"
+            )
+        return self.async_executor
+
+    def _submit_blocking(self, func, *args) -> Future:
+        """提交阻塞任务到有界线程池，并计入未完成任务数"""
+        future = self._get_executor().submit(func, *args)
+        with self._pending_lock:
+            self.pending_blocking_tasks += 1
+        future.add_done_callback(self._blocking_done)
+        return future
+
+    def _blocking_done(self, future: Future):
+        with self._pending_lock:
+            self.pending_blocking_tasks -= 1
+
+    async def _run_blocking(self, func, *args):
+        """
+        在有界线程池中执行阻塞步骤（嵌入、检索、读取父文档）
 
-        # 根据路由类型自动选择回答模式
-        if route_type == "detail":
-            # 详细查询使用分步指导模式
-            if stream:
-                return self.generation_module.generate_step_by_step_answer_stream(question, relevant_docs)
-            else:
-                return self.generation_module.generate_step_by_step_answer(question, relevant_docs)
-        else:
-            # 一般查询使用基础回答模式
-            if stream:
-                return self.generation_module.generate_basic_answer_stream(question, relevant_docs)
-            else:
-                return self.generation_module.generate_basic_answer(question, relevant_docs)
+        等待被取消（如请求超时）时，尚未开始执行的任务随之取消；已在执行的任务会继续运行到结束，
+        期间仍计入 pending_blocking_tasks
+        """
+        return await asyncio.wrap_future(self._submit_blocking(func, *args))
+
+    def close(self):
+        """释放线程池及共享嵌入模型的引用（可重复调用）"""
+        if self.async_executor is not None:
+            self.async_executor.shutdown(wait=False)
+            self.async_executor = None
+        for retrieval_module in [self.case_report_retrieval_module, self.guideline_retrieval_module]:
+            if retrieval_module is not None:
+                retrieval_module.close()
+        if self.search_executor is not None:
+            self.search_executor.shutdown(wait=False)
+            self.search_executor = None
+        # 两个索引模块各持有一个注册表引用，全部释放后模型才会被卸载
+        for index_module in [self.index_module, self.guideline_index_module]:
+            if index_module is not None:
+                index_module.release_embeddings()
+
+    def query_cache_stats(self) -> Optional[Dict[str, float]]:
+        """查询向量缓存的命中统计（两个语料共享同一缓存），未启用缓存时返回None"""
+        query_cache = self.index_module.query_cache if self.index_module is not None else None
+        return query_cache.stats() if query_cache is not None else None
+
+    def _index_version(self) -> str:
+        """当前索引版本（两个语料BM25索引的指纹），知识库刷新后随之变化"""
+        return ":".join(
+            module.bm25_index.fingerprint
+            for module in [self.case_report_retrieval_module, self.guideline_retrieval_module]
+        )
     
     def _extract_filters_from_query(self, query: str) -> dict:
         """
@@ -2,13 +2,48 @@ from .data_preparation import DataPreparationModule, GuidelineDataPreparationMod
 from .index_construction import IndexConstructionModule
 from .retrieval_optimization import RetrievalOptimizationModule
 from .generation_integration import GenerationIntegrationModule
+from .bm25_index import BM25Index, BM25IndexRetriever
+from .embedding_registry import EmbeddingModelRegistry, SentenceTransformerEmbeddings
+from .corpus_manifest import CorpusManifest, ManifestEntry
+from .document_store import DocumentStore, ParentDocumentStore
+from .vector_index import VectorIndexParams, IndexMeta
+from .metadata_bitmap import MetadataBitmapIndex
+from .embedding_cache import EmbeddingCache, QueryEmbeddingCache
+from .answer_cache import SemanticAnswerCache, CachedAnswer
+from .query_router import EmbeddingQueryRouter, ROUTE_EXAMPLES
+from .context_builder import ContextBuilder, PackedContext, TokenCounter
+from .tokenization import MixedLanguageTokenizer, WhitespaceTokenizer, TokenCache, get_tokenizer
 
 __all__ = [
     'DataPreparationModule',
     'IndexConstructionModule', 
     'RetrievalOptimizationModule',
     'GenerationIntegrationModule',
-    'GuidelineDataPreparationModule'
+    'GuidelineDataPreparationModule',
+    'BM25Index',
+    'BM25IndexRetriever',
+    'MixedLanguageTokenizer',
+    'WhitespaceTokenizer',
+    'TokenCache',
+    'get_tokenizer',
+    'EmbeddingModelRegistry',
+    'SentenceTransformerEmbeddings',
+    'CorpusManifest',
+    'ManifestEntry',
+    'DocumentStore',
+    'ParentDocumentStore',
+    'VectorIndexParams',
+    'IndexMeta',
+    'MetadataBitmapIndex',
+    'EmbeddingCache',
+    'QueryEmbeddingCache',
+    'SemanticAnswerCache',
+    'CachedAnswer',
+    'EmbeddingQueryRouter',
+    'ROUTE_EXAMPLES',
+    'ContextBuilder',
+    'PackedContext',
+    'TokenCounter'
 ]
 
 __version__ = "1.0.0"
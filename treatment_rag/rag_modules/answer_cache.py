@@ -0,0 +1,143 @@
+"""
+语义回答缓存模块
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    """缓存条目：问题向量、路由、检索到的父文档ID及回答"""
+    question: str
+    embedding: np.ndarray
+    route: str
+    parent_ids: List[str]
+    answer: str
+    index_version: str
+    filters: Dict[str, Any] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class SemanticAnswerCache:
+    """语义回答缓存 - 新问题与已回答问题的向量相似度超过阈值且索引版本未变时直接返回缓存的回答"""
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1000, ttl: Optional[float] = 86400):
+        """
+        初始化语义回答缓存
+
+        Args:
+            threshold: 余弦相似度阈值（问题向量已归一化）
+            max_entries: 最大条目数，超出时淘汰最久未命中的条目
+            ttl: 条目过期秒数，为None时不过期
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_id = 0
+        self._matrix: Optional[np.ndarray] = None  # 与 _matrix_ids 对齐的问题向量矩阵，条目变化后重建
+        self._matrix_ids: List[int] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, embedding: Sequence[float], index_version: str,
+               filters: Optional[Dict[str, Any]] = None) -> Optional[CachedAnswer]:
+        """
+        查找语义相近的已缓存回答
+
+        Args:
+            embedding: 问题向量
+            index_version: 当前索引版本，与条目不一致时不命中
+            filters: 当前问题的元数据过滤条件，需与条目一致
+
+        Returns:
+            命中的缓存条目，未命中时返回None
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        filters = filters or {}
+        with self._lock:
+            self._expire()
+            matrix = self._get_matrix()
+            if matrix is not None:
+                similarities = matrix @ query
+                # 按相似度从高到低找第一个版本和过滤条件一致的条目
+                for row in np.argsort(-similarities):
+                    if similarities[row] < self.threshold:
+                        break
+                    entry_id = self._matrix_ids[row]
+                    entry = self._entries[entry_id]
+                    if entry.index_version == index_version and entry.filters == filters:
+                        self._entries.move_to_end(entry_id)
+                        self.hits += 1
+                        logger.info(f"语义缓存命中 (相似度 {similarities[row]:.4f}): {entry.question}")
+                        return entry
+            self.misses += 1
+            return None
+
+    def add(self, question: str, embedding: Sequence[float], route: str, parent_ids: List[str], answer: str,
+            index_version: str, filters: Optional[Dict[str, Any]] = None):
+        """
+        写入缓存条目
+
+        Args:
+            question: 用户问题
+            embedding: 问题向量
+            route: 查询路由类型
+            parent_ids: 用于生成回答的父文档ID
+            answer: 生成的回答
+            index_version: 生成回答时的索引版本
+            filters: 元数据过滤条件
+        """
+        if not answer:
+            return
+        entry = CachedAnswer(
+            question=question,
+            embedding=np.asarray(embedding, dtype=np.float32),
+            route=route,
+            parent_ids=list(parent_ids),
+            answer=answer,
+            index_version=index_version,
+            filters=dict(filters or {})
+        )
+        with self._lock:
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def _expire(self):
+        """删除过期条目"""
+        if self.ttl is None:
+            return
+        now = time.monotonic()
+        expired = [entry_id for entry_id, entry in self._entries.items() if now - entry.created_at > self.ttl]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        if expired:
+            self._matrix = None
+
+    def _get_matrix(self) -> Optional[np.ndarray]:
+        if self._matrix is None and self._entries:
+            self._matrix_ids = list(self._entries.keys())
+            self._matrix = np.vstack([self._entries[entry_id].embedding for entry_id in self._matrix_ids])
+        return self._matrix
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
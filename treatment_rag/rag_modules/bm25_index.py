@@ -0,0 +1,334 @@
+"""
+BM25索引模块
+"""
+
+import json
+import hashlib
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy import sparse
+from langchain_core.documents import Document
+
+from .tokenization import MixedLanguageTokenizer, TokenCache, get_tokenizer
+
+logger = logging.getLogger(__name__)
+
+
+def compute_corpus_fingerprint(chunks: Sequence[Document]) -> str:
+    """
+    计算文档块序列的指纹，用于判断已保存的BM25索引是否与当前分块一致
+
+    子块ID由父文档ID、块序号和内容哈希确定，有ID时直接使用ID，无需重新哈希全文。
+
+    Args:
+        chunks: 文档块列表
+
+    Returns:
+        指纹字符串
+    """
+    hasher = hashlib.md5()
+    for chunk in chunks:
+        chunk_id = chunk.metadata.get("chunk_id")
+        hasher.update(chunk_id.encode("utf-8") if chunk_id else chunk.page_content.encode("utf-8"))
+        hasher.update(b"\x00")
+    return hasher.hexdigest()
+
+
+class BM25Index:
+    """BM25倒排索引 - 负责词表、文档频率、倒排表和文档长度的构建与持久化"""
+
+    META_FILE = "bm25_meta.json"
+    VOCAB_FILE = "bm25_vocab.json"
+    ARRAY_NAMES = ("postings_indptr", "postings_doc_ids", "postings_term_freqs", "doc_lengths")
+
+    def __init__(self, vocab: Dict[str, int], postings_indptr: np.ndarray, postings_doc_ids: np.ndarray,
+                 postings_term_freqs: np.ndarray, doc_lengths: np.ndarray, fingerprint: str = "",
+                 tokenizer_name: str = MixedLanguageTokenizer.name,
+                 k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        """
+        初始化BM25索引
+
+        Args:
+            vocab: 词 -> 词ID 的映射
+            postings_indptr: 按词ID组织的倒排表偏移（长度为词表大小+1）
+            postings_doc_ids: 倒排表中的文档序号
+            postings_term_freqs: 倒排表中的词频
+            doc_lengths: 每个文档块的词数
+            fingerprint: 构建索引时文档块序列的指纹
+            tokenizer_name: 构建索引所用的分词器名称
+            k1: BM25参数k1
+            b: BM25参数b
+            epsilon: 负IDF的下限系数（与rank_bm25的BM25Okapi一致）
+        """
+        self.vocab = vocab
+        self.postings_indptr = postings_indptr
+        self.postings_doc_ids = postings_doc_ids
+        self.postings_term_freqs = postings_term_freqs
+        self.doc_lengths = doc_lengths
+        self.fingerprint = fingerprint
+        self.tokenizer_name = tokenizer_name
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        self.num_docs = len(doc_lengths)
+        self.avgdl = float(np.mean(doc_lengths)) if self.num_docs else 0.0
+        self.doc_freqs = np.diff(np.asarray(postings_indptr))
+        self.idf = self._compute_idf()
+        self._weight_matrix: Optional[sparse.csr_matrix] = None
+
+    def _compute_idf(self) -> np.ndarray:
+        """计算IDF，负值替换为 epsilon * 平均IDF"""
+        doc_freqs = self.doc_freqs.astype(np.float64)
+        idf = np.log(self.num_docs - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+        if len(idf):
+            idf[idf < 0] = self.epsilon * float(np.mean(idf))
+        return idf.astype(np.float32)
+
+    @classmethod
+    def build(cls, chunks: Sequence[Document], tokenizer: Optional[Callable[[str], List[str]]] = None,
+              token_cache: Optional[TokenCache] = None,
+              k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25) -> 'BM25Index':
+        """
+        从文档块构建BM25索引
+
+        Args:
+            chunks: 文档块列表
+            tokenizer: 分词器，默认使用中英文混合分词器
+            token_cache: 文档块分词缓存，命中时跳过分词
+            k1: BM25参数k1
+            b: BM25参数b
+            epsilon: 负IDF的下限系数
+
+        Returns:
+            构建好的BM25索引
+        """
+        logger.info(f"正在构建BM25索引，共 {len(chunks)} 个文档块...")
+
+        tokenizer = tokenizer or MixedLanguageTokenizer()
+        tokenizer_name = getattr(tokenizer, 'name', 'custom')
+        if token_cache is not None and token_cache.tokenizer_name != tokenizer_name:
+            logger.warning(f"分词缓存与分词器不一致({token_cache.tokenizer_name} != {tokenizer_name})，忽略缓存")
+            token_cache = None
+
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        term_freqs: List[int] = []
+        doc_lengths = np.zeros(len(chunks), dtype=np.int32)
+
+        for doc_idx, chunk in enumerate(chunks):
+            if token_cache is not None:
+                tokens = token_cache.tokenize(chunk.page_content, tokenizer)
+            else:
+                tokens = tokenizer(chunk.page_content)
+            doc_lengths[doc_idx] = len(tokens)
+            for token, freq in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(token, len(vocab)))
+                doc_ids.append(doc_idx)
+                term_freqs.append(freq)
+
+        if token_cache is not None:
+            token_cache.prune({TokenCache.text_key(chunk.page_content) for chunk in chunks})
+            logger.info(f"分词缓存命中 {token_cache.hits} 次，未命中 {token_cache.misses} 次")
+
+        # 按词ID排序，得到以词为行的倒排表
+        term_ids_arr = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids_arr, kind="stable")
+        postings_indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids_arr, minlength=len(vocab)), out=postings_indptr[1:])
+
+        index = cls(
+            vocab=vocab,
+            postings_indptr=postings_indptr,
+            postings_doc_ids=np.asarray(doc_ids, dtype=np.int32)[order],
+            postings_term_freqs=np.asarray(term_freqs, dtype=np.int32)[order],
+            doc_lengths=doc_lengths,
+            fingerprint=compute_corpus_fingerprint(chunks),
+            tokenizer_name=tokenizer_name,
+            k1=k1,
+            b=b,
+            epsilon=epsilon
+        )
+        logger.info(f"BM25索引构建完成，词表大小 {len(vocab)}")
+        return index
+
+    def matches(self, chunks: Sequence[Document], tokenizer_name: Optional[str] = None) -> bool:
+        """判断索引是否与给定的文档块序列（及分词器）一致"""
+        if tokenizer_name is not None and tokenizer_name != self.tokenizer_name:
+            return False
+        return self.num_docs == len(chunks) and self.fingerprint == compute_corpus_fingerprint(chunks)
+
+    @property
+    def weight_matrix(self) -> sparse.csr_matrix:
+        """
+        词-文档权重矩阵（CSR，行为词、列为文档块）
+
+        每个非零元素已预先乘上IDF并完成长度归一化，查询时只需按词取行求和。
+        """
+        if self._weight_matrix is None:
+            doc_ids = np.asarray(self.postings_doc_ids)
+            freqs = np.asarray(self.postings_term_freqs, dtype=np.float32)
+            doc_norm = self.k1 * (1 - self.b + self.b * np.asarray(self.doc_lengths, dtype=np.float32) / max(self.avgdl, 1e-9))
+            term_idf = np.repeat(self.idf, self.doc_freqs)
+            weights = term_idf * freqs * (self.k1 + 1) / (freqs + doc_norm[doc_ids])
+            self._weight_matrix = sparse.csr_matrix(
+                (weights.astype(np.float32), doc_ids, np.asarray(self.postings_indptr)),
+                shape=(len(self.vocab), self.num_docs)
+            )
+        return self._weight_matrix
+
+    def get_scores(self, query_tokens: List[str]) -> np.ndarray:
+        """
+        计算查询对所有文档块的BM25分数
+
+        Args:
+            query_tokens: 查询分词结果
+
+        Returns:
+            每个文档块的分数
+        """
+        term_counts = Counter(token for token in query_tokens if token in self.vocab)
+        if not term_counts:
+            return np.zeros(self.num_docs, dtype=np.float32)
+
+        term_ids = np.fromiter((self.vocab[token] for token in term_counts), dtype=np.int64, count=len(term_counts))
+        counts = np.fromiter(term_counts.values(), dtype=np.float32, count=len(term_counts))
+        # 稀疏行采集 + 按查询词频加权求和
+        return np.asarray(self.weight_matrix[term_ids].T.dot(counts), dtype=np.float32).ravel()
+
+    def get_top_n(self, query_tokens: List[str], n: int, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        获取分数最高的n个文档块序号
+
+        Args:
+            query_tokens: 查询分词结果
+            n: 返回数量
+            mask: 文档块布尔掩码，只在为True的文档块中排序
+
+        Returns:
+            按分数降序排列的文档块序号
+        """
+        scores = self.get_scores(query_tokens)
+        if mask is not None:
+            candidates = np.flatnonzero(mask)
+            scores = scores[candidates]
+
+        n = min(n, len(scores))
+        if n <= 0:
+            return np.empty(0, dtype=np.int64)
+
+        # argpartition 选出前n个，再仅对这n个排序
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return candidates[top] if mask is not None else top
+
+    def save(self, save_path: str):
+        """
+        将索引保存到目录（数组以 .npy 保存，便于内存映射加载）
+
+        Args:
+            save_path: 保存目录
+        """
+        path = Path(save_path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        for name in self.ARRAY_NAMES:
+            np.save(path / f"bm25_{name}.npy", np.asarray(getattr(self, name)))
+
+        terms = [None] * len(self.vocab)
+        for term, term_id in self.vocab.items():
+            terms[term_id] = term
+        with open(path / self.VOCAB_FILE, 'w', encoding='utf-8') as f:
+            json.dump(terms, f, ensure_ascii=False)
+
+        meta = {
+            "num_docs": self.num_docs,
+            "fingerprint": self.fingerprint,
+            "tokenizer": self.tokenizer_name,
+            "k1": self.k1,
+            "b": self.b,
+            "epsilon": self.epsilon
+        }
+        with open(path / self.META_FILE, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+        logger.info(f"BM25索引已保存到: {save_path}")
+
+    @classmethod
+    def load(cls, save_path: str, mmap: bool = True) -> Optional['BM25Index']:
+        """
+        从目录加载索引
+
+        Args:
+            save_path: 保存目录
+            mmap: 是否以内存映射方式加载倒排数组
+
+        Returns:
+            加载的BM25索引，不存在时返回None
+        """
+        path = Path(save_path)
+        if not (path / cls.META_FILE).exists():
+            return None
+
+        with open(path / cls.META_FILE, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(path / cls.VOCAB_FILE, 'r', encoding='utf-8') as f:
+            terms = json.load(f)
+
+        mmap_mode = 'r' if mmap else None
+        arrays = {
+            name: np.load(path / f"bm25_{name}.npy", mmap_mode=mmap_mode)
+            for name in cls.ARRAY_NAMES
+        }
+
+        index = cls(
+            vocab={term: term_id for term_id, term in enumerate(terms)},
+            fingerprint=meta.get("fingerprint", ""),
+            tokenizer_name=meta.get("tokenizer", "whitespace"),
+            k1=meta.get("k1", 1.5),
+            b=meta.get("b", 0.75),
+            epsilon=meta.get("epsilon", 0.25),
+            **arrays
+        )
+        logger.info(f"BM25索引已从 {save_path} 加载，共 {index.num_docs} 个文档块")
+        return index
+
+
+class BM25IndexRetriever:
+    """基于BM25Index的检索器，invoke接口与 langchain BM25Retriever 保持一致"""
+
+    def __init__(self, index: BM25Index, docs: Sequence[Document], k: int = 5,
+                 tokenizer: Optional[Callable[[str], List[str]]] = None):
+        """
+        初始化检索器
+
+        Args:
+            index: BM25索引
+            docs: 与索引顺序一致的文档块列表
+            k: 返回结果数量
+            tokenizer: 查询分词器，默认使用与建索引时同名的分词器
+        """
+        self.index = index
+        self.docs = docs
+        self.k = k
+        self.tokenizer = tokenizer or get_tokenizer(index.tokenizer_name)
+
+    def invoke(self, query: str, k: Optional[int] = None, mask: Optional[np.ndarray] = None) -> List[Document]:
+        """
+        检索与查询最相关的文档块
+
+        Args:
+            query: 查询文本
+            k: 返回结果数量，默认使用初始化时的k
+            mask: 文档块布尔掩码（元数据预过滤）
+
+        Returns:
+            按BM25分数排序的文档块列表
+        """
+        top_indices = self.index.get_top_n(self.tokenizer(query), k or self.k, mask=mask)
+        return [self.docs[i] for i in top_indices]
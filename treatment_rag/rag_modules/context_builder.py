@@ -0,0 +1,325 @@
+"""
+上下文构建模块
+"""
+
+import logging
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import MarkdownHeaderTextSplitter
+
+logger = logging.getLogger(__name__)
+
+# 与数据准备模块的分块方式一致，保证切出的章节序号与子块的 chunk_index 对应
+MARKDOWN_HEADERS = [
+    ("#", "Header 1"),
+    ("##", "Header 2"),
+    ("###", "Header 3")
+]
+
+# 估算token数：CJK字符按1个token，英文单词约4个字符1个token，数字约3位1个token，其余符号各1个token
+_ESTIMATE_PATTERN = re.compile(r"(?P<cjk>[㐀-䶿一-鿿])|(?P<word>[A-Za-z]+)|(?P<number>\d+)|(?P<other>[^\s])")
+
+# 省略章节时插入的标记
+OMISSION_MARK = "……"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    不依赖分词器估算token数（中英文混合文本）
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的token数
+    """
+    count = 0
+    for match in _ESTIMATE_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind == 'word':
+            count += math.ceil(len(match.group()) / 4)
+        elif kind == 'number':
+            count += math.ceil(len(match.group()) / 3)
+        else:
+            count += 1
+    return count
+
+
+class TokenCounter:
+    """token计数 - 安装了tiktoken时使用其编码，否则按中英文字符估算"""
+
+    def __init__(self, encoding_name: Optional[str] = "cl100k_base"):
+        """
+        初始化token计数
+
+        Args:
+            encoding_name: tiktoken编码名，为空时直接使用估算
+        """
+        self.encoding = None
+        if encoding_name:
+            try:
+                import tiktoken
+                self.encoding = tiktoken.get_encoding(encoding_name)
+            except ImportError:
+                logger.info("未安装tiktoken，按中英文字符估算token数")
+            except Exception as e:
+                logger.warning(f"加载tiktoken编码 {encoding_name} 失败，按中英文字符估算token数: {e}")
+
+    def count(self, text: str) -> int:
+        """计算文本的token数"""
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return estimate_tokens(text)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        截断文本使其不超过 max_tokens
+
+        Args:
+            text: 文本
+            max_tokens: token上限
+
+        Returns:
+            截断后的文本
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            # 截断点可能落在多字节字符中间，解码时忽略不完整的字节
+            return self.encoding.decode(tokens[:max_tokens]).rstrip('�')
+
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        # 二分查找不超过上限的最长前缀
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if estimate_tokens(text[:mid]) <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low]
+
+
+@dataclass
+class PackedContext:
+    """打包后的上下文"""
+    text: str
+    tokens_used: int
+    token_budget: int
+    documents: List[str] = field(default_factory=list)  # 纳入上下文的文档（病例ID/父文档ID）
+    truncated: int = 0  # 被裁剪章节或截断的文档数
+    dropped: int = 0    # 预算不足未纳入的文档数
+
+
+class ContextBuilder:
+    """
+    按token预算构建上下文
+
+    - 按检索分数在文档之间分配预算（水位分配：用不满配额的文档把剩余预算让给其他文档）
+    - 有子块信息时，父文档只保留与检索到的子块对应的章节，预算有余时再补充相邻章节
+    """
+
+    def __init__(self, max_tokens: int = 3000, min_doc_tokens: int = 64,
+                 token_counter: Optional[TokenCounter] = None):
+        """
+        初始化上下文构建
+
+        Args:
+            max_tokens: 上下文token预算
+            min_doc_tokens: 单个文档的最少预算，分配不到时不纳入该文档
+            token_counter: token计数，默认使用 TokenCounter()
+        """
+        self.max_tokens = max_tokens
+        self.min_doc_tokens = min_doc_tokens
+        self.token_counter = token_counter or TokenCounter()
+        self._splitter = MarkdownHeaderTextSplitter(headers_to_split_on=MARKDOWN_HEADERS, strip_headers=False)
+        # 每个章节预留换行和省略标记的开销，保证输出不超过预算
+        self._overhead = self.token_counter.count("\n" + OMISSION_MARK + "\n")
+
+    def build(self, docs: Sequence[Document], child_chunks: Optional[Sequence[Document]] = None,
+              header_fn: Optional[Callable[[int, Document], str]] = None) -> PackedContext:
+        """
+        构建上下文
+
+        Args:
+            docs: 父文档列表（按相关性排序）
+            child_chunks: 检索到的子块（按检索排序），用于计算文档分数和裁剪章节
+            header_fn: 生成每个文档标题行的函数 (序号, 文档) -> 标题；序号按纳入上下文的文档连续编号
+
+        Returns:
+            打包后的上下文
+        """
+        header_fn = header_fn or (lambda i, doc: f"【文档 {i}】")
+        chunk_scores = self._chunk_scores(child_chunks or [])
+
+        # 每个文档的分数、标题和按优先级排列的章节
+        candidates = []
+        for rank, doc in enumerate(docs):
+            parent_id = doc.metadata.get("parent_id")
+            hits = chunk_scores.get(parent_id, {})
+            score = sum(hits.values()) if hits else 1.0 / (rank + 1)
+            sections = self._sections(doc, hits)
+            # 预算按原排名编号估算；纳入的文档在选定后连续编号，编号不大于原排名，token数不会超出估算
+            header_tokens = self.token_counter.count(header_fn(rank + 1, doc))
+            full_tokens = header_tokens + self._overhead + sum(tokens + self._overhead for _, _, tokens in sections)
+            candidates.append((doc, score, header_tokens, sections, full_tokens))
+
+        # 上下文开头的分隔线也计入预算
+        separator = "\n" + "=" * 50
+        available = self.max_tokens - self.token_counter.count(separator)
+        allocations = self._allocate([(c[1], c[4]) for c in candidates], available)
+
+        parts, names, truncated, dropped = [], [], 0, 0
+        for (doc, _, header_tokens, sections, _), budget in zip(candidates, allocations):
+            body, complete = self._pack_sections(sections, budget - header_tokens)
+            if not body:
+                dropped += 1
+                continue
+            if not complete:
+                truncated += 1
+            # 按纳入顺序编号，未纳入的文档不占编号，保证引用编号连续
+            parts.append(f"{header_fn(len(parts) + 1, doc)}\n{body}\n")
+            names.append(doc.metadata.get('case_report_id') or doc.metadata.get('parent_id', ''))
+
+        text = separator + "\n".join(parts) if parts else ""
+        return PackedContext(
+            text=text,
+            tokens_used=self.token_counter.count(text),
+            token_budget=self.max_tokens,
+            documents=names,
+            truncated=truncated,
+            dropped=dropped
+        )
+
+    @staticmethod
+    def _chunk_scores(child_chunks: Sequence[Document]) -> Dict[str, Dict[int, float]]:
+        """
+        子块分数：优先使用检索的RRF分数，否则按排名 1/(rank+1)
+
+        Returns:
+            父文档ID -> chunk_index -> 分数
+        """
+        scores: Dict[str, Dict[int, float]] = {}
+        for rank, chunk in enumerate(child_chunks):
+            parent_id = chunk.metadata.get("parent_id")
+            if parent_id is None:
+                continue
+            score = chunk.metadata.get("rrf_score") or 1.0 / (rank + 1)
+            chunk_index = chunk.metadata.get("chunk_index", -1)
+            hits = scores.setdefault(parent_id, {})
+            hits[chunk_index] = max(hits.get(chunk_index, 0.0), score)
+        return scores
+
+    def _sections(self, doc: Document, hits: Dict[int, float]) -> List[Tuple[int, str, int]]:
+        """
+        将父文档按标题切分为章节，并按优先级排序：
+        命中的章节（按分数）→ 与命中章节相邻的章节（按距离）→ 其余章节（按文档顺序）
+
+        Returns:
+            [(章节序号, 章节文本, token数), ...]
+        """
+        sections = [chunk.page_content for chunk in self._splitter.split_text(doc.page_content)] if hits else []
+        if not sections or max(hits) >= len(sections):
+            # 无子块信息或章节序号对不上（如文档在分块后被修改），整篇作为一个章节
+            return [(0, doc.page_content, self.token_counter.count(doc.page_content))]
+
+        hit_indexes = [i for i in hits if i >= 0]
+
+        def priority(i: int):
+            if i in hits:
+                return (0, -hits[i], i)
+            distance = min(abs(i - h) for h in hit_indexes) if hit_indexes else len(sections)
+            return (1, distance, i)
+
+        order = sorted(range(len(sections)), key=priority)
+        return [(i, sections[i], self.token_counter.count(sections[i])) for i in order]
+
+    def _allocate(self, items: List[Tuple[float, int]], budget: int) -> List[int]:
+        """
+        按分数比例分配预算；完整内容用不满配额的文档只取所需，剩余预算继续在其他文档间分配，
+        配额低于 min_doc_tokens 的低分文档不纳入
+
+        Args:
+            items: [(分数, 完整内容token数), ...]
+            budget: 可分配的token数
+
+        Returns:
+            每个文档分配到的token数
+        """
+        allocations = [0] * len(items)
+        pending = sorted(range(len(items)), key=lambda i: -items[i][0])
+        remaining = budget
+
+        while pending and remaining > 0:
+            total_score = sum(items[i][0] for i in pending) or 1.0
+            shares = {i: remaining * items[i][0] / total_score for i in pending}
+
+            # 完整内容放得下的文档直接满足，剩余预算进入下一轮
+            satisfied = [i for i in pending if items[i][1] <= shares[i]]
+            if satisfied:
+                for i in satisfied:
+                    allocations[i] = items[i][1]
+                    remaining -= items[i][1]
+                pending = [i for i in pending if i not in satisfied]
+                continue
+
+            # 最低分文档配额过小时放弃，把预算留给其他文档
+            lowest = pending[-1]
+            if shares[lowest] < self.min_doc_tokens and len(pending) > 1:
+                pending.pop()
+                continue
+
+            for i in pending:
+                allocations[i] = int(shares[i])
+            break
+
+        return allocations
+
+    def _pack_sections(self, sections: List[Tuple[int, str, int]], budget: int) -> Tuple[str, bool]:
+        """
+        按优先级选取章节直到预算用尽，再按文档顺序输出；不连续处插入省略标记
+
+        Returns:
+            (文本, 是否完整保留了所有章节)
+        """
+        if budget <= 0:
+            return "", False
+
+        overhead = self._overhead
+        selected: Dict[int, str] = {}
+        used = overhead
+        cut = False
+        for index, text, tokens in sections:
+            if used + tokens + overhead <= budget:
+                selected[index] = text
+                used += tokens + overhead
+            elif not selected:
+                # 最相关的章节本身超出预算时截断（截断处、前后各一个省略标记）
+                text = self.token_counter.truncate(text, budget - 3 * overhead)
+                if text:
+                    selected[index] = text + OMISSION_MARK
+                    cut = True
+                break
+
+        if not selected:
+            return "", False
+
+        lines = []
+        previous = None
+        for index in sorted(selected):
+            if (previous is None and index > 0) or (previous is not None and index > previous + 1):
+                lines.append(OMISSION_MARK)
+            lines.append(selected[index])
+            previous = index
+        if previous is not None and previous < max(index for index, _, _ in sections):
+            lines.append(OMISSION_MARK)
+
+        return "\n".join(lines), len(selected) == len(sections) and not cut
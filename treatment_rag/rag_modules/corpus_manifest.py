@@ -0,0 +1,209 @@
+"""
+语料清单模块
+"""
+
+import json
+import hashlib
+import logging
+import os
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ManifestEntry:
+    """清单条目：一个源文件及其产出的父文档、子块"""
+    path: str                 # 相对数据根目录的路径
+    size: int
+    mtime_ns: int
+    content_hash: str
+    parent_id: str = ""       # 文件未产出文档时为空
+    chunk_ids: List[str] = field(default_factory=list)
+
+
+class CorpusManifest:
+    """语料清单 - 记录已入库文件的状态，支持增量刷新"""
+
+    MANIFEST_FILE = "corpus_manifest.json"
+
+    def __init__(self):
+        self.entries: Dict[str, ManifestEntry] = {}
+
+    @staticmethod
+    def _relative_path(data_root: Path, md_file: Path) -> str:
+        try:
+            return Path(md_file).resolve().relative_to(data_root.resolve()).as_posix()
+        except Exception:
+            return Path(md_file).as_posix()
+
+    @staticmethod
+    def file_hash(md_file: Path) -> str:
+        """文件内容哈希"""
+        with open(md_file, 'rb') as f:
+            return hashlib.md5(f.read()).hexdigest()
+
+    def record(self, data_root: Path, md_file: Path, parent_id: str = "", chunk_ids: List[str] = None):
+        """
+        记录（或更新）一个文件的清单条目
+
+        Args:
+            data_root: 数据根目录
+            md_file: 源文件路径
+            parent_id: 父文档ID
+            chunk_ids: 该文件产出的子块ID列表
+        """
+        stat = os.stat(md_file)
+        rel_path = self._relative_path(Path(data_root), Path(md_file))
+        self.entries[rel_path] = ManifestEntry(
+            path=rel_path,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            content_hash=self.file_hash(md_file),
+            parent_id=parent_id,
+            chunk_ids=list(chunk_ids or [])
+        )
+
+    def record_documents(self, data_root: Path, documents: List[Document], chunks: List[Document]):
+        """
+        根据全量构建的结果重建清单
+
+        Args:
+            data_root: 数据根目录
+            documents: 父文档列表
+            chunks: 子块列表
+        """
+        chunk_ids_by_parent: Dict[str, List[str]] = {}
+        for chunk in chunks:
+            parent_id = chunk.metadata.get("parent_id")
+            if parent_id and "chunk_id" in chunk.metadata:
+                chunk_ids_by_parent.setdefault(parent_id, []).append(chunk.metadata["chunk_id"])
+
+        self.entries = {}
+        for doc in documents:
+            parent_id = doc.metadata["parent_id"]
+            self.record(data_root, Path(doc.metadata["source"]), parent_id, chunk_ids_by_parent.get(parent_id, []))
+        logger.info(f"语料清单已重建: {len(self.entries)} 个文件")
+
+    def scan(self, data_root: Path) -> Tuple[List[Path], List[ManifestEntry], List[ManifestEntry]]:
+        """
+        扫描数据目录，对比清单找出变化
+
+        大小和修改时间均未变化的文件直接视为未变；否则比较内容哈希。
+
+        Args:
+            data_root: 数据根目录
+
+        Returns:
+            (新增或修改的文件路径, 被修改文件的旧条目, 已删除文件的旧条目)
+        """
+        data_root = Path(data_root)
+        changed_files: List[Path] = []
+        modified_entries: List[ManifestEntry] = []
+        seen = set()
+
+        for md_file in sorted(data_root.rglob("*.md")):
+            rel_path = self._relative_path(data_root, md_file)
+            seen.add(rel_path)
+            entry = self.entries.get(rel_path)
+            stat = md_file.stat()
+            if entry and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+                continue
+            if entry and entry.content_hash == self.file_hash(md_file):
+                # 仅元信息变化（如touch），更新状态即可
+                entry.size, entry.mtime_ns = stat.st_size, stat.st_mtime_ns
+                continue
+
+            changed_files.append(md_file)
+            if entry:
+                modified_entries.append(entry)
+
+        deleted_entries = [entry for rel_path, entry in self.entries.items() if rel_path not in seen]
+        return changed_files, modified_entries, deleted_entries
+
+    def refresh(self, data_module) -> Tuple[List[Document], List[str]]:
+        """
+        增量刷新数据模块：只读取、清洗、分块新增或修改的文件，并移除已删除文件的文档
+
+        Args:
+            data_module: 数据准备模块（需提供 iter_loaded_files 和 _split_document）
+
+        Returns:
+            (新增的子块列表, 需要从索引中删除的子块ID列表)
+        """
+        data_root = Path(data_module.data_path)
+        changed_files, modified_entries, deleted_entries = self.scan(data_root)
+        logger.info(f"增量扫描: {len(changed_files)} 个新增/修改文件，{len(deleted_entries)} 个已删除文件")
+
+        # 1. 移除过期的父文档和子块
+        stale_entries = modified_entries + deleted_entries
+        stale_parent_ids = {entry.parent_id for entry in stale_entries if entry.parent_id}
+        stale_chunk_ids = [chunk_id for entry in stale_entries for chunk_id in entry.chunk_ids]
+
+        if stale_parent_ids:
+            data_module.documents = [doc for doc in data_module.documents
+                                     if doc.metadata.get("parent_id") not in stale_parent_ids]
+            kept_chunks = []
+            for chunk in data_module.chunks:
+                if chunk.metadata.get("parent_id") in stale_parent_ids:
+                    data_module.chunk_index.pop(chunk.metadata.get("chunk_id"), None)
+                else:
+                    kept_chunks.append(chunk)
+            data_module.chunks = kept_chunks
+            for parent_id in stale_parent_ids:
+                data_module.parent_index.pop(parent_id, None)
+        for chunk_id in stale_chunk_ids:
+            data_module.parent_child_map.pop(chunk_id, None)
+        for entry in deleted_entries:
+            del self.entries[entry.path]
+
+        # 2. 加载并分块新增或修改的文件
+        new_chunks: List[Document] = []
+        for md_file, doc in data_module.iter_loaded_files(changed_files):
+            if doc is None:
+                self.record(data_root, md_file)
+                continue
+
+            doc_chunks = data_module._split_document(doc)
+            data_module.documents.append(doc)
+            data_module.parent_index[doc.metadata["parent_id"]] = doc
+            for chunk in doc_chunks:
+                data_module.chunk_index[chunk.metadata["chunk_id"]] = chunk
+            new_chunks.extend(doc_chunks)
+            self.record(data_root, md_file, doc.metadata["parent_id"],
+                        [chunk.metadata["chunk_id"] for chunk in doc_chunks])
+
+        data_module.chunks.extend(new_chunks)
+        logger.info(f"增量刷新完成: 新增 {len(new_chunks)} 个子块，删除 {len(stale_chunk_ids)} 个子块")
+        return new_chunks, stale_chunk_ids
+
+    def save(self, save_path: str):
+        """保存清单到目录"""
+        path = Path(save_path)
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / self.MANIFEST_FILE, 'w', encoding='utf-8') as f:
+            json.dump([asdict(entry) for entry in self.entries.values()], f, ensure_ascii=False)
+        logger.info(f"语料清单已保存: {len(self.entries)} 个文件")
+
+    @classmethod
+    def load(cls, save_path: str) -> 'CorpusManifest':
+        """从目录加载清单，不存在时返回空清单"""
+        manifest = cls()
+        manifest_file = Path(save_path) / cls.MANIFEST_FILE
+        if not manifest_file.exists():
+            return manifest
+
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                for item in json.load(f):
+                    entry = ManifestEntry(**item)
+                    manifest.entries[entry.path] = entry
+            logger.info(f"语料清单已加载: {len(manifest.entries)} 个文件")
+        except Exception as e:
+            logger.warning(f"加载语料清单失败: {e}")
+            manifest.entries = {}
+        return manifest
@@ -4,18 +4,220 @@
 
 import logging
 import hashlib
-from typing import List, Dict, Any
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Iterator, List, Dict, Any, Tuple
 import json
 from langchain_text_splitters import MarkdownHeaderTextSplitter
 from langchain_core.documents import Document
 from pathlib import Path
-import uuid
 import re
 from typing import Optional
 
+from .corpus_manifest import CorpusManifest
+from .document_store import DocumentStore, ParentDocumentStore
+
 logger = logging.getLogger(__name__)
 
-class DataPreparationModule:
+
+def make_chunk_id(parent_id: str, chunk_index: int, content: str) -> str:
+    """
+    生成确定性的子块ID：父文档ID + 块序号 + 内容哈希
+
+    同一文件重新分块得到相同的ID，使分块结果、BM25索引、缓存与向量库可以按ID对齐
+    """
+    content_hash = hashlib.md5(content.encode("utf-8")).hexdigest()
+    return hashlib.md5(f"{parent_id}:{chunk_index}:{content_hash}".encode("utf-8")).hexdigest()
+
+
+# 进程池中每个工作进程持有一个轻量的数据模块实例，只用于调用 _load_file
+_worker_module = None
+
+
+def _init_load_worker(module_cls, data_path: str):
+    global _worker_module
+    _worker_module = module_cls(data_path)
+
+
+def _load_files_in_worker(md_files: List[Path]) -> List[Optional[Document]]:
+    return [_worker_module._load_file(md_file) for md_file in md_files]
+
+
+def iter_loaded_files(module, md_files: List[Path], num_workers: int = 1,
+                      batch_size: int = 64) -> Iterator[Tuple[Path, Optional[Document]]]:
+    """
+    逐个读取并清洗Markdown文件，可选使用进程池并行
+
+    文件按 batch_size 分批提交，最多 num_workers 个批次同时在途，取走最早的一批后才提交下一批，
+    调用方消费缓慢时已完成但未取走的结果不会无限堆积。按 md_files 的顺序产出，每完成一批记录一次吞吐。
+
+    Args:
+        module: 数据准备模块（提供 _load_file）
+        md_files: 文件路径列表
+        num_workers: 工作进程数，<=1 时在当前进程串行处理
+        batch_size: 每次分发给工作进程的文件数，也是记录吞吐的间隔
+
+    Yields:
+        (文件路径, 父文档)，读取失败或被跳过的文件父文档为None
+    """
+    start_time = time.perf_counter()
+    total_files = len(md_files)
+    loaded_bytes = 0
+    batches = [md_files[i:i + batch_size] for i in range(0, total_files, batch_size)]
+
+    def log_throughput(done: int, final: bool = False):
+        elapsed = max(time.perf_counter() - start_time, 1e-9)
+        rate = f"{done / elapsed:.1f} 文件/秒, {loaded_bytes / elapsed / 1024 / 1024:.2f} MB/秒"
+        if final:
+            logger.info(f"文件加载吞吐: {rate} (共 {done} 个文件, 耗时 {elapsed:.2f} 秒)")
+        else:
+            logger.info(f"已加载 {done}/{total_files} 个文件: {rate}")
+
+    executor = None
+    pending: Deque[Future] = deque()
+    if num_workers > 1 and total_files > 1:
+        logger.info(f"使用 {num_workers} 个进程并行加载 {total_files} 个文件 (批大小 {batch_size})...")
+        executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=_init_load_worker,
+            initargs=(type(module), str(module.data_path))
+        )
+
+    try:
+        done = 0
+        next_batch = 0
+        for batch in batches:
+            if executor is None:
+                results = [module._load_file(md_file) for md_file in batch]
+            else:
+                # 补足在途批次后等待最早的一批，保证产出顺序与提交顺序一致
+                while next_batch < len(batches) and len(pending) < num_workers:
+                    pending.append(executor.submit(_load_files_in_worker, batches[next_batch]))
+                    next_batch += 1
+                results = pending.popleft().result()
+
+            for md_file, doc in zip(batch, results):
+                loaded_bytes += os.path.getsize(md_file)
+                yield md_file, doc
+            done += len(batch)
+            if done < total_files:
+                log_throughput(done)
+    finally:
+        if executor is not None:
+            # 调用方提前停止迭代时取消尚未开始的批次
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    log_throughput(total_files, final=True)
+
+
+def iter_markdown_files(module, md_files: List[Path], num_workers: int = 1, batch_size: int = 64) -> Iterator[Document]:
+    """
+    逐个读取并清洗Markdown文件（iter_loaded_files 中读取成功的父文档）
+
+    Yields:
+        父文档，顺序与 md_files 一致
+    """
+    for _, doc in iter_loaded_files(module, md_files, num_workers, batch_size):
+        if doc is not None:
+            yield doc
+
+class ParentChildStoreMixin:
+    """
+    父子文档存储与查找 - 病例与指南数据模块共用
+
+    使用方需提供 documents、chunks、parent_child_map、parent_index、chunk_index、
+    parent_store、parent_cache_size 属性
+    """
+
+    def refresh_documents(self, manifest: CorpusManifest) -> Tuple[List[Document], List[str]]:
+        """
+        增量刷新：只处理新增、修改和删除的文件
+
+        Args:
+            manifest: 上次构建时保存的语料清单（会被原地更新）
+
+        Returns:
+            (新增的子块列表, 需要从索引中删除的子块ID列表)
+        """
+        return manifest.refresh(self)
+
+    def iter_loaded_files(self, md_files: List[Path]) -> Iterator[Tuple[Path, Optional[Document]]]:
+        """按数据模块的并行配置逐个读取文件（见 iter_loaded_files）"""
+        return iter_loaded_files(self, md_files, self.num_workers, self.batch_size)
+
+    def save_store(self, save_path: str):
+        """
+        将父文档和子块写入持久化存储，供热启动时跳过读取原始文件
+
+        写入后父文档正文不再常驻内存，self.documents 只保留元数据占位，正文按需从存储读取。
+
+        Args:
+            save_path: 保存目录（通常为对应的索引目录）
+        """
+        ParentDocumentStore.write(save_path, (self._resolve_parent(doc, use_cache=False) for doc in self.documents))
+        DocumentStore.write(save_path, "chunks", self.chunks)
+        self._open_parent_store(save_path)
+
+    def load_store(self, save_path: str) -> bool:
+        """
+        从持久化存储加载父文档和子块（不访问原始Markdown目录）
+
+        Args:
+            save_path: 保存目录
+
+        Returns:
+            是否加载成功
+        """
+        if not ParentDocumentStore.exists(save_path):
+            return False
+        chunks = DocumentStore.load(save_path, "chunks")
+        if chunks is None:
+            return False
+        self.chunks = chunks
+
+        self.parent_child_map = {
+            chunk.metadata["chunk_id"]: chunk.metadata["parent_id"]
+            for chunk in self.chunks
+            if "chunk_id" in chunk.metadata and "parent_id" in chunk.metadata
+        }
+        self._open_parent_store(save_path)
+        logger.info(f"从文档存储加载 {len(self.documents)} 个父文档、{len(self.chunks)} 个子块")
+        return True
+
+    def _open_parent_store(self, save_path: str):
+        """打开父文档存储，并以仅含元数据的占位替换内存中的父文档"""
+        if self.parent_store is not None:
+            self.parent_store.close()
+        self.parent_store = ParentDocumentStore(save_path, cache_size=self.parent_cache_size)
+        self.documents = self.parent_store.stubs()
+        self._build_lookup_indexes()
+
+    def _resolve_parent(self, doc: Document, use_cache: bool = True) -> Document:
+        """父文档为元数据占位时，从父文档存储读取正文"""
+        if doc.page_content or self.parent_store is None:
+            return doc
+        return self.parent_store.get(doc.metadata["parent_id"], use_cache=use_cache) or doc
+
+    def _build_lookup_indexes(self):
+        """重建 父文档ID -> 父文档、子块ID -> 子块 的查找索引"""
+        self.parent_index = {doc.metadata["parent_id"]: doc for doc in self.documents}
+        self.chunk_index = {chunk.metadata["chunk_id"]: chunk for chunk in self.chunks if "chunk_id" in chunk.metadata}
+
+    def get_parent_by_id(self, parent_id: str) -> Optional[Document]:
+        """按父文档ID获取完整父文档（O(1)，正文按需从存储读取）"""
+        doc = self.parent_index.get(parent_id)
+        return self._resolve_parent(doc) if doc is not None else None
+
+    def get_chunk_by_id(self, chunk_id: str) -> Optional[Document]:
+        """按子块ID获取子块（O(1)）"""
+        return self.chunk_index.get(chunk_id)
+
+
+class DataPreparationModule(ParentChildStoreMixin):
     """数据准备模块 - 负责数据加载、清洗和预处理"""
     # 统一维护的分类与难度配置，供外部复用，避免关键词重复定义
     CATEGORY_MAPPING = {
@@ -28,17 +230,27 @@ class DataPreparationModule:
     }
     CATEGORY_LABELS = list(set(CATEGORY_MAPPING.values()))
     
-    def __init__(self, data_path: str):
+    def __init__(self, data_path: str, num_workers: int = 1, batch_size: int = 64, parent_cache_size: int = 128):
         """
         初始化数据准备模块
         
         Args:
             data_path: 数据文件夹路径
+            num_workers: 加载文件的并行进程数，1表示串行
+            batch_size: 并行加载时每批分发的文件数
+            parent_cache_size: 父文档存储的LRU缓存大小
         """
         self.data_path = data_path
+        self.num_workers = num_workers
+        self.batch_size = batch_size
+        self.parent_cache_size = parent_cache_size
         self.documents: List[Document] = []  # 父文档（完整食谱）
         self.chunks: List[Document] = []     # 子文档（按标题分割的小块）
         self.parent_child_map: Dict[str, str] = {}  # 子块ID -> 父文档ID的映射
+        self.parent_index: Dict[str, Document] = {}  # 父文档ID -> 父文档
+        self.chunk_index: Dict[str, Document] = {}   # 子块ID -> 子块
+        self.parent_store: Optional[ParentDocumentStore] = None  # 父文档正文的磁盘存储（按需读取）
+        self._markdown_splitter: Optional[MarkdownHeaderTextSplitter] = None
 
     def clean_academic_markdown(self, text: str) -> str:
         """
@@ -85,48 +297,62 @@ class DataPreparationModule:
         """
         logger.info(f"正在从 {self.data_path} 加载文档...")
         
-        # 直接读取Markdown文件以保持原始格式
-        documents = []
+        # 直接读取Markdown文件以保持原始格式（按路径排序，保证文档顺序确定）
         data_path_obj = Path(self.data_path)
-
-        for md_file in data_path_obj.rglob("*.md"):
-            try:
-                # 直接读取文件内容，保持Markdown格式
-                with open(md_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-
-                cleaned_content = self.clean_academic_markdown(content)
-
-                # 为每个父文档分配确定性的唯一ID（基于数据根目录的相对路径）
-                try:
-                    data_root = Path(self.data_path).resolve()
-                    relative_path = Path(md_file).resolve().relative_to(data_root).as_posix()
-                except Exception:
-                    relative_path = Path(md_file).as_posix()
-                parent_id = hashlib.md5(relative_path.encode("utf-8")).hexdigest()
-
-                # 创建Document对象
-                doc = Document(
-                    page_content=cleaned_content,
-                    metadata={
-                        "source": str(md_file),
-                        "parent_id": parent_id,
-                        "doc_type": "parent"  # 标记为父文档
-                    }
-                )
-                documents.append(doc)
-
-            except Exception as e:
-                logger.warning(f"读取文件 {md_file} 失败: {e}")
-        
-        # 增强文档元数据
-        for doc in documents:
-            self._enhance_metadata(doc)
+        md_files = sorted(data_path_obj.rglob("*.md"))
+        # 逐个消费加载结果，不在加载器之外再缓冲一份列表
+        documents = []
+        for doc in iter_markdown_files(self, md_files, self.num_workers, self.batch_size):
+            documents.append(doc)
         
         self.documents = documents
+        self._build_lookup_indexes()
         logger.info(f"成功加载 {len(documents)} 个文档")
         return documents
-    
+
+    def _load_file(self, md_file: Path) -> Optional[Document]:
+        """
+        读取、清洗单个Markdown文件并构建父文档
+
+        Args:
+            md_file: 文件路径
+
+        Returns:
+            父文档，读取失败时返回None
+        """
+        try:
+            # 直接读取文件内容，保持Markdown格式
+            with open(md_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+
+            cleaned_content = self.clean_academic_markdown(content)
+
+            # 为每个父文档分配确定性的唯一ID（基于数据根目录的相对路径）
+            try:
+                data_root = Path(self.data_path).resolve()
+                relative_path = Path(md_file).resolve().relative_to(data_root).as_posix()
+            except Exception:
+                relative_path = Path(md_file).as_posix()
+            parent_id = hashlib.md5(relative_path.encode("utf-8")).hexdigest()
+
+            # 创建Document对象
+            doc = Document(
+                page_content=cleaned_content,
+                metadata={
+                    "source": str(md_file),
+                    "parent_id": parent_id,
+                    "doc_type": "parent"  # 标记为父文档
+                }
+            )
+
+            # 增强文档元数据
+            self._enhance_metadata(doc)
+            return doc
+
+        except Exception as e:
+            logger.warning(f"读取文件 {md_file} 失败: {e}")
+            return None
+
     def _enhance_metadata(self, doc: Document):
         """
         增强文档元数据
@@ -173,11 +399,12 @@ class DataPreparationModule:
         for i, chunk in enumerate(chunks):
             if 'chunk_id' not in chunk.metadata:
                 # 如果没有chunk_id（比如分割失败的情况），则生成一个
-                chunk.metadata['chunk_id'] = str(uuid.uuid4())
+                chunk.metadata['chunk_id'] = make_chunk_id(chunk.metadata.get('parent_id', ''), 0, chunk.page_content)
             chunk.metadata['batch_index'] = i  # 在当前批次中的索引
             chunk.metadata['chunk_size'] = len(chunk.page_content)
 
         self.chunks = chunks
+        self._build_lookup_indexes()
         logger.info(f"Markdown分块完成，共生成 {len(chunks)} 个chunk")
         return chunks
 
@@ -188,68 +415,87 @@ class DataPreparationModule:
         Returns:
             按标题结构分割的文档列表
         """
-        # 定义要分割的标题层级
-        headers_to_split_on = [
-            ("#", "Header 1"),
-            ("##", "Header 2"),
-            ("###", "Header 3")
-        ]
-
-        # 创建Markdown分割器
-        markdown_splitter = MarkdownHeaderTextSplitter(
-            headers_to_split_on=headers_to_split_on,
-            strip_headers=False  # 保留标题，便于理解上下文
-        )
-
         all_chunks = []
 
         for doc in self.documents:
-            try:
-                # 检查文档内容是否包含Markdown标题
-                content_preview = doc.page_content[:200]
-                has_headers = any(line.strip().startswith('#') for line in content_preview.split('\n'))
+            all_chunks.extend(self._split_document(doc))
 
-                if not has_headers:
-                    logger.warning(f"文档 {doc.metadata.get('case_report_id', '未知')} 内容中没有发现Markdown标题")
-                    logger.debug(f"内容预览: {content_preview}")
+        logger.info(f"Markdown结构分割完成，生成 {len(all_chunks)} 个结构化块")
+        return all_chunks
 
-                # 对每个文档进行Markdown分割
-                md_chunks = markdown_splitter.split_text(doc.page_content)
+    def _split_document(self, doc: Document) -> List[Document]:
+        """
+        对单个父文档进行Markdown标题分割，并建立父子映射
 
-                logger.debug(f"文档 {doc.metadata.get('case_report_id', '未知')} 分割成 {len(md_chunks)} 个chunk")
+        Args:
+            doc: 父文档
 
-                # 如果没有分割成功，说明文档可能没有标题结构
-                if len(md_chunks) <= 1:
-                    logger.warning(f"文档 {doc.metadata.get('case_report_id', '未知')} 未能按标题分割，可能缺少标题结构")
+        Returns:
+            子块列表
+        """
+        try:
+            # 检查文档内容是否包含Markdown标题
+            content_preview = doc.page_content[:200]
+            has_headers = any(line.strip().startswith('#') for line in content_preview.split('\n'))
 
-                # 为每个子块建立与父文档的关系
-                parent_id = doc.metadata["parent_id"]
+            if not has_headers:
+                logger.warning(f"文档 {doc.metadata.get('case_report_id', '未知')} 内容中没有发现Markdown标题")
+                logger.debug(f"内容预览: {content_preview}")
 
-                for i, chunk in enumerate(md_chunks):
-                    # 为子块分配唯一ID
-                    child_id = str(uuid.uuid4())
+            # 对每个文档进行Markdown分割
+            md_chunks = self._get_markdown_splitter().split_text(doc.page_content)
 
-                    # 合并原文档元数据和新的标题元数据
-                    chunk.metadata.update(doc.metadata)
-                    chunk.metadata.update({
-                        "chunk_id": child_id,
-                        "parent_id": parent_id,
-                        "doc_type": "child",  # 标记为子文档
-                        "chunk_index": i      # 在父文档中的位置
-                    })
+            logger.debug(f"文档 {doc.metadata.get('case_report_id', '未知')} 分割成 {len(md_chunks)} 个chunk")
 
-                    # 建立父子映射关系
-                    self.parent_child_map[child_id] = parent_id
+            # 如果没有分割成功，说明文档可能没有标题结构
+            if len(md_chunks) <= 1:
+                logger.warning(f"文档 {doc.metadata.get('case_report_id', '未知')} 未能按标题分割，可能缺少标题结构")
 
-                all_chunks.extend(md_chunks)
+            # 为每个子块建立与父文档的关系
+            parent_id = doc.metadata["parent_id"]
 
-            except Exception as e:
-                logger.warning(f"文档 {doc.metadata.get('source', '未知')} Markdown分割失败: {e}")
-                # 如果Markdown分割失败，将整个文档作为一个chunk
-                all_chunks.append(doc)
+            for i, chunk in enumerate(md_chunks):
+                # 为子块分配确定性的唯一ID
+                child_id = make_chunk_id(parent_id, i, chunk.page_content)
 
-        logger.info(f"Markdown结构分割完成，生成 {len(all_chunks)} 个结构化块")
-        return all_chunks
+                # 合并原文档元数据和新的标题元数据
+                chunk.metadata.update(doc.metadata)
+                chunk.metadata.update({
+                    "chunk_id": child_id,
+                    "parent_id": parent_id,
+                    "doc_type": "child",  # 标记为子文档
+                    "chunk_index": i,     # 在父文档中的位置
+                    "chunk_size": len(chunk.page_content)
+                })
+
+                # 建立父子映射关系
+                self.parent_child_map[child_id] = parent_id
+
+            return md_chunks
+
+        except Exception as e:
+            logger.warning(f"文档 {doc.metadata.get('source', '未知')} Markdown分割失败: {e}")
+            # 如果Markdown分割失败，将整个文档作为一个chunk
+            doc.metadata.setdefault('chunk_id', make_chunk_id(doc.metadata['parent_id'], 0, doc.page_content))
+            doc.metadata['chunk_size'] = len(doc.page_content)
+            return [doc]
+
+    def _get_markdown_splitter(self) -> MarkdownHeaderTextSplitter:
+        """获取（复用）Markdown标题分割器"""
+        if self._markdown_splitter is None:
+            # 定义要分割的标题层级
+            headers_to_split_on = [
+                ("#", "Header 1"),
+                ("##", "Header 2"),
+                ("###", "Header 3")
+            ]
+
+            # 创建Markdown分割器
+            self._markdown_splitter = MarkdownHeaderTextSplitter(
+                headers_to_split_on=headers_to_split_on,
+                strip_headers=False  # 保留标题，便于理解上下文
+            )
+        return self._markdown_splitter
 
     def filter_documents_by_category(self, category: str) -> List[Document]:
         """
@@ -259,9 +505,11 @@ class DataPreparationModule:
             category: 疾病种类
             
         Returns:
-            过滤后的文档列表
+            过滤后的文档列表（含正文，已持久化时从父文档存储读取）
         """
-        return [doc for doc in self.documents if doc.metadata.get('category') == category]
+        # 批量读取不经过LRU缓存，避免冲掉检索热点文档
+        return [self._resolve_parent(doc, use_cache=False) for doc in self.documents
+                if doc.metadata.get('category') == category]
 
     
     def get_statistics(self) -> Dict[str, Any]:
@@ -304,7 +552,7 @@ class DataPreparationModule:
                 'source': doc.metadata.get('source'),
                 'case_report_id': doc.metadata.get('case_report_id'),
                 'category': doc.metadata.get('category'),
-                'content_length': len(doc.page_content)
+                'content_length': doc.metadata.get('content_length', len(doc.page_content))
             })
         
         with open(output_path, 'w', encoding='utf-8') as f:
@@ -333,12 +581,11 @@ class DataPreparationModule:
                 # 增加相关性计数
                 parent_relevance[parent_id] = parent_relevance.get(parent_id, 0) + 1
 
-                # 缓存父文档（避免重复查找）
+                # 通过父文档索引O(1)查找
                 if parent_id not in parent_docs_map:
-                    for doc in self.documents:
-                        if doc.metadata.get("parent_id") == parent_id:
-                            parent_docs_map[parent_id] = doc
-                            break
+                    doc = self.get_parent_by_id(parent_id)
+                    if doc is not None:
+                        parent_docs_map[parent_id] = doc
 
         # 按相关性排序（匹配次数多的排在前面）
         sorted_parent_ids = sorted(parent_relevance.keys(),
@@ -363,19 +610,29 @@ class DataPreparationModule:
         return parent_docs
 
 
-class GuidelineDataPreparationModule:
+class GuidelineDataPreparationModule(ParentChildStoreMixin):
     """指南数据准备模块 - 负责层级化数据的加载、清洗和切分"""
 
-    def __init__(self, data_path: str):
+    def __init__(self, data_path: str, num_workers: int = 1, batch_size: int = 64, parent_cache_size: int = 128):
         """
         初始化
         Args:
             data_path: 数据根目录路径
+            num_workers: 加载文件的并行进程数，1表示串行
+            batch_size: 并行加载时每批分发的文件数
+            parent_cache_size: 父文档存储的LRU缓存大小
         """
         self.data_path = Path(data_path)
+        self.num_workers = num_workers
+        self.batch_size = batch_size
+        self.parent_cache_size = parent_cache_size
         self.documents: List[Document] = []  # 父文档 (对应物理文件 partX.md)
         self.chunks: List[Document] = []  # 子文档 (切分后的知识点)
         self.parent_child_map: Dict[str, str] = {}  # 子ID -> 父ID
+        self.parent_index: Dict[str, Document] = {}  # 父ID -> 父文档
+        self.chunk_index: Dict[str, Document] = {}  # 子ID -> 子块
+        self.parent_store: Optional[ParentDocumentStore] = None  # 父文档正文的磁盘存储（按需读取）
+        self._markdown_splitter: Optional[MarkdownHeaderTextSplitter] = None
 
     def clean_guideline_markdown(self, text: str) -> str:
         """
@@ -461,51 +718,64 @@ class GuidelineDataPreparationModule:
         """加载并解析指南文档"""
         logger.info(f"正在从 {self.data_path} 加载指南数据...")
 
+        # 遍历所有 md 文件（按路径排序，保证文档顺序确定）
+        md_files = sorted(self.data_path.rglob("*.md"))
         documents = []
+        for doc in iter_markdown_files(self, md_files, self.num_workers, self.batch_size):
+            documents.append(doc)
 
-        # 遍历所有 md 文件
-        for md_file in self.data_path.rglob("*.md"):
-            try:
-                # 1. 解析路径元数据
-                meta = self._parse_path_metadata(md_file)
-                if not meta["is_valid"]:
-                    continue
-
-                # 2. 读取并清洗内容
-                with open(md_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-
-                cleaned_content = self.clean_guideline_markdown(content)
+        self.documents = documents
+        self._build_lookup_indexes()
+        logger.info(f"成功加载 {len(documents)} 个指南文件 (Parts)")
+        return documents
 
-                # 3. 生成父文档ID (基于相对路径的哈希，确保幂等性)
-                rel_path_str = md_file.relative_to(self.data_path).as_posix()
-                parent_id = hashlib.md5(rel_path_str.encode("utf-8")).hexdigest()
+    def _load_file(self, md_file: Path) -> Optional[Document]:
+        """
+        解析路径元数据、读取并清洗单个指南文件
 
-                # 4. 构建文档对象
-                doc_metadata = {
-                    "source": str(md_file),
-                    "parent_id": parent_id,
-                    "doc_type": "parent",
-                    # 注入解析出的层级信息
-                    "book_name": meta["book_name"],
-                    "chapter_index": meta["chapter_index"],
-                    "chapter_name": meta["chapter_name"],
-                    "part_index": meta["part_index"],
-                    "citation_source": meta["hierarchy_string"]  # 供RAG引用的字段
-                }
+        Args:
+            md_file: 文件路径
 
-                doc = Document(
-                    page_content=cleaned_content,
-                    metadata=doc_metadata
-                )
-                documents.append(doc)
+        Returns:
+            父文档，路径层级无效或处理失败时返回None
+        """
+        try:
+            # 1. 解析路径元数据
+            meta = self._parse_path_metadata(md_file)
+            if not meta["is_valid"]:
+                return None
+
+            # 2. 读取并清洗内容
+            with open(md_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+
+            cleaned_content = self.clean_guideline_markdown(content)
+
+            # 3. 生成父文档ID (基于相对路径的哈希，确保幂等性)
+            rel_path_str = md_file.relative_to(self.data_path).as_posix()
+            parent_id = hashlib.md5(rel_path_str.encode("utf-8")).hexdigest()
+
+            # 4. 构建文档对象
+            doc_metadata = {
+                "source": str(md_file),
+                "parent_id": parent_id,
+                "doc_type": "parent",
+                # 注入解析出的层级信息
+                "book_name": meta["book_name"],
+                "chapter_index": meta["chapter_index"],
+                "chapter_name": meta["chapter_name"],
+                "part_index": meta["part_index"],
+                "citation_source": meta["hierarchy_string"]  # 供RAG引用的字段
+            }
 
-            except Exception as e:
-                logger.error(f"处理文件 {md_file} 时发生错误: {e}")
+            return Document(
+                page_content=cleaned_content,
+                metadata=doc_metadata
+            )
 
-        self.documents = documents
-        logger.info(f"成功加载 {len(documents)} 个指南文件 (Parts)")
-        return documents
+        except Exception as e:
+            logger.error(f"处理文件 {md_file} 时发生错误: {e}")
+            return None
 
     def chunk_documents(self) -> List[Document]:
         """
@@ -516,59 +786,77 @@ class GuidelineDataPreparationModule:
         if not self.documents:
             raise ValueError("请先调用 load_documents()")
 
-        headers_to_split_on = [
-            ("#", "Header 1"),
-            ("##", "Header 2"),
-            ("###", "Header 3"),
-        ]
-
-        markdown_splitter = MarkdownHeaderTextSplitter(
-            headers_to_split_on=headers_to_split_on,
-            strip_headers=False  # 保留标题在正文中，对理解上下文很有帮助
-        )
-
         all_chunks = []
 
         for doc in self.documents:
-            parent_id = doc.metadata["parent_id"]
+            all_chunks.extend(self._split_document(doc))
 
-            # 执行切分
-            # 注意：HeaderSplitter 会把标题放入 metadata，我们需要合并回去
-            md_chunks = markdown_splitter.split_text(doc.page_content)
+        self.chunks = all_chunks
+        self._build_lookup_indexes()
+        logger.info(f"分块完成，共生成 {len(all_chunks)} 个知识切片")
+        return all_chunks
 
-            for i, chunk in enumerate(md_chunks):
-                # 生成子块ID
-                child_id = str(uuid.uuid4())
+    def _split_document(self, doc: Document) -> List[Document]:
+        """
+        对单个指南文件进行标题切分，并建立父子映射
 
-                # 1. 继承父文档的所有元数据 (Book, Chapter, etc.)
-                chunk.metadata.update(doc.metadata)
+        Args:
+            doc: 父文档
 
-                # 2. 添加子块特有元数据
-                chunk.metadata.update({
-                    "chunk_id": child_id,
-                    "doc_type": "child",
-                    "chunk_index": i,
-                    "chunk_size": len(chunk.page_content)
-                })
+        Returns:
+            子块列表
+        """
+        parent_id = doc.metadata["parent_id"]
 
-                # 3. 处理 Header 元数据 (将 Header 1/2/3 组合成一个 context 字段)
-                headers = []
-                if "Header 1" in chunk.metadata: headers.append(chunk.metadata["Header 1"])
-                if "Header 2" in chunk.metadata: headers.append(chunk.metadata["Header 2"])
-                if "Header 3" in chunk.metadata: headers.append(chunk.metadata["Header 3"])
+        # 执行切分
+        # 注意：HeaderSplitter 会把标题放入 metadata，我们需要合并回去
+        md_chunks = self._get_markdown_splitter().split_text(doc.page_content)
 
-                # 构建一个语义更丰富的 context 字符串，存入 metadata 供 向量检索 增强使用
-                # 格式: Adult Isthmic Spondylolisthesis > Diagnosis > Header 1 > Header 2
-                full_context = f"{doc.metadata['book_name']} > {doc.metadata['chapter_name']} > {' > '.join(headers)}"
-                chunk.metadata["semantic_context"] = full_context
+        for i, chunk in enumerate(md_chunks):
+            # 生成确定性的子块ID
+            child_id = make_chunk_id(parent_id, i, chunk.page_content)
 
-                # 记录映射
-                self.parent_child_map[child_id] = parent_id
-                all_chunks.append(chunk)
+            # 1. 继承父文档的所有元数据 (Book, Chapter, etc.)
+            chunk.metadata.update(doc.metadata)
 
-        self.chunks = all_chunks
-        logger.info(f"分块完成，共生成 {len(all_chunks)} 个知识切片")
-        return all_chunks
+            # 2. 添加子块特有元数据
+            chunk.metadata.update({
+                "chunk_id": child_id,
+                "doc_type": "child",
+                "chunk_index": i,
+                "chunk_size": len(chunk.page_content)
+            })
+
+            # 3. 处理 Header 元数据 (将 Header 1/2/3 组合成一个 context 字段)
+            headers = []
+            if "Header 1" in chunk.metadata: headers.append(chunk.metadata["Header 1"])
+            if "Header 2" in chunk.metadata: headers.append(chunk.metadata["Header 2"])
+            if "Header 3" in chunk.metadata: headers.append(chunk.metadata["Header 3"])
+
+            # 构建一个语义更丰富的 context 字符串，存入 metadata 供 向量检索 增强使用
+            # 格式: Adult Isthmic Spondylolisthesis > Diagnosis > Header 1 > Header 2
+            full_context = f"{doc.metadata['book_name']} > {doc.metadata['chapter_name']} > {' > '.join(headers)}"
+            chunk.metadata["semantic_context"] = full_context
+
+            # 记录映射
+            self.parent_child_map[child_id] = parent_id
+
+        return md_chunks
+
+    def _get_markdown_splitter(self) -> MarkdownHeaderTextSplitter:
+        """获取（复用）Markdown标题分割器"""
+        if self._markdown_splitter is None:
+            headers_to_split_on = [
+                ("#", "Header 1"),
+                ("##", "Header 2"),
+                ("###", "Header 3"),
+            ]
+
+            self._markdown_splitter = MarkdownHeaderTextSplitter(
+                headers_to_split_on=headers_to_split_on,
+                strip_headers=False  # 保留标题在正文中，对理解上下文很有帮助
+            )
+        return self._markdown_splitter
 
     def get_parent_documents(self, child_chunks: List[Document]) -> List[Document]:
         """
@@ -578,14 +866,11 @@ class GuidelineDataPreparationModule:
         parent_ids = set()
         retrieved_parents = []
 
-        # 建立父文档索引以便快速查找
-        parent_map = {doc.metadata["parent_id"]: doc for doc in self.documents}
-
         for chunk in child_chunks:
             p_id = chunk.metadata.get("parent_id")
             if p_id and p_id not in parent_ids:
-                if p_id in parent_map:
-                    parent_doc = parent_map[p_id]
+                parent_doc = self.get_parent_by_id(p_id)
+                if parent_doc is not None:
                     parent_ids.add(p_id)
                     retrieved_parents.append(parent_doc)
 
@@ -0,0 +1,212 @@
+"""
+文档存储模块
+"""
+
+import json
+import logging
+import mmap
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentStore:
+    """子块存储 - 每条记录一行JSON，热启动时整体读取"""
+
+    # 仅在检索时写入的临时元数据，不持久化
+    TRANSIENT_METADATA_KEYS = ("rrf_score",)
+
+    @staticmethod
+    def _path(save_path: str, name: str) -> Path:
+        return Path(save_path) / f"{name}.jsonl"
+
+    @classmethod
+    def write(cls, save_path: str, name: str, documents: Sequence[Document]):
+        """
+        写入文档存储
+
+        Args:
+            save_path: 保存目录
+            name: 存储名称（如 chunks）
+            documents: 文档列表
+        """
+        data_file = cls._path(save_path, name)
+        data_file.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(data_file, 'w', encoding='utf-8') as f:
+            for doc in documents:
+                metadata = {key: value for key, value in doc.metadata.items()
+                            if key not in cls.TRANSIENT_METADATA_KEYS}
+                f.write(json.dumps({"page_content": doc.page_content, "metadata": metadata}, ensure_ascii=False))
+                f.write("\n")
+        logger.info(f"文档存储已保存: {data_file} ({len(documents)} 条)")
+
+    @classmethod
+    def load(cls, save_path: str, name: str) -> Optional[List[Document]]:
+        """
+        读取文档存储中的全部文档
+
+        Args:
+            save_path: 保存目录
+            name: 存储名称
+
+        Returns:
+            文档列表，不存在时返回None
+        """
+        data_file = cls._path(save_path, name)
+        if not data_file.exists():
+            return None
+        documents = []
+        with open(data_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                documents.append(Document(page_content=record["page_content"], metadata=record["metadata"]))
+        return documents
+
+
+class ParentDocumentStore:
+    """父文档存储 - 单个按记录压缩、偏移索引的文件，正文按需读取，前置小型LRU缓存"""
+
+    def __init__(self, save_path: str, name: str = "parents", cache_size: int = 128):
+        """
+        打开父文档存储
+
+        Args:
+            save_path: 保存目录
+            name: 存储名称
+            cache_size: LRU缓存的父文档数量
+        """
+        data_file, offsets_file, meta_file = self._paths(save_path, name)
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            metadatas: List[Dict] = json.load(f)
+        self.offsets = np.load(offsets_file, mmap_mode='r')
+        self.id_to_row = {metadata["parent_id"]: row for row, metadata in enumerate(metadatas)}
+        # 元数据只以占位文档的形式保留一份，数据模块直接引用这些占位文档
+        self._stubs = [Document(page_content="", metadata=metadata) for metadata in metadatas]
+
+        self._file = open(data_file, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._stubs else None
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _paths(save_path: str, name: str):
+        path = Path(save_path)
+        return path / f"{name}.bin", path / f"{name}.offsets.npy", path / f"{name}.meta.json"
+
+    @classmethod
+    def exists(cls, save_path: str, name: str = "parents") -> bool:
+        """存储文件是否齐全"""
+        return all(path.exists() for path in cls._paths(save_path, name))
+
+    @classmethod
+    def write(cls, save_path: str, documents: Iterable[Document], name: str = "parents", level: int = 6):
+        """
+        写入父文档存储（先写临时文件再替换，允许从旧存储流式读取后覆盖）
+
+        Args:
+            save_path: 保存目录
+            documents: 父文档（需包含 parent_id 元数据）
+            name: 存储名称
+            level: zlib压缩级别
+        """
+        data_file, offsets_file, meta_file = cls._paths(save_path, name)
+        data_file.parent.mkdir(parents=True, exist_ok=True)
+
+        metadatas = []
+        offsets = [0]
+        raw_bytes = 0
+        tmp_data_file = data_file.with_suffix(".bin.tmp")
+        with open(tmp_data_file, 'wb') as f:
+            for doc in documents:
+                metadata = {key: value for key, value in doc.metadata.items()
+                            if key not in DocumentStore.TRANSIENT_METADATA_KEYS}
+                record = json.dumps({"page_content": doc.page_content, "metadata": metadata},
+                                    ensure_ascii=False).encode("utf-8")
+                compressed = zlib.compress(record, level)
+                f.write(compressed)
+                offsets.append(offsets[-1] + len(compressed))
+                metadatas.append(dict(metadata, content_length=len(doc.page_content)))
+                raw_bytes += len(record)
+
+        tmp_offsets_file = offsets_file.with_suffix(".tmp.npy")
+        np.save(tmp_offsets_file, np.asarray(offsets, dtype=np.int64))
+        tmp_meta_file = meta_file.with_suffix(".json.tmp")
+        with open(tmp_meta_file, 'w', encoding='utf-8') as f:
+            json.dump(metadatas, f, ensure_ascii=False)
+
+        os.replace(tmp_data_file, data_file)
+        os.replace(tmp_offsets_file, offsets_file)
+        os.replace(tmp_meta_file, meta_file)
+        logger.info(f"父文档存储已保存: {len(metadatas)} 个文档, 压缩后 {offsets[-1] / 1024 / 1024:.1f} MB "
+                    f"(原始 {raw_bytes / 1024 / 1024:.1f} MB)")
+
+    def __len__(self) -> int:
+        return len(self._stubs)
+
+    def __contains__(self, parent_id: str) -> bool:
+        return parent_id in self.id_to_row
+
+    def stubs(self) -> List[Document]:
+        """仅包含元数据的父文档列表（正文为空），用于常驻内存；返回的是存储持有的同一批对象"""
+        return list(self._stubs)
+
+    def get(self, parent_id: str, use_cache: bool = True) -> Optional[Document]:
+        """
+        按父文档ID读取完整父文档
+
+        Args:
+            parent_id: 父文档ID
+            use_cache: 是否经过LRU缓存（全量重写存储时关闭，避免冲掉热点文档）
+
+        Returns:
+            父文档，不存在时返回None
+        """
+        if not use_cache:
+            return self._read(parent_id)
+
+        with self._lock:
+            doc = self._cache.get(parent_id)
+            if doc is not None:
+                self._cache.move_to_end(parent_id)
+                self.hits += 1
+                return doc
+
+        doc = self._read(parent_id)
+        if doc is None:
+            return None
+
+        with self._lock:
+            self.misses += 1
+            self._cache[parent_id] = doc
+            self._cache.move_to_end(parent_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return doc
+
+    def _read(self, parent_id: str) -> Optional[Document]:
+        """从内存映射文件解压读取一条记录"""
+        row = self.id_to_row.get(parent_id)
+        if row is None:
+            return None
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        record = json.loads(zlib.decompress(self._mmap[start:end]))
+        return Document(page_content=record["page_content"], metadata=record["metadata"])
+
+    def close(self):
+        """关闭内存映射"""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
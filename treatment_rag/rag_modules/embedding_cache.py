@@ -0,0 +1,248 @@
+"""
+嵌入缓存模块
+"""
+
+import json
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """磁盘嵌入缓存 - 以 (模型名称, 规范化文本哈希) 为键，向量存于内存映射的float32矩阵"""
+
+    VECTORS_FILE = "embeddings.f32"
+    KEYS_FILE = "embedding_keys.json"
+
+    def __init__(self, cache_path: str, namespace: str):
+        """
+        初始化嵌入缓存
+
+        Args:
+            cache_path: 缓存目录
+            namespace: 缓存命名空间（通常为嵌入模型名称），不同模型的向量互不命中
+        """
+        self.cache_path = Path(cache_path)
+        self.namespace = namespace
+        self.dim: Optional[int] = None
+        self.keys: List[str] = []
+        self.key_to_row: Dict[str, int] = {}
+        self.vectors: Optional[np.ndarray] = None
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """规范化文本：合并空白，避免仅空白差异导致缓存失效"""
+        return " ".join(text.split())
+
+    def make_key(self, text: str) -> str:
+        """生成缓存键"""
+        payload = f"{self.namespace}\x00{self.normalize_text(text)}"
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _load(self):
+        """加载键索引并内存映射向量矩阵"""
+        keys_file = self.cache_path / self.KEYS_FILE
+        vectors_file = self.cache_path / self.VECTORS_FILE
+        if not keys_file.exists() or not vectors_file.exists():
+            return
+
+        try:
+            with open(keys_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("namespace") != self.namespace:
+                logger.info(f"嵌入缓存命名空间不一致({meta.get('namespace')})，忽略已有缓存")
+                return
+
+            self.dim = meta["dim"]
+            self.keys = meta["keys"]
+            self.key_to_row = {key: row for row, key in enumerate(self.keys)}
+            self._map_vectors()
+            logger.info(f"嵌入缓存已加载: {len(self.keys)} 条 ({self.cache_path})")
+        except Exception as e:
+            logger.warning(f"加载嵌入缓存失败: {e}，将重新建立缓存")
+            self.dim = None
+            self.keys = []
+            self.key_to_row = {}
+            self.vectors = None
+
+    def _map_vectors(self):
+        """以只读方式内存映射向量文件"""
+        if not self.keys:
+            self.vectors = None
+            return
+        self.vectors = np.memmap(
+            self.cache_path / self.VECTORS_FILE,
+            dtype=np.float32,
+            mode='r',
+            shape=(len(self.keys), self.dim)
+        )
+
+    def lookup(self, texts: Sequence[str]) -> Tuple[List[Optional[np.ndarray]], List[str]]:
+        """
+        批量查询缓存
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            (与texts对齐的向量列表，未命中为None；每个文本对应的缓存键)
+        """
+        keys = [self.make_key(text) for text in texts]
+        vectors: List[Optional[np.ndarray]] = []
+        for key in keys:
+            row = self.key_to_row.get(key)
+            if row is None:
+                self.misses += 1
+                vectors.append(None)
+            else:
+                self.hits += 1
+                vectors.append(np.asarray(self.vectors[row]))
+        return vectors, keys
+
+    def add(self, keys: Sequence[str], vectors: np.ndarray):
+        """
+        追加向量到缓存并持久化
+
+        Args:
+            keys: 缓存键列表
+            vectors: 与keys对齐的向量矩阵
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(keys) == 0:
+            return
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"向量维度不一致: {vectors.shape[1]} != {self.dim}")
+
+        new_rows = [(key, vector) for key, vector in zip(keys, vectors) if key not in self.key_to_row]
+        if not new_rows:
+            return
+
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        # 先释放旧的映射，从最后一条已登记的向量之后写入（丢弃异常中断残留的半截数据）
+        self.vectors = None
+        vectors_file = self.cache_path / self.VECTORS_FILE
+        with open(vectors_file, 'r+b' if vectors_file.exists() else 'wb') as f:
+            f.seek(len(self.keys) * self.dim * 4)
+            f.truncate()
+            for key, vector in new_rows:
+                f.write(vector.tobytes())
+                self.key_to_row[key] = len(self.keys)
+                self.keys.append(key)
+
+        self._save_keys()
+        self._map_vectors()
+
+    def _save_keys(self):
+        """原子写入键索引"""
+        keys_file = self.cache_path / self.KEYS_FILE
+        tmp_file = keys_file.with_suffix(".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"namespace": self.namespace, "dim": self.dim, "keys": self.keys}, f)
+        os.replace(tmp_file, keys_file)
+
+
+class QueryEmbeddingCache:
+    """查询向量内存缓存 - 规范化查询文本 -> 向量，按LRU淘汰，可设置过期时间和内存上限"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: Optional[float] = None):
+        """
+        初始化查询向量缓存
+
+        Args:
+            max_bytes: 缓存占用内存上限（按向量字节数与键长度估算）
+            ttl: 条目过期秒数，为None时不过期
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()  # 键 -> (向量, 写入时间, 估算字节数)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text: str) -> str:
+        """规范化查询文本作为缓存键"""
+        return EmbeddingCache.normalize_text(text)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """
+        查询缓存
+
+        Args:
+            text: 查询文本
+
+        Returns:
+            缓存的向量，未命中或已过期时返回None
+        """
+        key = self.make_key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, text: str, vector: Sequence[float]):
+        """
+        写入缓存，超出内存上限时淘汰最久未使用的条目
+
+        Args:
+            text: 查询文本
+            vector: 查询向量
+        """
+        key = self.make_key(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        vector.flags.writeable = False
+        size = vector.nbytes + len(key.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (vector, time.monotonic(), size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        """命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
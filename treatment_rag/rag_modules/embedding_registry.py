@@ -0,0 +1,156 @@
+"""
+嵌入模型注册模块
+"""
+
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from langchain_core.embeddings import Embeddings
+from sentence_transformers import SentenceTransformer
+
+from .embedding_cache import QueryEmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingModelRegistry:
+    """进程级嵌入模型注册表 - 相同模型路径共享同一个已加载实例，按引用计数释放"""
+
+    _lock = threading.Lock()
+    _models: Dict[str, SentenceTransformer] = {}
+    _ref_counts: Dict[str, int] = {}
+    _query_caches: Dict[str, QueryEmbeddingCache] = {}  # "模型键@截断维度" -> 共享的查询向量缓存
+
+    @staticmethod
+    def _model_key(model_name: str) -> str:
+        """本地路径统一解析为绝对路径，避免同一模型因写法不同被重复加载"""
+        path = Path(model_name)
+        return str(path.resolve()) if path.exists() else model_name
+
+    @classmethod
+    def acquire(cls, model_name: str) -> SentenceTransformer:
+        """
+        获取嵌入模型，首次获取时加载，之后引用计数加一
+
+        Args:
+            model_name: 模型名称或本地路径
+
+        Returns:
+            共享的 SentenceTransformer 实例
+        """
+        key = cls._model_key(model_name)
+        with cls._lock:
+            if key not in cls._models:
+                logger.info(f"正在加载嵌入模型: {model_name}")
+                cls._models[key] = SentenceTransformer(model_name)
+                cls._ref_counts[key] = 0
+            else:
+                logger.info(f"复用已加载的嵌入模型: {model_name}")
+            cls._ref_counts[key] += 1
+            return cls._models[key]
+
+    @classmethod
+    def release(cls, model_name: str):
+        """
+        释放一次引用，引用计数归零时卸载模型
+
+        Args:
+            model_name: 模型名称或本地路径
+        """
+        key = cls._model_key(model_name)
+        with cls._lock:
+            if key not in cls._ref_counts:
+                logger.warning(f"嵌入模型未加载，无需释放: {model_name}")
+                return
+
+            cls._ref_counts[key] -= 1
+            if cls._ref_counts[key] <= 0:
+                del cls._models[key]
+                del cls._ref_counts[key]
+                for cache_key in [k for k in cls._query_caches if k.rsplit("@", 1)[0] == key]:
+                    del cls._query_caches[cache_key]
+                logger.info(f"嵌入模型已卸载: {model_name}")
+
+    @classmethod
+    def query_cache(cls, model_name: str, dim: Optional[int], max_bytes: int,
+                    ttl: Optional[float] = None) -> Optional[QueryEmbeddingCache]:
+        """
+        获取模型共享的查询向量缓存，同一模型、同一截断维度只创建一个，随模型卸载一并丢弃
+
+        Args:
+            model_name: 模型名称或本地路径（需已通过 acquire 加载）
+            dim: Matryoshka截断维度，为None时表示完整维度
+            max_bytes: 首次创建时的内存上限
+            ttl: 首次创建时的过期秒数
+
+        Returns:
+            共享的 QueryEmbeddingCache，模型未加载时返回None
+        """
+        key = cls._model_key(model_name)
+        with cls._lock:
+            if key not in cls._models:
+                logger.warning(f"嵌入模型未加载，不创建查询向量缓存: {model_name}")
+                return None
+            cache_key = f"{key}@{dim or 'full'}"
+            if cache_key not in cls._query_caches:
+                cls._query_caches[cache_key] = QueryEmbeddingCache(max_bytes, ttl)
+            return cls._query_caches[cache_key]
+
+    @classmethod
+    def ref_count(cls, model_name: str) -> int:
+        """获取模型当前引用计数"""
+        with cls._lock:
+            return cls._ref_counts.get(cls._model_key(model_name), 0)
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """SentenceTransformer 的 langchain Embeddings 适配器（输出归一化向量，可按Matryoshka方式截断维度）"""
+
+    def __init__(self, model: SentenceTransformer, batch_size: int = 32, dim: Optional[int] = None,
+                 query_cache=None):
+        """
+        初始化适配器
+
+        Args:
+            model: 已加载的 SentenceTransformer 模型
+            batch_size: 编码批大小
+            dim: 输出维度，取向量前dim维并重新归一化；为None时使用模型完整维度
+            query_cache: 查询向量缓存（QueryEmbeddingCache），为None时每次都编码
+        """
+        full_dim = model.get_sentence_embedding_dimension()
+        if dim is not None and full_dim is not None and not 0 < dim <= full_dim:
+            raise ValueError(f"嵌入维度 {dim} 超出模型维度范围 (1~{full_dim})")
+        self.model = model
+        self.batch_size = batch_size
+        self.dim = dim
+        self.query_cache = query_cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """向量化文档文本"""
+        vectors = self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        )
+        if self.dim is not None and vectors.shape[1] > self.dim:
+            vectors = vectors[:, :self.dim]
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """向量化查询文本（优先查询缓存）"""
+        if self.query_cache is None:
+            return self.embed_documents([text])[0]
+
+        cached = self.query_cache.get(text)
+        if cached is not None:
+            return cached.tolist()
+        vector = self.embed_documents([text])[0]
+        self.query_cache.put(text, vector)
+        return vector
@@ -2,68 +2,25 @@
 生成集成模块
 """
 
+import asyncio
 import os
+import re
+import json
 import logging
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple
 
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
 from langchain_community.chat_models.moonshot import MoonshotChat
 from langchain_deepseek import ChatDeepSeek
 from langchain_core.documents import Document
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 
-logger = logging.getLogger(__name__)
-
-class GenerationIntegrationModule:
-    """生成集成模块 - 负责LLM集成和回答生成"""
-    
-    def __init__(self, model_name: str = "kimi-k2-0711-preview", temperature: float = 0.1, max_tokens: int = 2048):
-        """
-        初始化生成集成模块
-        
-        Args:
-            model_name: 模型名称
-            temperature: 生成温度
-            max_tokens: 最大token数
-        """
-        self.model_name = model_name
-        self.temperature = temperature
-        self.max_tokens = max_tokens
-        self.llm = None
-        self.setup_llm()
-    
-    def setup_llm(self):
-        """初始化大语言模型"""
-        logger.info(f"正在初始化LLM: {self.model_name}")
-
-        api_key = "sk-4f4fdb5581e045bc9426add277a90735"
-        if not api_key:
-            raise ValueError("请设置 MOONSHOT_API_KEY 环境变量")
-
-        self.llm = ChatDeepSeek(
-            model=self.model_name,
-            temperature=self.temperature,
-            max_tokens=self.max_tokens,
-            api_key=api_key
-        )
-        
-        logger.info("LLM初始化完成")
-    
-    def generate_basic_answer(self, query: str, context_docs: List[Document]) -> str:
-        """
-        生成基础回答
+from .context_builder import ContextBuilder, TokenCounter
 
-        Args:
-            query: 用户查询
-            context_docs: 上下文文档列表
-
-        Returns:
-            生成的回答
-        """
-        context = self._build_context(context_docs)
+logger = logging.getLogger(__name__)
 
-        prompt = ChatPromptTemplate.from_template("""
+# 基础回答提示词
+BASIC_ANSWER_PROMPT = ChatPromptTemplate.from_template("""
 你是一位专业的骨科专家。请根据以下疾病信息回答用户的问题。
 
 用户问题: {question}
@@ -75,31 +32,8 @@ class GenerationIntegrationModule:
 
 回答:""")
 
-        # 使用LCEL构建链
-        chain = (
-            {"question": RunnablePassthrough(), "context": lambda _: context}
-            | prompt
-            | self.llm
-            | StrOutputParser()
-        )
-
-        response = chain.invoke(query)
-        return response
-    
-    def generate_step_by_step_answer(self, query: str, context_docs: List[Document]) -> str:
-        """
-        生成分步骤回答
-
-        Args:
-            query: 用户查询
-            context_docs: 上下文文档列表
-
-        Returns:
-            分步骤的详细回答
-        """
-        context = self._build_context(context_docs)
-
-        prompt = ChatPromptTemplate.from_template("""
+# 分步骤回答提示词
+STEP_BY_STEP_PROMPT = ChatPromptTemplate.from_template("""
 你是一位资深的脊柱外科与康复医学专家。请根据提供的医学知识库内容，为用户提供专业的疾病解析与治疗建议。
 
 用户问题: {question}
@@ -126,28 +60,9 @@ class GenerationIntegrationModule:
 
 回答:""")
 
-        chain = (
-            {"question": RunnablePassthrough(), "context": lambda _: context}
-            | prompt
-            | self.llm
-            | StrOutputParser()
-        )
-
-        response = chain.invoke(query)
-        return response
-
-    def query_rewrite(self, query: str) -> str:
-        """
-        智能查询重写 - 让大模型判断是否需要重写查询
-
-        Args:
-            query: 原始查询
-
-        Returns:
-            重写后的查询或原查询
-        """
-        prompt = PromptTemplate(
-            template="""
+# 查询重写提示词
+QUERY_REWRITE_PROMPT = PromptTemplate(
+    template="""
 你是一个专业的医学查询分析助手。请分析用户关于脊柱健康的查询，判断是否需要重写，以优化在医学知识库中的检索效果。
 
 原始查询: {query}
@@ -178,27 +93,166 @@ class GenerationIntegrationModule:
 - "颈椎病吃什么药" → "颈椎病吃什么药"（保持原查询）
 
 请输出最终查询（如果不需要重写就返回原查询）:""",
-            input_variables=["query"]
-        )
+    input_variables=["query"]
+)
+
+# 查询路由提示词
+QUERY_ROUTER_PROMPT = ChatPromptTemplate.from_template("""
+根据用户关于脊柱健康的问题，将其准确分类为以下三种类型之一：
+
+1. 'list' - 用户想要获取各种疾病的治疗方案、科室推荐或药品。
+   例如：腰椎间盘突出应该怎么治疗、推荐几种缓解颈椎痛的膏药。
+
+2. 'detail' - 用户询问具体的治疗操作、康复锻炼步骤、手术细节或用药指导。
+   例如：小燕飞怎么做、腰椎微创手术的过程是怎样的、这种药一天吃几次、术后如何翻身。
+
+3. 'general' - 用户询问疾病的定义、发病原理、检查报告解读或预防常识。
+   例如：什么是椎管狭窄、核磁共振结果怎么看、久坐为什么会导致腰痛、颈椎病的危害。
+
+请只返回分类结果：list、detail 或 general
+
+用户问题: {query}
+
+分类结果:""")
+
+# 查询分析提示词（路由+重写，JSON输出）
+QUERY_ANALYSIS_PROMPT = ChatPromptTemplate.from_template("""
+你是一个专业的医学查询分析助手。请对用户关于脊柱健康的问题同时完成两项任务。
+
+任务一：将问题分类为以下三种类型之一
+1. 'list' - 用户想要获取各种疾病的治疗方案、科室推荐或药品。
+   例如：腰椎间盘突出应该怎么治疗、推荐几种缓解颈椎痛的膏药。
+2. 'detail' - 用户询问具体的治疗操作、康复锻炼步骤、手术细节或用药指导。
+   例如：小燕飞怎么做、腰椎微创手术的过程是怎样的、这种药一天吃几次、术后如何翻身。
+3. 'general' - 用户询问疾病的定义、发病原理、检查报告解读或预防常识。
+   例如：什么是椎管狭窄、核磁共振结果怎么看、久坐为什么会导致腰痛、颈椎病的危害。
+
+任务二：判断是否需要重写查询，以优化在医学知识库中的检索效果
+- 具体明确的查询（包含具体疾病名称、解剖位置、明确症状或术语）直接返回原查询。
+- 模糊、宽泛或口语化的查询需要重写：将口语转换为规范的医学描述，增加"病因分析"、"治疗方案"或"康复锻炼"等引导词，
+  严禁改变用户描述的部位或症状性质，重写后的短语应简洁、利于检索。
+- 示例："腰痛" → "腰痛的常见病因与治疗建议"；"脖子难受" → "颈椎不适的缓解方法与康复锻炼"；
+  "腰快断了" → "急性腰部剧烈疼痛的处理方案"；"颈椎病吃什么药" → "颈椎病吃什么药"（保持原查询）
+
+用户问题: {query}
 
-        chain = (
-            {"query": RunnablePassthrough()}
-            | prompt
-            | self.llm
-            | StrOutputParser()
+请只输出一个JSON对象，不要输出其他内容，格式如下：
+{{"route": "list|detail|general", "rewritten_query": "重写后的查询"}}""")
+
+class GenerationIntegrationModule:
+    """生成集成模块 - 负责LLM集成和回答生成"""
+    
+    def __init__(self, model_name: str = "kimi-k2-0711-preview", temperature: float = 0.1, max_tokens: int = 2048,
+                 context_max_tokens: int = 3000, context_tokenizer: Optional[str] = "cl100k_base"):
+        """
+        初始化生成集成模块
+        
+        Args:
+            model_name: 模型名称
+            temperature: 生成温度
+            max_tokens: 最大token数
+            context_max_tokens: 上下文token预算
+            context_tokenizer: 计算上下文token数的tiktoken编码名，未安装tiktoken或为空时按字符估算
+        """
+        self.model_name = model_name
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.context_builder = ContextBuilder(max_tokens=context_max_tokens,
+                                              token_counter=TokenCounter(context_tokenizer))
+        self.llm = None
+        self.basic_answer_chain = None
+        self.step_by_step_chain = None
+        self.query_rewrite_chain = None
+        self.query_router_chain = None
+        self.query_analysis_chain = None
+        self.setup_llm()
+    
+    def setup_llm(self):
+        """初始化大语言模型"""
+        logger.info(f"正在初始化LLM: {self.model_name}")
+
+        api_key = "sk-4f4fdb5581e045bc9426add277a90735"
+        if not api_key:
+            raise ValueError("请设置 MOONSHOT_API_KEY 环境变量")
+
+        self.llm = ChatDeepSeek(
+            model=self.model_name,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            api_key=api_key
         )
+        
+        self._build_chains()
+        logger.info("LLM初始化完成")
 
-        response = chain.invoke(query).strip()
+    def _build_chains(self):
+        """
+        构建提示词链（只构建一次，各请求共享）
 
-        # 记录重写结果
-        if response != query:
-            logger.info(f"查询已重写: '{query}' → '{response}'")
-        else:
-            logger.info(f"查询无需重写: '{query}'")
+        回答链的输入为 {"question", "context"}，查询分析类链的输入为 {"query"}
+        """
+        parser = StrOutputParser()
+        self.basic_answer_chain = BASIC_ANSWER_PROMPT | self.llm | parser
+        self.step_by_step_chain = STEP_BY_STEP_PROMPT | self.llm | parser
+        self.query_rewrite_chain = QUERY_REWRITE_PROMPT | self.llm | parser
+        self.query_router_chain = QUERY_ROUTER_PROMPT | self.llm | parser
+        self.query_analysis_chain = QUERY_ANALYSIS_PROMPT | self.llm | parser
+    
+    def generate_basic_answer(self, query: str, context_docs: List[Document],
+                              child_chunks: Optional[List[Document]] = None) -> str:
+        """
+        生成基础回答
+
+        Args:
+            query: 用户查询
+            context_docs: 上下文文档列表
+            child_chunks: 检索到的子块，用于按相关章节裁剪父文档
+
+        Returns:
+            生成的回答
+        """
+        context = self._build_context(context_docs, child_chunks)
+        response = self.basic_answer_chain.invoke({"question": query, "context": context})
+        return response
+    
+    def generate_step_by_step_answer(self, query: str, context_docs: List[Document],
+                                     child_chunks: Optional[List[Document]] = None) -> str:
+        """
+        生成分步骤回答
+
+        Args:
+            query: 用户查询
+            context_docs: 上下文文档列表
+            child_chunks: 检索到的子块，用于按相关章节裁剪父文档
 
+        Returns:
+            分步骤的详细回答
+        """
+        context = self._build_context(context_docs, child_chunks)
+        response = self.step_by_step_chain.invoke({"question": query, "context": context})
         return response
 
+    def query_rewrite(self, query: str) -> str:
+        """
+        智能查询重写 - 让大模型判断是否需要重写查询
+
+        Args:
+            query: 原始查询
+
+        Returns:
+            重写后的查询或原查询
+        """
+        response = self.query_rewrite_chain.invoke({"query": query}).strip()
+        self._log_rewrite(query, response)
+        return response
 
+    @staticmethod
+    def _log_rewrite(query: str, response: str):
+        """记录重写结果"""
+        if response != query:
+            logger.info(f"查询已重写: '{query}' → '{response}'")
+        else:
+            logger.info(f"查询无需重写: '{query}'")
 
     def query_router(self, query: str) -> str:
         """
@@ -210,38 +264,73 @@ class GenerationIntegrationModule:
         Returns:
             路由类型 ('list', 'detail', 'general')
         """
-        prompt = ChatPromptTemplate.from_template("""
-根据用户关于脊柱健康的问题，将其准确分类为以下三种类型之一：
+        return self._normalize_route(self.query_router_chain.invoke({"query": query}))
 
-1. 'list' - 用户想要获取各种疾病的治疗方案、科室推荐或药品。
-   例如：腰椎间盘突出应该怎么治疗、推荐几种缓解颈椎痛的膏药。
+    @staticmethod
+    def _normalize_route(result: str) -> str:
+        """确保返回有效的路由类型"""
+        result = result.strip().lower()
+        if result in ['list', 'detail', 'general']:
+            return result
+        else:
+            return 'general'  # 默认类型
 
-2. 'detail' - 用户询问具体的治疗操作、康复锻炼步骤、手术细节或用药指导。
-   例如：小燕飞怎么做、腰椎微创手术的过程是怎样的、这种药一天吃几次、术后如何翻身。
+    def analyze_query(self, query: str) -> Tuple[str, str]:
+        """
+        查询分析 - 一次LLM调用同时完成查询路由和查询重写（JSON输出）
 
-3. 'general' - 用户询问疾病的定义、发病原理、检查报告解读或预防常识。
-   例如：什么是椎管狭窄、核磁共振结果怎么看、久坐为什么会导致腰痛、颈椎病的危害。
+        Args:
+            query: 用户查询
 
-请只返回分类结果：list、detail 或 general
+        Returns:
+            (路由类型, 重写后的查询)；列表查询保持原查询
+        """
+        return self._finish_query_analysis(self.query_analysis_chain.invoke({"query": query}), query)
 
-用户问题: {query}
+    def _finish_query_analysis(self, response: str, query: str) -> Tuple[str, str]:
+        """解析查询分析结果并记录日志；列表查询保持原查询"""
+        route, rewritten_query = self._parse_query_analysis(response, query)
 
-分类结果:""")
+        # 列表查询保持原查询
+        if route == 'list':
+            rewritten_query = query
 
-        chain = (
-            {"query": RunnablePassthrough()}
-            | prompt
-            | self.llm
-            | StrOutputParser()
-        )
+        if rewritten_query != query:
+            logger.info(f"查询分析: 类型 {route}，查询已重写: '{query}' → '{rewritten_query}'")
+        else:
+            logger.info(f"查询分析: 类型 {route}，查询无需重写: '{query}'")
+        return route, rewritten_query
 
-        result = chain.invoke(query).strip().lower()
+    @staticmethod
+    def _parse_query_analysis(response: str, query: str) -> Tuple[str, str]:
+        """
+        解析查询分析结果，JSON解析失败时按文本兜底
 
-        # 确保返回有效的路由类型
-        if result in ['list', 'detail', 'general']:
-            return result
-        else:
-            return 'general'  # 默认类型
+        Args:
+            response: LLM输出
+            query: 原始查询
+
+        Returns:
+            (路由类型, 重写后的查询)
+        """
+        text = response.strip()
+        # 去掉可能的 ```json 代码块包裹，截取第一个JSON对象
+        match = re.search(r'\{.*\}', text, re.DOTALL)
+        if match:
+            try:
+                result = json.loads(match.group(0))
+                route = str(result.get("route", "")).strip().lower()
+                rewritten_query = str(result.get("rewritten_query") or "").strip() or query
+                return (route if route in ['list', 'detail', 'general'] else 'general'), rewritten_query
+            except (json.JSONDecodeError, AttributeError):
+                pass
+
+        logger.warning(f"查询分析结果不是有效的JSON，按文本解析: {text[:100]}")
+        route_match = re.search(r'\b(list|detail|general)\b', text, re.IGNORECASE)
+        route = route_match.group(1).lower() if route_match else 'general'
+        query_match = re.search(r'"?rewritten_query"?\s*[:：]\s*"?([^"\n]+)"?', text)
+        rewritten_query = query_match.group(1).strip() if query_match else query
+        return route, rewritten_query
 
     def generate_list_answer(self, query: str, context_docs: List[Document]) -> str:
         """
@@ -272,124 +361,149 @@ class GenerationIntegrationModule:
         else:
             return f"为您推荐以下治疗方案：\n" + "\n".join([f"{i+1}. {name}" for i, name in enumerate(dish_names[:3])]) + f"\n\n还有其他 {len(dish_names)-3} 道菜品可供选择。"
 
-    def generate_basic_answer_stream(self, query: str, context_docs: List[Document]):
+    def generate_basic_answer_stream(self, query: str, context_docs: List[Document],
+                                     child_chunks: Optional[List[Document]] = None):
         """
         生成基础回答 - 流式输出
 
         Args:
             query: 用户查询
             context_docs: 上下文文档列表
+            child_chunks: 检索到的子块，用于按相关章节裁剪父文档
 
         Yields:
             生成的回答片段
         """
-        context = self._build_context(context_docs)
-
-        prompt = ChatPromptTemplate.from_template("""
-你是一位专业的骨科专家。请根据以下疾病信息回答用户的问题。
-
-用户问题: {question}
-
-相关治疗方案:
-{context}
-
-请提供详细、实用的回答。如果信息不足，请诚实说明。
-
-回答:""")
-
-        chain = (
-            {"question": RunnablePassthrough(), "context": lambda _: context}
-            | prompt
-            | self.llm
-            | StrOutputParser()
-        )
-
-        for chunk in chain.stream(query):
+        context = self._build_context(context_docs, child_chunks)
+        for chunk in self.basic_answer_chain.stream({"question": query, "context": context}):
             yield chunk
 
-    def generate_step_by_step_answer_stream(self, query: str, context_docs: List[Document]):
+    def generate_step_by_step_answer_stream(self, query: str, context_docs: List[Document],
+                                            child_chunks: Optional[List[Document]] = None):
         """
         生成详细步骤回答 - 流式输出
 
         Args:
             query: 用户查询
             context_docs: 上下文文档列表
+            child_chunks: 检索到的子块，用于按相关章节裁剪父文档
 
         Yields:
             详细步骤回答片段
         """
-        context = self._build_context(context_docs)
+        context = self._build_context(context_docs, child_chunks)
+        for chunk in self.step_by_step_chain.stream({"question": query, "context": context}):
+            yield chunk
 
-        prompt = ChatPromptTemplate.from_template("""
-你是一位资深的脊柱外科与康复医学专家。请根据提供的医学知识库内容，为用户提供专业的疾病解析与治疗建议。
+    # ==================== 异步接口 ====================
+    # 上下文构建（token计数、章节裁剪）是CPU密集的同步操作，在线程中执行以免阻塞事件循环
 
-用户问题: {question}
+    async def agenerate_basic_answer(self, query: str, context_docs: List[Document],
+                                     child_chunks: Optional[List[Document]] = None) -> str:
+        """
+        生成基础回答（异步）
 
-相关医学背景/知识图谱信息:
-{context}
+        Args:
+            query: 用户查询
+            context_docs: 上下文文档列表
+            child_chunks: 检索到的子块，用于按相关章节裁剪父文档
 
-请灵活组织回答，建议包含以下部分（可根据实际内容调整）：
+        Returns:
+            生成的回答
+        """
+        context = await asyncio.to_thread(self._build_context, context_docs, child_chunks)
+        return await self.basic_answer_chain.ainvoke({"question": query, "context": context})
 
-## 📋 建议治疗方案
-[基于知识库，列出分阶段的治疗建议，如：保守治疗（药物、物理）、微创干预或手术方案]
+    async def agenerate_step_by_step_answer(self, query: str, context_docs: List[Document],
+                                            child_chunks: Optional[List[Document]] = None) -> str:
+        """
+        生成分步骤回答（异步）
 
-## 🧘‍♀️ 康复指导与锻炼
-[详细的操作说明，包含具体的动作名称、频率、持续时间以及禁忌事项。如原文包含“康复动作”，请务必详细罗列]
+        Args:
+            query: 用户查询
+            context_docs: 上下文文档列表
+            child_chunks: 检索到的子块，用于按相关章节裁剪父文档
 
-## ⚠️ 专家提醒
-[仅在有关键风险点或生活注意事项时包含。优先使用原文中的风险提示。如果没有额外的注意事项，可以基于临床经验总结关键要点，例如“何时需要立即就医”或“生活姿势矫正”，或者完全省略此部分]
+        Returns:
+            分步骤的详细回答
+        """
+        context = await asyncio.to_thread(self._build_context, context_docs, child_chunks)
+        return await self.step_by_step_chain.ainvoke({"question": query, "context": context})
 
-注意：
-- 保持医学术语的专业性，同时确保普通用户易于理解。
-- 严禁强行提供知识库中未提及的医疗诊断建议。
-- 重点突出方案的安全性与可操作性（例如：明确标注“请在专业人员指导下进行”）。
-- 如果没有具体的康复动作或注意事项，可以省略相应部分。
+    async def agenerate_basic_answer_stream(self, query: str, context_docs: List[Document],
+                                            child_chunks: Optional[List[Document]] = None) -> AsyncIterator[str]:
+        """
+        生成基础回答 - 异步流式输出
 
-回答:""")
+        Args:
+            query: 用户查询
+            context_docs: 上下文文档列表
+            child_chunks: 检索到的子块，用于按相关章节裁剪父文档
 
-        chain = (
-            {"question": RunnablePassthrough(), "context": lambda _: context}
-            | prompt
-            | self.llm
-            | StrOutputParser()
-        )
+        Yields:
+            生成的回答片段
+        """
+        context = await asyncio.to_thread(self._build_context, context_docs, child_chunks)
+        async for chunk in self.basic_answer_chain.astream({"question": query, "context": context}):
+            yield chunk
+
+    async def agenerate_step_by_step_answer_stream(self, query: str, context_docs: List[Document],
+                                                   child_chunks: Optional[List[Document]] = None
+                                                   ) -> AsyncIterator[str]:
+        """
+        生成详细步骤回答 - 异步流式输出
 
-        for chunk in chain.stream(query):
+        Args:
+            query: 用户查询
+            context_docs: 上下文文档列表
+            child_chunks: 检索到的子块，用于按相关章节裁剪父文档
+
+        Yields:
+            详细步骤回答片段
+        """
+        context = await asyncio.to_thread(self._build_context, context_docs, child_chunks)
+        async for chunk in self.step_by_step_chain.astream({"question": query, "context": context}):
             yield chunk
 
-    def _build_context(self, docs: List[Document], max_length: int = 2000) -> str:
+    async def aquery_rewrite(self, query: str) -> str:
+        """查询重写（异步），见 query_rewrite"""
+        response = (await self.query_rewrite_chain.ainvoke({"query": query})).strip()
+        self._log_rewrite(query, response)
+        return response
+
+    async def aquery_router(self, query: str) -> str:
+        """查询路由（异步），见 query_router"""
+        return self._normalize_route(await self.query_router_chain.ainvoke({"query": query}))
+
+    async def aanalyze_query(self, query: str) -> Tuple[str, str]:
+        """查询分析（异步），见 analyze_query"""
+        return self._finish_query_analysis(await self.query_analysis_chain.ainvoke({"query": query}), query)
+
+    def _build_context(self, docs: List[Document], child_chunks: Optional[List[Document]] = None) -> str:
         """
-        构建上下文字符串
+        构建上下文字符串（按token预算在文档之间分配，父文档只保留与子块相关的章节）
         
         Args:
             docs: 文档列表
-            max_length: 最大长度
+            child_chunks: 检索到的子块
             
         Returns:
             格式化的上下文字符串
         """
         if not docs:
             return "暂无相关疾病信息。"
-        
-        context_parts = []
-        current_length = 0
-        
-        for i, doc in enumerate(docs, 1):
-            # 添加元数据信息
-            metadata_info = f"【治疗方案 {i}】"
-            if 'case_report_id' in doc.metadata:
-                metadata_info += f" {doc.metadata['case_report_id']}"
-            if 'category' in doc.metadata:
-                metadata_info += f" | 分类: {doc.metadata['category']}"
-            
-            # 构建文档文本
-            doc_text = f"{metadata_info}\n{doc.page_content}\n"
-            
-            # 检查长度限制
-            if current_length + len(doc_text) > max_length:
-                break
-            
-            context_parts.append(doc_text)
-            current_length += len(doc_text)
-        
-        return "\n" + "="*50 + "\n".join(context_parts)
+
+        packed = self.context_builder.build(docs, child_chunks, header_fn=self._context_header)
+        logger.info(f"上下文: {len(packed.documents)} 个文档, {packed.tokens_used}/{packed.token_budget} tokens"
+                    f" (裁剪 {packed.truncated}, 未纳入 {packed.dropped})")
+        return packed.text or "暂无相关疾病信息。"
+
+    @staticmethod
+    def _context_header(i: int, doc: Document) -> str:
+        """上下文中每个文档的标题行（元数据信息）"""
+        metadata_info = f"【治疗方案 {i}】"
+        if 'case_report_id' in doc.metadata:
+            metadata_info += f" {doc.metadata['case_report_id']}"
+        if 'category' in doc.metadata:
+            metadata_info += f" | 分类: {doc.metadata['category']}"
+        return metadata_info
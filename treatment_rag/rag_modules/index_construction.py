@@ -3,31 +3,65 @@
 """
 
 import logging
-from typing import List
+from typing import List, Optional
 from pathlib import Path
 
+import numpy as np
+
 from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
-from sentence_transformers import SentenceTransformer
+
+from .bm25_index import BM25Index
+from .embedding_cache import EmbeddingCache, QueryEmbeddingCache
+from .corpus_manifest import CorpusManifest
+from .metadata_bitmap import MetadataBitmapIndex
+from .embedding_registry import EmbeddingModelRegistry, SentenceTransformerEmbeddings
+from .tokenization import TokenCache, get_tokenizer
+from .vector_index import (IndexMeta, VectorIndexParams, apply_search_params, create_index, describe_index,
+                           ensure_direct_map, train_index)
 
 logger = logging.getLogger(__name__)
 
 class IndexConstructionModule:
     """索引构建模块 - 负责向量化和索引构建"""
 
-    def __init__(self, model_name: str = "BAAI/bge-small-zh-v1.5", index_save_path: str = "./vector_index"):
+    def __init__(self, model_name: str = "BAAI/bge-small-zh-v1.5", index_save_path: str = "./vector_index",
+                 bm25_tokenizer: str = "mixed", embedding_cache_path: Optional[str] = None,
+                 index_params: Optional[VectorIndexParams] = None, embedding_dim: Optional[int] = None,
+                 query_cache_mb: float = 0, query_cache_ttl: Optional[float] = None):
         """
         初始化索引构建模块
 
         Args:
             model_name: 嵌入模型名称
             index_save_path: 索引保存路径
+            bm25_tokenizer: BM25分词器名称（whitespace / mixed）
+            embedding_cache_path: 文档嵌入缓存目录，为None时不使用缓存
+            index_params: FAISS索引类型及参数，默认为扁平索引
+            embedding_dim: Matryoshka截断后的向量维度，为None时使用模型完整维度
+            query_cache_mb: 查询向量缓存的内存上限（MB），为0时不缓存
+            query_cache_ttl: 查询向量缓存的过期秒数，为None时不过期
         """
         self.model_name = model_name
         self.index_save_path = index_save_path
         self.embeddings = None
+        self.embedding_model = None
         self.vectorstore = None
+        self.bm25_index = None
+        self.vector_bitmaps: Optional[MetadataBitmapIndex] = None  # 按FAISS内部ID的元数据位图，随索引保存
+        self.index_params = index_params or VectorIndexParams()
+        self.output_dim = embedding_dim
+        self.tokenizer = get_tokenizer(bm25_tokenizer)
+        self.token_cache = TokenCache.load(index_save_path, self.tokenizer.name)
+        # 截断维度不同的向量互不命中
+        cache_namespace = f"{model_name}@{embedding_dim}" if embedding_dim else model_name
+        self.embedding_cache = EmbeddingCache(embedding_cache_path, namespace=cache_namespace) if embedding_cache_path else None
+        self.query_cache_bytes = int(query_cache_mb * 1024 * 1024)
+        self.query_cache_ttl = query_cache_ttl
+        self.query_cache: Optional[QueryEmbeddingCache] = None  # 由注册表按模型共享
+        self.manifest = CorpusManifest.load(index_save_path)
         self.setup_embeddings()
     
     def setup_embeddings(self):
@@ -39,9 +73,26 @@ class IndexConstructionModule:
         #     model_kwargs={'device': 'cpu'},
         #     encode_kwargs={'normalize_embeddings': True}
         # )
-        self.embeddings = SentenceTransformer(self.model_name)
+        # 通过注册表获取模型，同一进程内相同模型路径只加载一次
+        self.embedding_model = EmbeddingModelRegistry.acquire(self.model_name)
+        # 两个语料的索引模块使用同一模型，查询向量缓存也随模型共享
+        if self.query_cache_bytes > 0:
+            self.query_cache = EmbeddingModelRegistry.query_cache(self.model_name, self.output_dim,
+                                                                  self.query_cache_bytes, self.query_cache_ttl)
+        self.embeddings = SentenceTransformerEmbeddings(self.embedding_model, dim=self.output_dim,
+                                                        query_cache=self.query_cache)
         
         logger.info("嵌入模型初始化完成")
+
+    def release_embeddings(self):
+        """释放对共享嵌入模型的引用（最后一个引用释放时注册表卸载模型，已构建的向量存储需一并丢弃）"""
+        if self.embedding_model is None:
+            return
+
+        EmbeddingModelRegistry.release(self.model_name)
+        self.embedding_model = None
+        self.embeddings = None
+        self.query_cache = None
     
     def build_vector_index(self, chunks: List[Document]) -> FAISS:
         """
@@ -58,15 +109,100 @@ class IndexConstructionModule:
         if not chunks:
             raise ValueError("文档块列表不能为空")
         
+        # 先查嵌入缓存，只对未命中的文档块调用编码器
+        texts = [chunk.page_content for chunk in chunks]
+        vectors = self.embed_texts(texts)
+
         # 构建FAISS向量存储
-        self.vectorstore = FAISS.from_documents(
-            documents=chunks,
-            embedding=self.embeddings
+        self.vectorstore = self._create_vectorstore(
+            texts, vectors, [chunk.metadata for chunk in chunks], self._chunk_ids(chunks)
         )
+        self.share_chunk_documents(chunks)
         
         logger.info(f"向量索引构建完成，包含 {len(chunks)} 个向量")
         return self.vectorstore
+
+    def _create_vectorstore(self, texts: List[str], vectors: np.ndarray, metadatas: List[dict],
+                            ids: Optional[List[str]]) -> FAISS:
+        """按配置的索引类型创建、训练FAISS索引并写入向量"""
+        index = create_index(self.embedding_dim(vectors), len(texts), self.index_params)
+        if len(texts):
+            train_index(index, vectors, self.index_params.train_sample_size)
+        apply_search_params(index, self.index_params)
+        # 过滤检索需按ID取回向量，IVF索引在写入向量前建立直接映射表，避免查询时修改索引
+        if index.is_trained:
+            ensure_direct_map(index)
+
+        vectorstore = FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={}
+        )
+        if len(texts):
+            vectorstore.add_embeddings(text_embeddings=list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+        self.vector_bitmaps = MetadataBitmapIndex.build([Document(page_content="", metadata=m) for m in metadatas])
+        logger.info(f"向量索引类型: {describe_index(index)}")
+        return vectorstore
+
+    def embedding_dim(self, vectors: Optional[np.ndarray] = None) -> int:
+        """向量维度"""
+        if vectors is not None and len(vectors):
+            return int(vectors.shape[1])
+        if self.output_dim:
+            return self.output_dim
+        return int(self.embedding_model.get_sentence_embedding_dimension())
+
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        向量化文档文本，优先使用嵌入缓存
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            向量矩阵 (len(texts), dim)
+        """
+        if not texts:
+            return np.empty((0, self.embedding_dim()), dtype=np.float32)
+
+        if self.embedding_cache is None:
+            return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+
+        cached, keys = self.embedding_cache.lookup(texts)
+
+        # 未命中的文本去重后批量编码
+        missing = {}
+        for i, vector in enumerate(cached):
+            if vector is None:
+                missing.setdefault(keys[i], texts[i])
+        logger.info(f"嵌入缓存命中 {len(texts) - sum(v is None for v in cached)}/{len(texts)}，需编码 {len(missing)} 个文本")
+
+        if missing:
+            missing_keys = list(missing.keys())
+            new_vectors = np.asarray(self.embeddings.embed_documents(list(missing.values())), dtype=np.float32)
+            self.embedding_cache.add(missing_keys, new_vectors)
+            encoded = dict(zip(missing_keys, new_vectors))
+            cached = [vector if vector is not None else encoded[keys[i]] for i, vector in enumerate(cached)]
+
+        return np.vstack(cached).astype(np.float32)
     
+    def build_bm25_index(self, chunks: List[Document]) -> BM25Index:
+        """
+        构建BM25索引，随向量索引一同保存
+
+        Args:
+            chunks: 文档块列表
+
+        Returns:
+            BM25索引对象
+        """
+        if not chunks:
+            raise ValueError("文档块列表不能为空")
+
+        self.bm25_index = BM25Index.build(chunks, tokenizer=self.tokenizer, token_cache=self.token_cache)
+        return self.bm25_index
+
     def add_documents(self, new_chunks: List[Document]):
         """
         向现有索引添加新文档
@@ -78,9 +214,132 @@ class IndexConstructionModule:
             raise ValueError("请先构建向量索引")
         
         logger.info(f"正在添加 {len(new_chunks)} 个新文档到索引...")
-        self.vectorstore.add_documents(new_chunks)
+        texts = [chunk.page_content for chunk in new_chunks]
+        self.vectorstore.add_embeddings(
+            text_embeddings=list(zip(texts, self.embed_texts(texts))),
+            metadatas=[chunk.metadata for chunk in new_chunks],
+            ids=self._chunk_ids(new_chunks)
+        )
+        self.vector_bitmaps.append(new_chunks)
+        self.share_chunk_documents(new_chunks)
         logger.info("新文档添加完成")
 
+    def share_chunk_documents(self, chunks: List[Document]) -> int:
+        """
+        让向量库docstore直接引用传入的子块对象
+
+        FAISS写入时会复制元数据，热启动时docstore与文档存储又各自反序列化一份正文；
+        替换为同一批子块对象后，正文和元数据在内存中只保留一份。
+
+        Args:
+            chunks: 子块列表（通常为数据模块的 chunks）
+
+        Returns:
+            替换的文档数
+        """
+        if not self.vectorstore:
+            return 0
+
+        store = getattr(self.vectorstore.docstore, "_dict", None)
+        if store is None:
+            return 0
+        shared = 0
+        for chunk in chunks:
+            chunk_id = chunk.metadata.get("chunk_id")
+            existing = store.get(chunk_id)
+            # 旧索引的docstore ID可能不是chunk_id，内容不一致时保留原对象
+            if isinstance(existing, Document) and existing is not chunk and existing.page_content == chunk.page_content:
+                store[chunk_id] = chunk
+                shared += 1
+        return shared
+
+    def delete_documents(self, chunk_ids: List[str]):
+        """
+        按子块ID从现有索引删除向量
+
+        Args:
+            chunk_ids: 子块ID列表
+        """
+        if not self.vectorstore:
+            raise ValueError("请先构建向量索引")
+
+        # 向量库中的文档ID通常即为chunk_id；兼容旧索引时按元数据中的chunk_id查找
+        targets = set(chunk_ids)
+        docstore_ids = []
+        for docstore_id in self.vectorstore.index_to_docstore_id.values():
+            if docstore_id in targets:
+                docstore_ids.append(docstore_id)
+                continue
+            doc = self.vectorstore.docstore.search(docstore_id)
+            if isinstance(doc, Document) and doc.metadata.get("chunk_id") in targets:
+                docstore_ids.append(docstore_id)
+
+        if not docstore_ids:
+            logger.info("没有需要删除的向量")
+            return
+
+        if not self.index_params.supports_delete:
+            # IVF/HNSW索引删除后编号不连续或不支持删除，按剩余子块重建（向量走嵌入缓存）
+            removed = set(docstore_ids)
+            keep_ids = [docstore_id for docstore_id in self.vectorstore.index_to_docstore_id.values()
+                        if docstore_id not in removed]
+            logger.info(f"{self.index_params.index_type} 索引不支持直接删除，按剩余 {len(keep_ids)} 个子块重建...")
+            keep_docs = [self.vectorstore.docstore.search(docstore_id) for docstore_id in keep_ids]
+            texts = [doc.page_content for doc in keep_docs]
+            # 全部删除时重建为空索引（向量数不足以训练时 create_index 退化为扁平索引）
+            self.vectorstore = self._create_vectorstore(
+                texts, self.embed_texts(texts), [doc.metadata for doc in keep_docs], keep_ids
+            )
+            self.share_chunk_documents(keep_docs)
+            logger.info("向量删除完成")
+            return
+
+        logger.info(f"正在从索引删除 {len(docstore_ids)} 个向量...")
+        removed = set(docstore_ids)
+        rows = [i for i, docstore_id in self.vectorstore.index_to_docstore_id.items() if docstore_id in removed]
+        self.vectorstore.delete(docstore_ids)
+        self.vector_bitmaps.delete_rows(rows)
+        logger.info("向量删除完成")
+
+    @staticmethod
+    def build_vector_bitmaps(vectorstore: FAISS) -> MetadataBitmapIndex:
+        """扫描docstore按FAISS内部ID构建元数据位图（docstore中缺失的ID以None占位）"""
+        docs = []
+        for i in range(vectorstore.index.ntotal):
+            doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id.get(i, ""))
+            docs.append(doc if isinstance(doc, Document) else None)
+        return MetadataBitmapIndex.build(docs)
+
+    def record_manifest(self, data_root: Path, documents: List[Document]):
+        """
+        按当前向量索引中的子块重建语料清单
+
+        Args:
+            data_root: 数据根目录
+            documents: 已入库的父文档列表
+        """
+        if not self.vectorstore:
+            raise ValueError("请先构建或加载向量索引")
+
+        indexed_chunks = []
+        for docstore_id in self.vectorstore.index_to_docstore_id.values():
+            doc = self.vectorstore.docstore.search(docstore_id)
+            if isinstance(doc, Document):
+                # 清单中记录向量库实际使用的文档ID，保证之后可以按ID删除
+                indexed_chunks.append(Document(page_content="", metadata={
+                    "parent_id": doc.metadata.get("parent_id"),
+                    "chunk_id": docstore_id
+                }))
+        self.manifest.record_documents(data_root, documents, indexed_chunks)
+
+    @staticmethod
+    def _chunk_ids(chunks: List[Document]) -> Optional[List[str]]:
+        """以chunk_id作为向量库文档ID，缺失或重复时交由FAISS自动生成"""
+        ids = [chunk.metadata.get("chunk_id") for chunk in chunks]
+        if all(ids) and len(set(ids)) == len(ids):
+            return ids
+        return None
+
     def save_index(self):
         """
         保存向量索引到配置的路径
@@ -92,7 +351,39 @@ class IndexConstructionModule:
         Path(self.index_save_path).mkdir(parents=True, exist_ok=True)
 
         self.vectorstore.save_local(self.index_save_path)
+        self.vector_bitmaps.save(self.index_save_path)
+        IndexMeta.save(self.index_save_path, self.index_params, self.vectorstore.index,
+                       embedding_model=self.model_name, embedding_dim=self.output_dim)
         logger.info(f"向量索引已保存到: {self.index_save_path}")
+
+        if self.bm25_index is not None:
+            self.save_bm25_index()
+
+        self.manifest.save(self.index_save_path)
+
+    def save_bm25_index(self):
+        """
+        保存BM25索引到向量索引所在目录
+        """
+        if self.bm25_index is None:
+            raise ValueError("请先构建BM25索引")
+
+        self.bm25_index.save(self.index_save_path)
+        self.token_cache.save(self.index_save_path)
+
+    def load_bm25_index(self):
+        """
+        从向量索引所在目录加载BM25索引（内存映射）
+
+        Returns:
+            加载的BM25索引，如果不存在或加载失败返回None
+        """
+        try:
+            self.bm25_index = BM25Index.load(self.index_save_path)
+        except Exception as e:
+            logger.warning(f"加载BM25索引失败: {e}，将重新构建")
+            self.bm25_index = None
+        return self.bm25_index
     
     def load_index(self):
         """
@@ -114,7 +405,29 @@ class IndexConstructionModule:
                 self.embeddings,
                 allow_dangerous_deserialization=True
             )
+            meta = IndexMeta.load(self.index_save_path)
+            saved_type = meta["params"]["index_type"] if meta else "flat"
+            if saved_type != self.index_params.index_type:
+                logger.warning(f"已保存的向量索引类型({saved_type})与配置({self.index_params.index_type})不一致，将构建新索引")
+                self.vectorstore = None
+                return None
+
+            saved_dim = meta.get("embedding_dim") if meta else None
+            if saved_dim != self.output_dim:
+                logger.warning(f"已保存的向量索引嵌入维度({saved_dim or '完整'})与配置({self.output_dim or '完整'})不一致，将构建新索引")
+                self.vectorstore = None
+                return None
+
+            # 查询期参数以当前配置为准，可在不重建索引的情况下调整
+            apply_search_params(self.vectorstore.index, self.index_params)
+            ensure_direct_map(self.vectorstore.index)
+            self.vector_bitmaps = MetadataBitmapIndex.load(self.index_save_path)
+            if self.vector_bitmaps is None or self.vector_bitmaps.num_docs != self.vectorstore.index.ntotal:
+                # 旧版本保存的索引没有位图，按docstore补建一次，下次保存时一并持久化
+                logger.info("未找到与向量索引一致的元数据位图，按docstore重建")
+                self.vector_bitmaps = self.build_vector_bitmaps(self.vectorstore)
             logger.info(f"向量索引已从 {self.index_save_path} 加载")
+            self.load_bm25_index()
             return self.vectorstore
         except Exception as e:
             logger.warning(f"加载向量索引失败: {e}，将构建新索引")
@@ -0,0 +1,210 @@
+"""
+元数据位图索引模块
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# 默认建立位图的元数据字段
+DEFAULT_BITMAP_FIELDS = ("category", "book_name", "chapter_name", "doc_type")
+
+
+def _value_rows(docs: Sequence[Optional[Document]], field: str) -> Dict[Any, list]:
+    """字段取值 -> 文档序号列表（文档缺失、取值缺失或不可哈希时不计入）"""
+    rows: Dict[Any, list] = {}
+    for i, doc in enumerate(docs):
+        value = doc.metadata.get(field) if doc is not None else None
+        if value is None:
+            continue
+        try:
+            rows.setdefault(value, []).append(i)
+        except TypeError:
+            # 不可哈希的取值（如列表）不建立位图
+            continue
+    return rows
+
+
+class MetadataBitmapIndex:
+    """元数据倒排位图 - 每个 (字段, 取值) 对应一个按文档位置压缩的位图，用于检索前过滤"""
+
+    def __init__(self, num_docs: int, bitmaps: Dict[str, Dict[Any, np.ndarray]]):
+        """
+        初始化位图索引
+
+        Args:
+            num_docs: 文档数
+            bitmaps: 字段 -> 取值 -> packbits压缩的位图（小端位序，与FAISS IDSelectorBitmap一致）
+        """
+        self.num_docs = num_docs
+        self.bitmaps = bitmaps
+
+    @classmethod
+    def build(cls, docs: Sequence[Document], fields: Sequence[str] = DEFAULT_BITMAP_FIELDS) -> 'MetadataBitmapIndex':
+        """
+        按文档顺序构建位图
+
+        Args:
+            docs: 文档列表，位图中的位置即文档在列表中的序号
+            fields: 需要建立位图的元数据字段
+
+        Returns:
+            位图索引
+        """
+        num_docs = len(docs)
+        bitmaps = {}
+        for field in fields:
+            bitmaps[field] = {}
+            for value, rows in _value_rows(docs, field).items():
+                mask = np.zeros(num_docs, dtype=bool)
+                mask[rows] = True
+                bitmaps[field][value] = np.packbits(mask, bitorder='little')
+
+        logger.info(f"元数据位图构建完成: {num_docs} 个文档, "
+                    + ", ".join(f"{field}={len(values)}" for field, values in bitmaps.items()))
+        return cls(num_docs, bitmaps)
+
+    def supports(self, filters: Dict[str, Any]) -> bool:
+        """过滤条件涉及的字段是否均已建立位图"""
+        return all(key in self.bitmaps for key in filters)
+
+    def packed_mask(self, filters: Dict[str, Any]) -> Optional[np.ndarray]:
+        """
+        计算过滤条件对应的压缩位图（字段之间取交集，列表取值之间取并集）
+
+        Args:
+            filters: 元数据过滤条件
+
+        Returns:
+            packbits压缩的位图；存在未建立位图的字段时返回None
+        """
+        if not self.supports(filters):
+            return None
+
+        num_bytes = (self.num_docs + 7) // 8
+        result = np.full(num_bytes, 0xFF, dtype=np.uint8)
+        for key, value in filters.items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            field_mask = np.zeros(num_bytes, dtype=np.uint8)
+            for v in values:
+                bitmap = self.bitmaps[key].get(v)
+                if bitmap is not None:
+                    field_mask |= bitmap
+            result &= field_mask
+        return result
+
+    def mask(self, filters: Dict[str, Any]) -> Optional[np.ndarray]:
+        """
+        计算过滤条件对应的布尔掩码
+
+        Args:
+            filters: 元数据过滤条件
+
+        Returns:
+            长度为文档数的布尔数组；存在未建立位图的字段时返回None
+        """
+        packed = self.packed_mask(filters)
+        if packed is None:
+            return None
+        return np.unpackbits(packed, count=self.num_docs, bitorder='little').astype(bool)
+
+    def _unpacked(self, bitmap: np.ndarray) -> np.ndarray:
+        return np.unpackbits(bitmap, count=self.num_docs, bitorder='little').astype(bool)
+
+    def append(self, docs: Sequence[Document]):
+        """
+        在末尾追加文档（与向量库追加向量的顺序一致）
+
+        Args:
+            docs: 新文档列表
+        """
+        if not docs:
+            return
+        num_docs = self.num_docs + len(docs)
+        for field, values in self.bitmaps.items():
+            new_rows = _value_rows(docs, field)
+            for value in set(values) | set(new_rows):
+                mask = np.zeros(num_docs, dtype=bool)
+                if value in values:
+                    mask[:self.num_docs] = self._unpacked(values[value])
+                mask[[self.num_docs + row for row in new_rows.get(value, [])]] = True
+                values[value] = np.packbits(mask, bitorder='little')
+        self.num_docs = num_docs
+
+    def delete_rows(self, rows: Sequence[int]):
+        """
+        删除指定序号的文档，其后的文档序号前移（与向量库删除后重新编号一致）
+
+        Args:
+            rows: 待删除的文档序号
+        """
+        if not len(rows):
+            return
+        keep = np.ones(self.num_docs, dtype=bool)
+        keep[np.asarray(rows, dtype=np.int64)] = False
+        for values in self.bitmaps.values():
+            for value in list(values):
+                mask = self._unpacked(values[value])[keep]
+                if mask.any():
+                    values[value] = np.packbits(mask, bitorder='little')
+                else:
+                    del values[value]
+        self.num_docs = int(keep.sum())
+
+    def save(self, save_path: str, name: str = "vector_bitmaps"):
+        """
+        保存位图（位图数组以npz保存，字段取值以JSON保存）
+
+        Args:
+            save_path: 保存目录
+            name: 文件名前缀
+        """
+        path = Path(save_path)
+        path.mkdir(parents=True, exist_ok=True)
+        entries, arrays, fields = [], {}, []
+        for field, values in self.bitmaps.items():
+            if not all(isinstance(value, (str, int, float, bool)) for value in values):
+                # 取值无法原样写入JSON的字段不保存，加载后该字段退化为检索后过滤
+                logger.warning(f"字段 {field} 的取值无法序列化，不保存其位图")
+                continue
+            fields.append(field)
+            for value, bitmap in values.items():
+                key = f"b{len(arrays)}"
+                entries.append({"field": field, "value": value, "key": key})
+                arrays[key] = bitmap
+        np.savez(path / f"{name}.npz", **arrays)
+        with open(path / f"{name}.json", 'w', encoding='utf-8') as f:
+            json.dump({"num_docs": self.num_docs, "fields": fields, "entries": entries}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, save_path: str, name: str = "vector_bitmaps") -> Optional['MetadataBitmapIndex']:
+        """
+        从目录加载位图
+
+        Args:
+            save_path: 保存目录
+            name: 文件名前缀
+
+        Returns:
+            位图索引，不存在或读取失败时返回None
+        """
+        path = Path(save_path)
+        if not (path / f"{name}.json").exists() or not (path / f"{name}.npz").exists():
+            return None
+        try:
+            with open(path / f"{name}.json", 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with np.load(path / f"{name}.npz") as arrays:
+                bitmaps: Dict[str, Dict[Any, np.ndarray]] = {field: {} for field in meta["fields"]}
+                for entry in meta["entries"]:
+                    bitmaps[entry["field"]][entry["value"]] = arrays[entry["key"]]
+        except Exception as e:
+            logger.warning(f"加载元数据位图失败: {e}")
+            return None
+        return cls(meta["num_docs"], bitmaps)
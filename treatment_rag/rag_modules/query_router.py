@@ -0,0 +1,117 @@
+"""
+本地查询路由模块
+"""
+
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# 各路由类型的种子示例（与 GenerationIntegrationModule.query_router 提示词中的示例一致）
+ROUTE_EXAMPLES: Dict[str, List[str]] = {
+    'list': [
+        '腰椎间盘突出应该怎么治疗',
+        '推荐几种缓解颈椎痛的膏药',
+        '颈椎病有哪些治疗方法',
+        '腰痛应该看哪个科',
+        '推荐几种治疗骨质疏松的药',
+    ],
+    'detail': [
+        '小燕飞怎么做',
+        '腰椎微创手术的过程是怎样的',
+        '这种药一天吃几次',
+        '术后如何翻身',
+        '颈椎康复操的具体步骤',
+    ],
+    'general': [
+        '什么是椎管狭窄',
+        '核磁共振结果怎么看',
+        '久坐为什么会导致腰痛',
+        '颈椎病的危害',
+        '腰椎间盘突出是怎么引起的',
+    ],
+}
+
+
+class EmbeddingQueryRouter:
+    """基于嵌入原型的查询路由 - 按与各类示例中心向量的相似度分类，置信度不足时交由LLM"""
+
+    def __init__(self, embeddings: Embeddings, examples: Optional[Dict[str, Sequence[str]]] = None,
+                 min_similarity: float = 0.3, min_margin: float = 0.05):
+        """
+        初始化本地路由
+
+        Args:
+            embeddings: 嵌入模型（与检索共用）
+            examples: 路由类型 -> 示例问题，默认使用 ROUTE_EXAMPLES
+            min_similarity: 最高相似度低于该值时视为置信度不足
+            min_margin: 最高与次高相似度之差低于该值时视为置信度不足
+        """
+        self.embeddings = embeddings
+        self.examples = {label: list(texts) for label, texts in (examples or ROUTE_EXAMPLES).items()}
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.labels: List[str] = list(self.examples.keys())
+        self._prototypes: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _get_prototypes(self) -> np.ndarray:
+        """首次使用时编码示例，计算各类型的中心向量"""
+        with self._lock:
+            if self._prototypes is None:
+                prototypes = []
+                for label in self.labels:
+                    vectors = np.asarray(self.embeddings.embed_documents(self.examples[label]), dtype=np.float32)
+                    prototypes.append(self._normalize(self._normalize(vectors).mean(axis=0)))
+                self._prototypes = np.vstack(prototypes)
+                logger.info(f"本地查询路由原型已构建: {', '.join(f'{l}({len(self.examples[l])})' for l in self.labels)}")
+            return self._prototypes
+
+    def add_examples(self, label: str, texts: Sequence[str]):
+        """
+        补充示例（如线上确认过的分类结果），下次路由时重新计算原型
+
+        Args:
+            label: 路由类型
+            texts: 示例问题
+        """
+        self.examples.setdefault(label, []).extend(texts)
+        with self._lock:
+            self.labels = list(self.examples.keys())
+            self._prototypes = None
+
+    def route(self, query: str, query_vector: Optional[Sequence[float]] = None) -> Tuple[Optional[str], float]:
+        """
+        查询路由
+
+        Args:
+            query: 用户查询
+            query_vector: 已计算的查询向量（可复用语义缓存时计算的向量）
+
+        Returns:
+            (路由类型, 置信度)；置信度不足时路由类型为None
+        """
+        prototypes = self._get_prototypes()
+        if query_vector is None:
+            query_vector = self.embeddings.embed_query(query)
+        similarities = prototypes @ self._normalize(np.asarray(query_vector, dtype=np.float32))
+
+        order = np.argsort(-similarities)
+        best = float(similarities[order[0]])
+        margin = best - float(similarities[order[1]]) if len(order) > 1 else best
+        label = self.labels[order[0]]
+
+        if best < self.min_similarity or margin < self.min_margin:
+            logger.info(f"本地路由置信度不足: {label} (相似度 {best:.3f}, 差值 {margin:.3f})")
+            return None, margin
+        logger.info(f"本地路由: {label} (相似度 {best:.3f}, 差值 {margin:.3f})")
+        return label, margin
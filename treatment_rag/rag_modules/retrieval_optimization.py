@@ -3,27 +3,53 @@
 """
 
 import logging
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Any, Optional
 
 from langchain_community.vectorstores import FAISS
-from langchain_community.retrievers import BM25Retriever
 from langchain_core.documents import Document
 
+from .bm25_index import BM25Index, BM25IndexRetriever
+from .metadata_bitmap import MetadataBitmapIndex
+from .tokenization import MixedLanguageTokenizer, TokenCache
+from .vector_index import filtered_search
+
 logger = logging.getLogger(__name__)
 
 class RetrievalOptimizationModule:
     """检索优化模块 - 负责混合检索和过滤"""
     
-    def __init__(self, vectorstore: FAISS, chunks: List[Document]):
+    def __init__(self, vectorstore: FAISS, chunks: List[Document], bm25_index: Optional[BM25Index] = None,
+                 tokenizer: Optional[Callable[[str], List[str]]] = None, token_cache: Optional[TokenCache] = None,
+                 concurrent: bool = True, max_workers: int = 4,
+                 vector_bitmaps: Optional[MetadataBitmapIndex] = None,
+                 executor: Optional[ThreadPoolExecutor] = None):
         """
         初始化检索优化模块
         
         Args:
             vectorstore: FAISS向量存储
             chunks: 文档块列表
+            bm25_index: 已保存的BM25索引，与chunks或分词器不一致时会重新构建
+            tokenizer: BM25分词器，默认使用中英文混合分词器
+            token_cache: 重建BM25索引时使用的分词缓存
+            concurrent: 是否并发执行向量检索与BM25检索
+            max_workers: 自建检索线程池的大小
+            vector_bitmaps: 随向量索引保存的元数据位图，与向量数不一致时按docstore重建
+            executor: 外部共享的检索线程池（由调用方负责关闭），为None且并发检索时自建
         """
         self.vectorstore = vectorstore
         self.chunks = chunks
+        self.bm25_index = bm25_index
+        self.tokenizer = tokenizer or MixedLanguageTokenizer()
+        self.token_cache = token_cache
+        self.concurrent = concurrent
+        self.vector_bitmaps = vector_bitmaps
+        # 只关闭自建的线程池，共享线程池在检索模块重建后继续使用
+        self._owns_executor = executor is None and concurrent
+        self.executor = executor
+        if self._owns_executor:
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hybrid-search")
         self.setup_retrievers()
 
     def setup_retrievers(self):
@@ -36,13 +62,26 @@ class RetrievalOptimizationModule:
             search_kwargs={"k": 5}
         )
 
-        # BM25检索器
-        self.bm25_retriever = BM25Retriever.from_documents(
+        # BM25检索器（优先复用已保存的索引）
+        tokenizer_name = getattr(self.tokenizer, 'name', 'custom')
+        if self.bm25_index is None or not self.bm25_index.matches(self.chunks, tokenizer_name):
+            if self.bm25_index is not None:
+                logger.warning("已保存的BM25索引与当前文档块或分词器不一致，重新构建")
+            self.bm25_index = BM25Index.build(self.chunks, tokenizer=self.tokenizer, token_cache=self.token_cache)
+
+        self.bm25_retriever = BM25IndexRetriever(
+            self.bm25_index,
             self.chunks,
-            k=5
+            k=5,
+            tokenizer=self.tokenizer
         )
 
-
+        # 元数据位图：BM25按文档块序号，向量按FAISS内部ID，用于检索前过滤
+        self.chunk_bitmaps = MetadataBitmapIndex.build(self.chunks)
+        if self.vector_bitmaps is None or self.vector_bitmaps.num_docs != self.vectorstore.index.ntotal:
+            self.vector_bitmaps = MetadataBitmapIndex.build([
+                self._vector_document(i) for i in range(self.vectorstore.index.ntotal)
+            ])
 
         logger.info("检索器设置完成")
     
@@ -57,18 +96,32 @@ class RetrievalOptimizationModule:
         Returns:
             检索到的文档列表
         """
-        # 分别获取向量检索和BM25检索结果
-        vector_docs = self.vector_retriever.invoke(query)
-        bm25_docs = self.bm25_retriever.invoke(query)
+        if self.concurrent:
+            # 向量检索（查询向量化为主要耗时）提交到线程池，BM25在当前线程同时执行
+            vector_future = self.executor.submit(self.vector_retriever.invoke, query)
+            bm25_docs = self.bm25_retriever.invoke(query)
+            vector_docs = vector_future.result()
+        else:
+            # 分别获取向量检索和BM25检索结果
+            vector_docs = self.vector_retriever.invoke(query)
+            bm25_docs = self.bm25_retriever.invoke(query)
 
         # 使用RRF重排
         reranked_docs = self._rrf_rerank(vector_docs, bm25_docs)
         return reranked_docs[:top_k]
+
+    def close(self):
+        """关闭自建的检索线程池"""
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
     
     def metadata_filtered_search(self, query: str, filters: Dict[str, Any], top_k: int = 5) -> List[Document]:
         """
         带元数据过滤的检索
         
+        过滤字段均已建立位图时，向量检索和BM25检索只在满足条件的文档块中排序，
+        满足条件的文档块足够时总能返回top_k个结果。
+        
         Args:
             query: 查询文本
             filters: 元数据过滤条件
@@ -77,6 +130,39 @@ class RetrievalOptimizationModule:
         Returns:
             过滤后的文档列表
         """
+        vector_bitmap = self.vector_bitmaps.packed_mask(filters)
+        chunk_mask = self.chunk_bitmaps.mask(filters)
+        if vector_bitmap is None or chunk_mask is None:
+            logger.info(f"过滤字段未建立位图索引，退化为检索后过滤: {list(filters)}")
+            return self._post_filtered_search(query, filters, top_k)
+
+        # 每一路至少取top_k个，保证融合后结果数量足够
+        k = max(top_k, self.bm25_retriever.k)
+        if self.concurrent:
+            vector_future = self.executor.submit(self._filtered_vector_search, query, k, vector_bitmap)
+            bm25_docs = self.bm25_retriever.invoke(query, k=k, mask=chunk_mask)
+            vector_docs = vector_future.result()
+        else:
+            vector_docs = self._filtered_vector_search(query, k, vector_bitmap)
+            bm25_docs = self.bm25_retriever.invoke(query, k=k, mask=chunk_mask)
+
+        return self._rrf_rerank(vector_docs, bm25_docs)[:top_k]
+
+    def _filtered_vector_search(self, query: str, k: int, packed_bitmap) -> List[Document]:
+        """在位图选中的向量中检索"""
+        query_vector = self.vectorstore.embedding_function.embed_query(query)
+        ids = filtered_search(self.vectorstore.index, query_vector, k, packed_bitmap)
+        docs = [self._vector_document(int(i)) for i in ids]
+        return [doc for doc in docs if doc is not None]
+
+    def _vector_document(self, vector_id: int) -> Optional[Document]:
+        """按FAISS内部ID取文档；docstore中缺失时（返回提示字符串）返回None"""
+        docstore_id = self.vectorstore.index_to_docstore_id.get(vector_id)
+        doc = self.vectorstore.docstore.search(docstore_id) if docstore_id is not None else None
+        return doc if isinstance(doc, Document) else None
+
+    def _post_filtered_search(self, query: str, filters: Dict[str, Any], top_k: int = 5) -> List[Document]:
+        """先混合检索再按元数据过滤（用于未建立位图的字段）"""
         # 先进行混合检索，获取更多候选
         docs = self.hybrid_search(query, top_k * 3)
         
@@ -115,15 +201,15 @@ class RetrievalOptimizationModule:
             k: RRF参数，用于平滑排名
 
         Returns:
-            重排后的文档列表
+            重排后的文档副本列表（元数据中带有 rrf_score）
         """
         doc_scores = {}
         doc_objects = {}
 
         # 计算向量检索结果的RRF分数
         for rank, doc in enumerate(vector_docs):
-            # 使用文档内容的哈希作为唯一标识
-            doc_id = hash(doc.page_content)
+            # 优先使用确定性的chunk_id作为唯一标识，缺失时退化为文档内容的哈希
+            doc_id = doc.metadata.get('chunk_id') or hash(doc.page_content)
             doc_objects[doc_id] = doc
 
             # RRF公式: 1 / (k + rank)
@@ -134,7 +220,7 @@ class RetrievalOptimizationModule:
 
         # 计算BM25检索结果的RRF分数
         for rank, doc in enumerate(bm25_docs):
-            doc_id = hash(doc.page_content)
+            doc_id = doc.metadata.get('chunk_id') or hash(doc.page_content)
             doc_objects[doc_id] = doc
 
             rrf_score = 1.0 / (k + rank + 1)
@@ -149,9 +235,10 @@ class RetrievalOptimizationModule:
         reranked_docs = []
         for doc_id, final_score in sorted_docs:
             if doc_id in doc_objects:
-                doc = doc_objects[doc_id]
-                # 将RRF分数添加到文档元数据中
-                doc.metadata['rrf_score'] = final_score
+                # 检索结果是docstore/BM25中各请求共享的对象，RRF分数写在副本的元数据中，避免并发请求互相覆盖
+                source = doc_objects[doc_id]
+                doc = Document(id=source.id, page_content=source.page_content,
+                               metadata={**source.metadata, 'rrf_score': final_score})
                 reranked_docs.append(doc)
                 logger.debug(f"最终排序 - 文档: {doc.page_content[:50]}... 最终RRF分数: {final_score:.4f}")
 
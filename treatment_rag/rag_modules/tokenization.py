@@ -0,0 +1,319 @@
+"""
+分词模块
+"""
+
+import json
+import hashlib
+import logging
+import re
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 常见英文停用词（指南正文中高频且无区分度）
+ENGLISH_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'been', 'but', 'by', 'for', 'from', 'had', 'has', 'have',
+    'he', 'her', 'his', 'in', 'into', 'is', 'it', 'its', 'of', 'on', 'or', 'she', 'that', 'the', 'their',
+    'there', 'these', 'they', 'this', 'those', 'to', 'was', 'were', 'which', 'with', 'who', 'will', 'would'
+}
+
+# 依次匹配：脊柱节段（C4-C5、L4/L5、T12-L1）、大写缩写（MRI、NSAIDs）、英文单词、数字、CJK连续片段
+# 边界只看ASCII字母数字：CJK字符在Unicode下属于\w，用\b时"颈椎C4-C5"中的节段无法识别
+_TOKEN_PATTERN = re.compile(
+    r"(?P<segment>(?<![A-Za-z0-9])(?i:[CTLS])\d{1,2}(?:\s*[-/–~]\s*(?i:[CTLS])?\d{1,2})*(?![A-Za-z0-9]))"
+    r"|(?P<acronym>(?<![A-Za-z0-9])[A-Z]{2,}s?(?![A-Za-z0-9]))"
+    r"|(?P<word>[A-Za-z]+(?:'[A-Za-z]+)?)"
+    r"|(?P<number>\d+(?:\.\d+)?)"
+    r"|(?P<cjk>[㐀-䶿一-鿿]+)"
+)
+_SEGMENT_PART_PATTERN = re.compile(r"([CTLS]?)(\d{1,2})")
+
+
+def light_stem(word: str) -> str:
+    """
+    轻量英文词干化：只剥离常见屈折后缀，避免引入额外依赖
+
+    剥离后缀后再去掉词尾的e，使单复数、时态变化归并到同一词干
+    （disease/diseases -> diseas，fuse/fused/fusing -> fus）
+
+    Args:
+        word: 小写英文单词
+
+    Returns:
+        词干
+    """
+    stem = word
+    for suffix, replacement in (('ies', 'y'), ('sses', 'ss'), ('ing', ''), ('edly', ''), ('ed', ''),
+                                ('ly', ''), ('s', '')):
+        if not stem.endswith(suffix) or (suffix == 's' and stem.endswith('ss')):
+            continue
+        if len(stem) - len(suffix) + len(replacement) >= 3:
+            stem = stem[:-len(suffix)] + replacement
+            # stopped -> stopp -> stop
+            if suffix in ('ing', 'ed', 'edly') and len(stem) > 3 and stem[-1] == stem[-2] and stem[-1] not in 'lsz':
+                stem = stem[:-1]
+        break
+    if stem.endswith('e') and len(stem) > 3:
+        stem = stem[:-1]
+    return stem
+
+
+class WhitespaceTokenizer:
+    """空白切分分词器（langchain BM25Retriever 的默认行为）"""
+
+    name = "whitespace"
+
+    def __call__(self, text: str) -> List[str]:
+        return text.split()
+
+
+class MixedLanguageTokenizer:
+    """中英文混合分词器 - CJK字符n-gram、英文词干、医学缩写与脊柱节段"""
+
+    # 分词规则变化时更新版本号，使已保存的BM25索引和分词缓存失效重建
+    name = "mixed-v2"
+
+    def __init__(self, cjk_ngram_range: tuple = (1, 2), stem: bool = True, stopwords: Optional[Set[str]] = None):
+        """
+        初始化分词器
+
+        Args:
+            cjk_ngram_range: CJK字符n-gram的范围（含两端）
+            stem: 是否对英文单词做词干化
+            stopwords: 英文停用词表，默认使用 ENGLISH_STOPWORDS
+        """
+        self.cjk_ngram_range = cjk_ngram_range
+        self.stem = stem
+        self.stopwords = ENGLISH_STOPWORDS if stopwords is None else stopwords
+
+    def __call__(self, text: str) -> List[str]:
+        """
+        分词
+
+        Args:
+            text: 输入文本
+
+        Returns:
+            词元列表
+        """
+        tokens: List[str] = []
+        for match in _TOKEN_PATTERN.finditer(text):
+            kind = match.lastgroup
+            value = match.group(kind)
+
+            if kind == 'segment':
+                tokens.extend(self._segment_tokens(value))
+            elif kind == 'acronym':
+                tokens.append(value.rstrip('s').lower())
+            elif kind == 'word':
+                word = value.lower()
+                if word in self.stopwords:
+                    continue
+                tokens.append(light_stem(word) if self.stem else word)
+            elif kind == 'number':
+                tokens.append(value)
+            else:
+                tokens.extend(self._cjk_ngrams(value))
+        return tokens
+
+    def _segment_tokens(self, value: str) -> List[str]:
+        """脊柱节段：保留完整节段（c4-c5）并拆出单个椎体（c4、c5），便于部分匹配"""
+        parts = []
+        prefix = ''
+        for letter, number in _SEGMENT_PART_PATTERN.findall(value.upper()):
+            prefix = letter or prefix
+            parts.append(f"{prefix}{number}".lower())
+        if len(parts) > 1:
+            return ['-'.join(parts)] + parts
+        return parts
+
+    def _cjk_ngrams(self, run: str) -> List[str]:
+        """CJK连续片段切分为字符n-gram"""
+        min_n, max_n = self.cjk_ngram_range
+        grams = []
+        for n in range(min_n, max_n + 1):
+            grams.extend(run[i:i + n] for i in range(len(run) - n + 1))
+        return grams
+
+
+TOKENIZERS: Dict[str, Callable[[], Callable[[str], List[str]]]] = {
+    WhitespaceTokenizer.name: WhitespaceTokenizer,
+    "mixed": MixedLanguageTokenizer,
+    MixedLanguageTokenizer.name: MixedLanguageTokenizer,
+}
+
+
+def get_tokenizer(name: str) -> Callable[[str], List[str]]:
+    """
+    按名称获取分词器
+
+    Args:
+        name: 分词器名称（whitespace / mixed）
+
+    Returns:
+        分词器实例
+    """
+    if name not in TOKENIZERS:
+        raise ValueError(f"不支持的分词器: {name}，可选: {list(TOKENIZERS.keys())}")
+    return TOKENIZERS[name]()
+
+
+class TokenCache:
+    """
+    文档块分词结果缓存 - 以文本哈希为键，随索引持久化
+
+    只在重建BM25索引（刷新知识库或已保存索引失效）时使用：创建时不读取磁盘，首次查询时才以内存映射方式
+    打开已保存的缓存；保存时只在内容有变化时重写。词元以词表ID的紧凑数组保存，不再整体解析JSON。
+    """
+
+    META_FILE = "bm25_token_cache.json"           # 分词器名称与词表
+    KEYS_FILE = "bm25_token_cache_keys.npy"       # 文本哈希（按行）
+    OFFSETS_FILE = "bm25_token_cache_offsets.npy" # 每行词元在 ids 中的起始偏移（长度为行数+1）
+    IDS_FILE = "bm25_token_cache_ids.npy"         # 所有行的词表ID
+
+    def __init__(self, tokenizer_name: str, save_path: Optional[str] = None):
+        """
+        初始化缓存
+
+        Args:
+            tokenizer_name: 分词器名称，切换分词器时缓存失效
+            save_path: 已保存缓存的目录，为空时从空缓存开始
+        """
+        self.tokenizer_name = tokenizer_name
+        self.save_path = save_path
+        self.entries: Dict[str, List[str]] = {}  # 本次使用过的条目
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self._loaded = save_path is None
+        self._stored_rows: Dict[str, int] = {}
+        self._stored_vocab: List[str] = []
+        self._stored_offsets = None
+        self._stored_ids = None
+
+    @staticmethod
+    def text_key(text: str) -> str:
+        """文本哈希键"""
+        return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+    def _ensure_loaded(self):
+        """首次使用时打开已保存的缓存（词元数组内存映射，不整体读入）"""
+        if self._loaded:
+            return
+        self._loaded = True
+        path = Path(self.save_path)
+        if not all((path / name).exists() for name in (self.META_FILE, self.KEYS_FILE, self.OFFSETS_FILE, self.IDS_FILE)):
+            return
+
+        try:
+            with open(path / self.META_FILE, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("tokenizer") != self.tokenizer_name:
+                return
+            keys = np.load(path / self.KEYS_FILE)
+            self._stored_offsets = np.load(path / self.OFFSETS_FILE, mmap_mode='r')
+            self._stored_ids = np.load(path / self.IDS_FILE, mmap_mode='r')
+            self._stored_vocab = meta.get("vocab", [])
+            self._stored_rows = {key.decode("ascii"): row for row, key in enumerate(keys.tolist())}
+            logger.info(f"分词缓存已打开: {len(self._stored_rows)} 条")
+        except Exception as e:
+            logger.warning(f"加载分词缓存失败: {e}")
+            self._stored_rows = {}
+
+    def _stored_tokens(self, key: str) -> Optional[List[str]]:
+        row = self._stored_rows.get(key)
+        if row is None:
+            return None
+        start, end = int(self._stored_offsets[row]), int(self._stored_offsets[row + 1])
+        return [self._stored_vocab[i] for i in self._stored_ids[start:end]]
+
+    def tokenize(self, text: str, tokenizer: Callable[[str], List[str]]) -> List[str]:
+        """
+        获取文本的分词结果，未命中时调用分词器并写入缓存
+
+        Args:
+            text: 文档块文本
+            tokenizer: 分词器
+
+        Returns:
+            词元列表
+        """
+        key = self.text_key(text)
+        tokens = self.entries.get(key)
+        if tokens is None:
+            self._ensure_loaded()
+            tokens = self._stored_tokens(key)
+            if tokens is None:
+                self.misses += 1
+                tokens = tokenizer(text)
+                self.dirty = True
+            else:
+                self.hits += 1
+            self.entries[key] = tokens
+        else:
+            self.hits += 1
+        return tokens
+
+    def prune(self, keep_keys: Set[str]):
+        """只保留给定键的缓存条目（删除已不存在的文档块）"""
+        self._ensure_loaded()
+        if set(self.entries) != set(keep_keys) or set(self._stored_rows) - set(keep_keys):
+            self.dirty = True
+        self.entries = {key: tokens for key, tokens in self.entries.items() if key in keep_keys}
+        # 保留的条目均已在 entries 中，不再需要磁盘上的旧缓存
+        for key in keep_keys:
+            if key not in self.entries:
+                tokens = self._stored_tokens(key)
+                if tokens is not None:
+                    self.entries[key] = tokens
+        self._stored_rows, self._stored_offsets, self._stored_ids = {}, None, None
+
+    def save(self, save_path: str):
+        """保存缓存到目录（内容未变化时跳过）"""
+        if not self.dirty and save_path == self.save_path:
+            return
+        self._ensure_loaded()
+        for key in list(self._stored_rows):
+            if key not in self.entries:
+                self.entries[key] = self._stored_tokens(key)
+        # 释放对旧文件的内存映射后再覆盖写入
+        self._stored_rows, self._stored_offsets, self._stored_ids = {}, None, None
+
+        vocab: Dict[str, int] = {}
+        keys, offsets, ids = [], [0], []
+        for key, tokens in self.entries.items():
+            keys.append(key.encode("ascii"))
+            ids.extend(vocab.setdefault(token, len(vocab)) for token in tokens)
+            offsets.append(len(ids))
+
+        path = Path(save_path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / self.KEYS_FILE, np.asarray(keys, dtype="S32"))
+        np.save(path / self.OFFSETS_FILE, np.asarray(offsets, dtype=np.int64))
+        np.save(path / self.IDS_FILE, np.asarray(ids, dtype=np.int32))
+        with open(path / self.META_FILE, 'w', encoding='utf-8') as f:
+            json.dump({"tokenizer": self.tokenizer_name, "vocab": list(vocab)}, f, ensure_ascii=False)
+
+        logger.info(f"分词缓存已保存: {len(self.entries)} 条")
+        # 保存后释放内存中的词元，下次重建时再从新文件按需读取
+        self.save_path = save_path
+        self.entries = {}
+        self.dirty = False
+        self._loaded = False
+
+    @classmethod
+    def load(cls, save_path: str, tokenizer_name: str) -> 'TokenCache':
+        """
+        关联已保存的缓存目录，实际读取推迟到首次查询（文件不存在或分词器不一致时为空缓存）
+
+        Args:
+            save_path: 保存目录
+            tokenizer_name: 当前使用的分词器名称
+
+        Returns:
+            分词缓存
+        """
+        return cls(tokenizer_name, save_path=save_path)
@@ -0,0 +1,250 @@
+"""
+向量索引类型模块
+"""
+
+import json
+import logging
+import threading
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 支持的索引类型
+VECTOR_INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "fp16")
+# 支持按ID删除且删除后编号连续（langchain FAISS.delete 依赖此行为）的索引类型
+COMPACTING_INDEX_TYPES = ("flat", "sq8", "fp16")
+
+# 建立IVF直接映射表会修改索引，与并发查询互斥
+_DIRECT_MAP_LOCK = threading.Lock()
+
+
+@dataclass
+class VectorIndexParams:
+    """FAISS索引参数"""
+    index_type: str = "flat"          # flat / ivf_flat / ivf_pq / hnsw / sq8 / fp16
+    nlist: int = 1024                 # IVF聚类中心数（向量较少时自动缩小）
+    nprobe: int = 16                  # IVF查询时探测的聚类数
+    pq_m: int = 64                    # PQ子空间数（需整除向量维度）
+    pq_nbits: int = 8                 # PQ每个子空间的编码位数
+    hnsw_m: int = 32                  # HNSW每个节点的邻居数
+    hnsw_ef_construction: int = 200   # HNSW构建时的搜索宽度
+    hnsw_ef_search: int = 64          # HNSW查询时的搜索宽度
+    train_sample_size: int = 100000   # 训练采样的向量数
+
+    def __post_init__(self):
+        if self.index_type not in VECTOR_INDEX_TYPES:
+            raise ValueError(f"不支持的向量索引类型: {self.index_type}，可选: {', '.join(VECTOR_INDEX_TYPES)}")
+
+    @property
+    def supports_delete(self) -> bool:
+        """是否可以直接从索引删除向量（否则需要重建）"""
+        return self.index_type in COMPACTING_INDEX_TYPES
+
+
+def _min_train_size(params: VectorIndexParams, nlist: int) -> int:
+    """训练所需的最少向量数"""
+    if params.index_type == "ivf_pq":
+        return max(nlist, 2 ** params.pq_nbits)
+    if params.index_type == "ivf_flat":
+        return nlist
+    return 1
+
+
+def create_index(dim: int, num_vectors: int, params: VectorIndexParams) -> faiss.Index:
+    """
+    按参数创建空的FAISS索引（L2距离，与langchain默认的扁平索引一致）
+
+    Args:
+        dim: 向量维度
+        num_vectors: 将要写入的向量数（用于约束聚类中心数）
+        params: 索引参数
+
+    Returns:
+        未训练的FAISS索引；向量数不足以训练时退化为扁平索引
+    """
+    index_type = params.index_type
+    # 每个聚类中心至少约39个训练样本，否则FAISS会告警且聚类质量差
+    nlist = max(1, min(params.nlist, num_vectors // 39))
+
+    if index_type in ("ivf_flat", "ivf_pq") and num_vectors < _min_train_size(params, nlist):
+        logger.warning(f"向量数 {num_vectors} 不足以训练 {index_type} 索引，退化为扁平索引")
+        index_type = "flat"
+
+    if index_type == "ivf_pq" and dim % params.pq_m != 0:
+        raise ValueError(f"PQ子空间数 {params.pq_m} 必须整除向量维度 {dim}")
+
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+    if index_type == "ivf_flat":
+        return faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist, faiss.METRIC_L2)
+    if index_type == "ivf_pq":
+        return faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, nlist, params.pq_m, params.pq_nbits)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params.hnsw_m)
+        index.hnsw.efConstruction = params.hnsw_ef_construction
+        return index
+    if index_type == "sq8":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+    return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16)
+
+
+def train_index(index: faiss.Index, vectors: np.ndarray, sample_size: int, seed: int = 42):
+    """
+    在语料的随机样本上训练索引（已训练或无需训练的索引直接跳过）
+
+    Args:
+        index: FAISS索引
+        vectors: 全部向量
+        sample_size: 训练采样数
+        seed: 随机种子
+    """
+    if index.is_trained:
+        return
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if len(vectors) > sample_size:
+        rows = np.random.default_rng(seed).choice(len(vectors), size=sample_size, replace=False)
+        vectors = vectors[np.sort(rows)]
+
+    logger.info(f"正在训练向量索引: {len(vectors)} 个样本")
+    index.train(vectors)
+
+
+def apply_search_params(index: faiss.Index, params: VectorIndexParams):
+    """设置查询期参数（IVF的nprobe、HNSW的efSearch）"""
+    try:
+        ivf = faiss.extract_index_ivf(index)
+        ivf.nprobe = min(params.nprobe, ivf.nlist)
+    except RuntimeError:
+        pass
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = params.hnsw_ef_search
+
+
+def _selector_params(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """构造带ID选择器的查询参数，保留索引当前的nprobe/efSearch"""
+    try:
+        ivf = faiss.extract_index_ivf(index)
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    except RuntimeError:
+        pass
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def ensure_direct_map(index: faiss.Index):
+    """
+    为IVF索引建立直接映射表，使其可以按ID取回向量（已建立或非IVF索引直接跳过）
+
+    应在写入向量前（构建时）或加载后调用；之后顺序写入的向量会同步维护映射表，
+    映射表随索引一同保存。
+    """
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return
+    with _DIRECT_MAP_LOCK:
+        if ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.make_direct_map()
+
+
+def _reconstruct(index: faiss.Index, ids: np.ndarray) -> np.ndarray:
+    """按ID取回（量化索引为近似的）向量"""
+    try:
+        return index.reconstruct_batch(ids)
+    except RuntimeError:
+        # 构建/加载时未建立直接映射表的IVF索引（如外部传入），加锁补建
+        ensure_direct_map(index)
+        return index.reconstruct_batch(ids)
+
+
+def filtered_search(index: faiss.Index, query_vector: np.ndarray, k: int, packed_bitmap: np.ndarray,
+                    exact_threshold: int = 4096) -> np.ndarray:
+    """
+    只在位图选中的向量中检索（过滤发生在排序之前）
+
+    选中的向量较少时直接对其做精确距离计算；否则通过IDSelectorBitmap在索引内过滤，
+    若HNSW/IVF因近似搜索返回不足k条，再退化为精确计算。
+
+    Args:
+        index: FAISS索引
+        query_vector: 查询向量
+        k: 返回数量
+        packed_bitmap: 按向量ID的packbits位图（小端位序）
+        exact_threshold: 选中向量数不超过该值时直接精确计算
+
+    Returns:
+        按距离升序排列的向量ID
+    """
+    ntotal = index.ntotal
+    candidate_ids = np.flatnonzero(np.unpackbits(packed_bitmap, count=ntotal, bitorder='little')).astype(np.int64)
+    k = min(k, len(candidate_ids))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    query = np.ascontiguousarray(query_vector, dtype=np.float32).reshape(1, -1)
+    if len(candidate_ids) > exact_threshold:
+        selector = faiss.IDSelectorBitmap(ntotal, faiss.swig_ptr(packed_bitmap))
+        _, ids = index.search(query, k, params=_selector_params(index, selector))
+        ids = ids[0][ids[0] >= 0]
+        if len(ids) >= k:
+            return ids
+
+    distances = ((_reconstruct(index, candidate_ids) - query) ** 2).sum(axis=1)
+    top = np.argpartition(distances, k - 1)[:k]
+    return candidate_ids[top[np.argsort(distances[top], kind="stable")]]
+
+
+def describe_index(index: faiss.Index) -> str:
+    """索引类型的简短描述，用于日志"""
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq8" if index.sq.qtype == faiss.ScalarQuantizer.QT_8bit else "fp16"
+    return "flat"
+
+
+class IndexMeta:
+    """向量索引元数据 - 记录索引类型、参数和维度，随索引一同保存"""
+
+    META_FILE = "index_meta.json"
+
+    @classmethod
+    def save(cls, save_path: str, params: VectorIndexParams, index: faiss.Index, **extra: Any):
+        """
+        保存索引元数据
+
+        Args:
+            save_path: 索引目录
+            params: 构建索引使用的参数
+            index: FAISS索引
+            extra: 其他需要记录的字段
+        """
+        meta = {
+            "index_type": describe_index(index),
+            "params": asdict(params),
+            "dim": int(index.d),
+            "ntotal": int(index.ntotal),
+        }
+        meta.update(extra)
+        with open(Path(save_path) / cls.META_FILE, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, save_path: str) -> Optional[Dict[str, Any]]:
+        """读取索引元数据，不存在时返回None（旧版本保存的扁平索引）"""
+        meta_file = Path(save_path) / cls.META_FILE
+        if not meta_file.exists():
+            return None
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
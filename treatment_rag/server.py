@@ -0,0 +1,256 @@
+"""
+RAG系统HTTP服务
+
+基于单个已初始化的 RecipeRAGSystem 提供ASGI接口：
+- POST /ask          问答
+- POST /ask/stream   流式问答（SSE）
+- POST /search       仅检索，不调用LLM
+- GET  /health       健康检查
+
+同时处理的请求数受信号量限制，等待处理槽超过 request_queue_timeout 时返回503；
+单个请求超过 request_timeout 时返回504。超时请求已在线程池中执行的阻塞任务无法中断，
+线程池中未完成的任务达到 max_pending_blocking_tasks 时新请求直接返回503，避免积压无限增长。
+知识库在后台构建，完成前 /health 返回 starting，其余接口返回503。
+
+用法:
+    python server.py --host 0.0.0.0 --port 8000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+# 添加模块路径
+sys.path.append(str(Path(__file__).parent))
+
+from config import DEFAULT_CONFIG, RAGConfig
+from main import RecipeRAGSystem
+
+logger = logging.getLogger(__name__)
+
+
+class AskRequest(BaseModel):
+    """问答请求"""
+    question: str = Field(..., min_length=1)
+
+
+class SearchRequest(BaseModel):
+    """检索请求"""
+    query: str = Field(..., min_length=1)
+    top_k: Optional[int] = Field(None, ge=1, le=50)
+
+
+class RequestLimiter:
+    """请求并发限制 - 处理槽用尽时最多等待 queue_timeout 秒，超时拒绝请求"""
+
+    def __init__(self, max_concurrent: int, queue_timeout: float):
+        """
+        初始化并发限制
+
+        Args:
+            max_concurrent: 同时处理的请求数上限
+            queue_timeout: 等待空闲处理槽的最长秒数
+        """
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def acquire(self) -> bool:
+        """获取处理槽，超时返回False"""
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        """释放处理槽"""
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+def _serialize_document(doc) -> Dict[str, Any]:
+    """文档块转为可JSON序列化的字典"""
+    metadata = {key: value for key, value in doc.metadata.items()
+                if isinstance(value, (str, int, float, bool, list)) or value is None}
+    return {"content": doc.page_content, "metadata": metadata}
+
+
+def _sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """格式化一条SSE消息"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def create_app(config: RAGConfig = None, rag_system: RecipeRAGSystem = None) -> FastAPI:
+    """
+    创建ASGI应用
+
+    Args:
+        config: RAG系统配置，默认使用DEFAULT_CONFIG
+        rag_system: 已构建知识库的RAG系统；为空时在服务启动后于后台初始化并构建知识库
+
+    Returns:
+        FastAPI应用
+    """
+    config = config or (rag_system.config if rag_system else DEFAULT_CONFIG)
+    state: Dict[str, Any] = {"system": rag_system, "limiter": None, "error": None, "started_at": time.time()}
+
+    def is_ready() -> bool:
+        system = state["system"]
+        return system is not None and system.case_report_retrieval_module is not None
+
+    def build_system():
+        # 初始化和构建知识库是阻塞的，在线程中执行；构建完成后才对外可见
+        system = None
+        try:
+            system = RecipeRAGSystem(config)
+            system.initialize_system()
+            system.build_knowledge_base()
+        except Exception as e:
+            logger.exception("知识库构建失败")
+            state["error"] = str(e)
+            if system is not None:
+                # 构建失败的系统不会对外可见，关闭时也不会再被释放，这里释放已加载的嵌入模型
+                system.close()
+            return
+        state["system"] = system
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        state["limiter"] = RequestLimiter(config.max_concurrent_requests, config.request_queue_timeout)
+        startup = None
+        if state["system"] is None:
+            # 在后台构建知识库，服务先开始监听，/health 可反映启动进度
+            startup = asyncio.create_task(asyncio.to_thread(build_system))
+        yield
+        if startup is not None and not startup.done():
+            # 构建线程无法中断，等待其结束后再释放资源
+            await startup
+        if state["system"] is not None:
+            state["system"].close()
+
+    app = FastAPI(title="脊柱疾病治疗方案推荐RAG系统", lifespan=lifespan)
+
+    async def acquire_slot() -> RequestLimiter:
+        if not is_ready():
+            detail = f"知识库构建失败: {state['error']}" if state["error"] else "知识库尚未就绪，请稍后重试"
+            raise HTTPException(status_code=503, detail=detail)
+        limiter = state["limiter"]
+        # 超时请求遗留的阻塞任务仍占用线程池，积压过多时不再接收新请求
+        if state["system"].pending_blocking_tasks >= config.max_pending_blocking_tasks:
+            limiter.rejected += 1
+            raise HTTPException(status_code=503, detail="服务繁忙，请稍后重试")
+        if not await limiter.acquire():
+            raise HTTPException(status_code=503, detail="服务繁忙，请稍后重试")
+        return limiter
+
+    async def run_with_timeout(coro):
+        try:
+            return await asyncio.wait_for(coro, timeout=config.request_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="请求处理超时")
+
+    @app.get("/health")
+    async def health() -> Dict[str, Any]:
+        system = state["system"]
+        limiter = state["limiter"]
+        ready = is_ready()
+        return {
+            "status": "ok" if ready else ("error" if state["error"] else "starting"),
+            "uptime": round(time.time() - state["started_at"], 1),
+            "in_flight": limiter.in_flight if limiter else 0,
+            "max_concurrent": config.max_concurrent_requests,
+            "rejected": limiter.rejected if limiter else 0,
+            "pending_blocking_tasks": system.pending_blocking_tasks if system else 0,
+            "answer_cache_entries": len(system.answer_cache) if ready and system.answer_cache is not None else 0,
+            "query_cache": system.query_cache_stats() if ready else None,
+        }
+
+    @app.post("/ask")
+    async def ask(request: AskRequest) -> Dict[str, Any]:
+        limiter = await acquire_slot()
+        try:
+            answer = await run_with_timeout(state["system"].aask_question(request.question, stream=False))
+        finally:
+            limiter.release()
+        return {"question": request.question, "answer": answer}
+
+    @app.post("/ask/stream")
+    async def ask_stream(request: AskRequest) -> StreamingResponse:
+        limiter = await acquire_slot()
+        deadline = time.monotonic() + config.request_timeout
+        try:
+            answer = await run_with_timeout(state["system"].aask_question(request.question, stream=True))
+        except BaseException:
+            limiter.release()
+            raise
+
+        async def events() -> AsyncIterator[str]:
+            # 处理槽在流式输出结束（或客户端断开）后释放
+            try:
+                if isinstance(answer, str):
+                    yield _sse({"delta": answer})
+                else:
+                    iterator = answer.__aiter__()
+                    while True:
+                        remaining = deadline - time.monotonic()
+                        try:
+                            chunk = await asyncio.wait_for(iterator.__anext__(), timeout=max(remaining, 0))
+                        except StopAsyncIteration:
+                            break
+                        except asyncio.TimeoutError:
+                            yield _sse({"detail": "请求处理超时"}, event="error")
+                            return
+                        yield _sse({"delta": chunk})
+                yield _sse({}, event="done")
+            finally:
+                limiter.release()
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @app.post("/search")
+    async def search(request: SearchRequest) -> Dict[str, Any]:
+        limiter = await acquire_slot()
+        try:
+            docs: List = await run_with_timeout(state["system"].asearch(request.query, request.top_k))
+        finally:
+            limiter.release()
+        return {"query": request.query, "results": [_serialize_document(doc) for doc in docs]}
+
+    return app
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="RAG系统HTTP服务")
+    parser.add_argument("--host", default=DEFAULT_CONFIG.server_host, help="监听地址")
+    parser.add_argument("--port", type=int, default=DEFAULT_CONFIG.server_port, help="监听端口")
+    parser.add_argument("--max-concurrent", type=int, default=DEFAULT_CONFIG.max_concurrent_requests,
+                        help="同时处理的请求数上限")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_CONFIG.request_timeout, help="单个请求的超时秒数")
+    args = parser.parse_args()
+
+    config = RAGConfig(max_concurrent_requests=args.max_concurrent, request_timeout=args.timeout)
+    # 所有请求共享同一个事件循环和RAG系统实例，只能使用单个worker进程
+    uvicorn.run(create_app(config), host=args.host, port=args.port, workers=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 与 main.py / benchmark.py 一致，以 treatment_rag 目录为模块根
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,67 @@
+import time
+
+import numpy as np
+
+from rag_modules.answer_cache import SemanticAnswerCache
+
+
+def _unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _add(cache, embedding, answer="回答", index_version="v1", filters=None):
+    cache.add(question=answer, embedding=embedding, route="general", parent_ids=["p1"], answer=answer,
+              index_version=index_version, filters=filters)
+
+
+def test_lookup_hits_above_threshold_only():
+    cache = SemanticAnswerCache(threshold=0.95)
+    _add(cache, _unit(1, 0, 0))
+
+    assert cache.lookup(_unit(1, 0.1, 0), "v1").answer == "回答"
+    assert cache.lookup(_unit(1, 1, 0), "v1") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lookup_requires_same_index_version_and_filters():
+    cache = SemanticAnswerCache(threshold=0.9)
+    _add(cache, _unit(1, 0), answer="旧版本", index_version="v1")
+    _add(cache, _unit(1, 0.05), answer="骨折", index_version="v2", filters={"category": "骨折"})
+
+    assert cache.lookup(_unit(1, 0), "v2") is None
+    assert cache.lookup(_unit(1, 0), "v2", {"category": "骨折"}).answer == "骨折"
+    # 相似度更高的条目版本不一致时，继续查找次相近的条目
+    assert cache.lookup(_unit(1, 0), "v1").answer == "旧版本"
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache = SemanticAnswerCache(ttl=10)
+    _add(cache, _unit(1, 0))
+    now = [time.monotonic()]
+    monkeypatch.setattr("rag_modules.answer_cache.time.monotonic", lambda: now[0])
+
+    now[0] += 5
+    assert cache.lookup(_unit(1, 0), "v1") is not None
+    now[0] += 6
+    assert cache.lookup(_unit(1, 0), "v1") is None
+    assert len(cache) == 0
+
+
+def test_evicts_least_recently_hit_entry():
+    cache = SemanticAnswerCache(threshold=0.99, max_entries=2)
+    _add(cache, _unit(1, 0, 0), answer="a")
+    _add(cache, _unit(0, 1, 0), answer="b")
+    cache.lookup(_unit(1, 0, 0), "v1")
+    _add(cache, _unit(0, 0, 1), answer="c")
+
+    assert cache.lookup(_unit(0, 1, 0), "v1") is None
+    assert cache.lookup(_unit(1, 0, 0), "v1").answer == "a"
+    assert cache.lookup(_unit(0, 0, 1), "v1").answer == "c"
+
+
+def test_empty_answer_is_not_cached():
+    cache = SemanticAnswerCache()
+    _add(cache, _unit(1, 0), answer="")
+
+    assert len(cache) == 0
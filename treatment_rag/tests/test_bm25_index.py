@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from rag_modules.bm25_index import BM25Index
+from rag_modules.tokenization import WhitespaceTokenizer
+
+TEXTS = [
+    "lumbar disc herniation surgery",
+    "cervical disc degeneration",
+    "lumbar stenosis conservative treatment",
+    "spinal fracture surgery fixation surgery",
+    "osteoporosis medication",
+    "physical therapy exercise",
+]
+
+
+@pytest.fixture
+def index() -> BM25Index:
+    return BM25Index.build([Document(page_content=text) for text in TEXTS], tokenizer=WhitespaceTokenizer())
+
+
+def test_get_scores_matches_rank_bm25(index):
+    rank_bm25 = pytest.importorskip("rank_bm25")
+    reference = rank_bm25.BM25Okapi([text.split() for text in TEXTS])
+    query = ["lumbar", "surgery", "surgery", "unknown"]
+
+    np.testing.assert_allclose(index.get_scores(query), reference.get_scores(query), rtol=1e-5)
+
+
+def test_get_scores_without_known_terms_is_zero(index):
+    assert not index.get_scores(["unknown"]).any()
+
+
+def test_get_top_n_orders_by_score(index):
+    scores = index.get_scores(["surgery"])
+
+    top = index.get_top_n(["surgery"], 2)
+
+    assert list(top) == [3, 0]
+    assert scores[top[0]] > scores[top[1]]
+
+
+def test_save_load_round_trip(index, tmp_path):
+    index.save(str(tmp_path))
+
+    loaded = BM25Index.load(str(tmp_path))
+
+    query = ["lumbar", "surgery"]
+    np.testing.assert_allclose(loaded.get_scores(query), index.get_scores(query))
+    chunks = [Document(page_content=text) for text in TEXTS]
+    assert loaded.matches(chunks, WhitespaceTokenizer.name)
+    # 文档块或分词器变化时不复用
+    assert not loaded.matches(chunks[:-1], WhitespaceTokenizer.name)
+    assert not loaded.matches(chunks, "mixed-v2")
+
+
+def test_load_missing_index_returns_none(tmp_path):
+    assert BM25Index.load(str(tmp_path)) is None
+
+
+def test_get_top_n_with_mask_only_returns_selected_docs(index):
+    mask = np.array([False, True, True, False, False, False])
+
+    top = index.get_top_n(["lumbar", "disc"], 5, mask=mask)
+
+    # n大于候选数时只返回候选，序号仍是全量文档中的位置
+    assert sorted(top) == [1, 2]
+    assert index.get_top_n(["lumbar"], 3, mask=np.zeros(len(TEXTS), dtype=bool)).size == 0
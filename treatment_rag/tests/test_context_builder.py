@@ -0,0 +1,82 @@
+import pytest
+from langchain_core.documents import Document
+
+from rag_modules.context_builder import OMISSION_MARK, ContextBuilder, TokenCounter
+
+
+@pytest.fixture
+def builder() -> ContextBuilder:
+    # 不使用tiktoken，按字符估算：每个CJK字符1个token，每个章节额外开销2个token（省略标记）
+    return ContextBuilder(max_tokens=1000, min_doc_tokens=64, token_counter=TokenCounter(None))
+
+
+def _section(index: int, char: str, tokens: int = 10):
+    return index, char * tokens, tokens
+
+
+def test_allocate_gives_unused_share_to_other_docs(builder):
+    assert builder._allocate([(1.0, 10), (1.0, 1000)], 500) == [10, 490]
+
+
+def test_allocate_all_fit(builder):
+    assert builder._allocate([(1.0, 10), (0.5, 20)], 100) == [10, 20]
+
+
+def test_allocate_drops_low_score_doc_below_min_tokens(builder):
+    assert builder._allocate([(10.0, 1000), (0.1, 1000)], 500) == [500, 0]
+
+
+def test_pack_sections_all_fit_is_complete(builder):
+    sections = [_section(0, "甲"), _section(1, "乙")]
+
+    text, complete = builder._pack_sections(sections, 2 + 12 * 2)
+
+    assert text == "甲" * 10 + "\n" + "乙" * 10
+    assert complete
+
+
+def test_pack_sections_keeps_priority_sections_in_document_order(builder):
+    # 命中章节1，其次相邻的章节0，再次章节2
+    sections = [_section(1, "乙"), _section(0, "甲"), _section(2, "丙")]
+
+    text, complete = builder._pack_sections(sections, 30)
+
+    assert text.split("\n") == ["甲" * 10, "乙" * 10, OMISSION_MARK]
+    assert not complete
+
+
+def test_pack_sections_marks_gaps_on_both_sides(builder):
+    sections = [_section(1, "乙"), _section(0, "甲"), _section(2, "丙")]
+
+    text, _ = builder._pack_sections(sections, 16)
+
+    assert text.split("\n") == [OMISSION_MARK, "乙" * 10, OMISSION_MARK]
+
+
+def test_pack_sections_truncates_oversized_first_section(builder):
+    text, complete = builder._pack_sections([_section(0, "甲", 100)], 20)
+
+    assert text == "甲" * 14 + OMISSION_MARK
+    assert builder.token_counter.count(text) <= 20
+    assert not complete
+
+
+def test_pack_sections_without_budget(builder):
+    assert builder._pack_sections([_section(0, "甲")], 0) == ("", False)
+
+
+def test_build_numbers_documents_after_selection(builder):
+    builder.max_tokens = 400
+    docs = [Document(page_content=char * 300, metadata={"parent_id": pid})
+            for pid, char in (("a", "甲"), ("b", "乙"), ("c", "丙"))]
+    chunks = [Document(page_content="", metadata={"parent_id": pid, "chunk_index": 0, "rrf_score": score})
+              for pid, score in (("a", 1.0), ("b", 0.001), ("c", 0.5))]
+
+    packed = builder.build(docs, chunks, header_fn=lambda i, doc: f"[{i}] {doc.metadata['parent_id']}")
+
+    # 低分的b因预算不足未纳入，编号仍然连续
+    assert packed.documents == ["a", "c"]
+    assert packed.dropped == 1
+    assert "[1] a" in packed.text and "[2] c" in packed.text
+    assert "[3]" not in packed.text
+    assert packed.tokens_used <= 400
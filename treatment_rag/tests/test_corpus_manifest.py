@@ -0,0 +1,66 @@
+import os
+
+from rag_modules.corpus_manifest import CorpusManifest
+from rag_modules.data_preparation import DataPreparationModule
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def _built_corpus(tmp_path):
+    data_root = tmp_path / "data"
+    for name in ("a", "b", "c"):
+        _write(data_root / "fracture" / f"{name}.md", f"# 病例 {name}\n正文 {name}\n## 治疗\n方案 {name}")
+    module = DataPreparationModule(str(data_root))
+    module.load_documents()
+    module.chunk_documents()
+    manifest = CorpusManifest()
+    manifest.record_documents(data_root, module.documents, module.chunks)
+    return data_root, module, manifest
+
+
+def _chunk_ids(module, name):
+    return [chunk.metadata["chunk_id"] for chunk in module.chunks if chunk.metadata["source"].endswith(f"{name}.md")]
+
+
+def test_refresh_handles_new_modified_and_deleted_files(tmp_path):
+    data_root, module, manifest = _built_corpus(tmp_path)
+    old_a_ids, old_b_ids, c_ids = _chunk_ids(module, "a"), _chunk_ids(module, "b"), _chunk_ids(module, "c")
+
+    _write(data_root / "fracture" / "a.md", "# 病例 a\n修改后的正文")
+    os.remove(data_root / "fracture" / "b.md")
+    _write(data_root / "fracture" / "d.md", "# 病例 d\n新增正文")
+    # 只更新修改时间、内容不变的文件不重新处理
+    stat = os.stat(data_root / "fracture" / "c.md")
+    os.utime(data_root / "fracture" / "c.md", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    new_chunks, removed_ids = module.refresh_documents(manifest)
+
+    assert sorted(removed_ids) == sorted(old_a_ids + old_b_ids)
+    assert {chunk.metadata["source"].rsplit("/", 1)[-1] for chunk in new_chunks} == {"a.md", "d.md"}
+    assert sorted(doc.metadata["source"].rsplit("/", 1)[-1] for doc in module.documents) == ["a.md", "c.md", "d.md"]
+    assert _chunk_ids(module, "c") == c_ids
+    assert all(chunk_id not in module.chunk_index for chunk_id in old_a_ids + old_b_ids)
+    assert all(module.get_chunk_by_id(chunk.metadata["chunk_id"]) is chunk for chunk in new_chunks)
+    assert sorted(manifest.entries) == ["fracture/a.md", "fracture/c.md", "fracture/d.md"]
+
+
+def test_refresh_without_changes_is_a_no_op(tmp_path):
+    _, module, manifest = _built_corpus(tmp_path)
+    chunks_before = list(module.chunks)
+
+    assert module.refresh_documents(manifest) == ([], [])
+    assert module.chunks == chunks_before
+
+
+def test_manifest_save_and_load(tmp_path):
+    data_root, _, manifest = _built_corpus(tmp_path)
+    manifest.save(str(tmp_path / "index"))
+
+    loaded = CorpusManifest.load(str(tmp_path / "index"))
+
+    assert loaded.entries == manifest.entries
+    assert loaded.scan(data_root) == ([], [], [])
+    assert CorpusManifest.load(str(tmp_path / "missing")).entries == {}
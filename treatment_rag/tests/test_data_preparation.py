@@ -0,0 +1,113 @@
+import logging
+from concurrent.futures import Future
+
+import pytest
+from langchain_core.documents import Document
+
+import rag_modules.data_preparation as data_preparation
+from rag_modules.data_preparation import DataPreparationModule, iter_loaded_files, iter_markdown_files
+
+
+def _module(tmp_path) -> DataPreparationModule:
+    module = DataPreparationModule(str(tmp_path))
+    module.documents = [
+        Document(page_content="# 病例\n正文一\n## 治疗\n正文二",
+                 metadata={"parent_id": "p1", "category": "骨折", "case_report_id": "A"}),
+        Document(page_content="# 病例\n感染正文", metadata={"parent_id": "p2", "category": "感染", "case_report_id": "B"}),
+    ]
+    module.chunks = module.chunk_documents()
+    return module
+
+
+def test_store_round_trip_resolves_parent_bodies(tmp_path):
+    module = _module(tmp_path)
+    module.save_store(str(tmp_path / "store"))
+
+    loaded = DataPreparationModule(str(tmp_path))
+    assert loaded.load_store(str(tmp_path / "store"))
+
+    assert [chunk.metadata["chunk_id"] for chunk in loaded.chunks] == [chunk.metadata["chunk_id"] for chunk in module.chunks]
+    # 内存中只保留元数据占位，正文按需读取
+    assert all(doc.page_content == "" for doc in loaded.documents)
+    assert loaded.get_parent_by_id("p1").page_content.startswith("# 病例\n正文一")
+    assert loaded.get_chunk_by_id(loaded.chunks[0].metadata["chunk_id"]) is not None
+
+
+def test_filter_documents_by_category_returns_bodies_after_load(tmp_path):
+    module = _module(tmp_path)
+    module.save_store(str(tmp_path / "store"))
+
+    docs = module.filter_documents_by_category("感染")
+
+    assert [doc.page_content for doc in docs] == ["# 病例\n感染正文"]
+
+
+@pytest.mark.parametrize("num_workers", [1, 2])
+def test_iter_markdown_files_yields_in_order(tmp_path, num_workers, caplog):
+    md_files = []
+    for i in range(5):
+        md_file = tmp_path / "fracture" / f"case_{i}.md"
+        md_file.parent.mkdir(exist_ok=True)
+        md_file.write_text(f"# 病例 {i}\n正文 {i}", encoding="utf-8")
+        md_files.append(md_file)
+    module = DataPreparationModule(str(tmp_path))
+
+    with caplog.at_level(logging.INFO, logger="rag_modules.data_preparation"):
+        docs = list(iter_markdown_files(module, md_files, num_workers=num_workers, batch_size=2))
+
+    assert len(docs) == len(md_files)
+    assert [doc.page_content for doc in docs] == [module._load_file(f).page_content for f in md_files]
+    # 每批记录一次吞吐，最后记录汇总
+    assert sum("已加载" in message for message in caplog.messages) == 2
+    assert any("文件加载吞吐" in message for message in caplog.messages)
+
+
+def test_parent_stubs_are_the_only_metadata_copy(tmp_path):
+    module = _module(tmp_path)
+    module.save_store(str(tmp_path / "store"))
+
+    store = module.parent_store
+    assert not hasattr(store, "metadatas")
+    assert len(store) == 2
+    # 数据模块的父文档占位与存储持有的是同一批对象
+    assert all(doc is stub for doc, stub in zip(module.documents, store.stubs()))
+    assert module.parent_index["p1"] is store.stubs()[0]
+
+
+class _InlineExecutor:
+    """在当前进程内立即执行的进程池替身，记录提交次数"""
+
+    def __init__(self, max_workers, initializer, initargs):
+        initializer(*initargs)
+        self.submitted = 0
+        _InlineExecutor.instance = self
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_iter_loaded_files_submits_bounded_windows(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_preparation, "ProcessPoolExecutor", _InlineExecutor)
+    md_files = []
+    for i in range(10):
+        md_file = tmp_path / f"case_{i}.md"
+        md_file.write_text(f"# 病例 {i}", encoding="utf-8")
+        md_files.append(md_file)
+    module = DataPreparationModule(str(tmp_path))
+
+    results = iter_loaded_files(module, md_files, num_workers=2, batch_size=2)
+    first_file, first_doc = next(results)
+    # 只提交了在途窗口内的批次，而不是全部文件
+    assert first_file == md_files[0] and first_doc is not None
+    assert _InlineExecutor.instance.submitted == 2
+
+    rest = list(results)
+    assert _InlineExecutor.instance.submitted == 5
+    assert [md_file for md_file, _ in rest] == md_files[1:]
+    assert [doc.page_content for _, doc in rest] == [f"# 病例 {i}" for i in range(1, 10)]
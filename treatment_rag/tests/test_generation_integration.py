@@ -0,0 +1,75 @@
+import asyncio
+import threading
+
+import pytest
+
+from rag_modules.generation_integration import GenerationIntegrationModule
+
+parse = GenerationIntegrationModule._parse_query_analysis
+
+
+@pytest.mark.parametrize("response, expected", [
+    ('{"route": "list", "rewritten_query": "腰椎间盘突出 治疗方法"}', ("list", "腰椎间盘突出 治疗方法")),
+    ('```json\n{"route": "Detail", "rewritten_query": "小燕飞 动作步骤"}\n```', ("detail", "小燕飞 动作步骤")),
+    # 未知路由类型归为general，重写查询为空时使用原查询
+    ('{"route": "other", "rewritten_query": ""}', ("general", "原查询")),
+])
+def test_parse_json_response(response, expected):
+    assert parse(response, "原查询") == expected
+
+
+def test_parse_falls_back_to_text():
+    response = 'route: detail\nrewritten_query: 腰椎微创手术 过程'
+
+    assert parse(response, "原查询") == ("detail", "腰椎微创手术 过程")
+
+
+def test_parse_invalid_json_without_hints():
+    assert parse("{not json}", "原查询") == ("general", "原查询")
+
+
+class _EchoChain:
+    async def ainvoke(self, inputs):
+        return inputs["context"]
+
+    async def astream(self, inputs):
+        yield inputs["context"]
+
+
+def _module_recording_context_threads():
+    module = object.__new__(GenerationIntegrationModule)
+    module.basic_answer_chain = module.step_by_step_chain = _EchoChain()
+    module.context_threads = []
+
+    def build_context(docs, child_chunks=None):
+        module.context_threads.append(threading.get_ident())
+        return "上下文"
+
+    module._build_context = build_context
+    return module
+
+
+@pytest.mark.parametrize("method", ["agenerate_basic_answer", "agenerate_step_by_step_answer"])
+def test_async_generation_builds_context_off_event_loop(method):
+    module = _module_recording_context_threads()
+
+    async def run():
+        return await getattr(module, method)("问题", []), threading.get_ident()
+
+    answer, loop_thread = asyncio.run(run())
+
+    assert answer == "上下文"
+    assert module.context_threads and module.context_threads[0] != loop_thread
+
+
+@pytest.mark.parametrize("method", ["agenerate_basic_answer_stream", "agenerate_step_by_step_answer_stream"])
+def test_async_stream_builds_context_off_event_loop(method):
+    module = _module_recording_context_threads()
+
+    async def run():
+        return [chunk async for chunk in getattr(module, method)("问题", [])], threading.get_ident()
+
+    chunks, loop_thread = asyncio.run(run())
+
+    assert chunks == ["上下文"]
+    assert module.context_threads and module.context_threads[0] != loop_thread
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from rag_modules.embedding_cache import EmbeddingCache
+from rag_modules.index_construction import IndexConstructionModule
+from rag_modules.metadata_bitmap import MetadataBitmapIndex
+from rag_modules.vector_index import VectorIndexParams
+
+
+class _FakeEmbeddings:
+    dim = 8
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        rng = np.random.default_rng(abs(hash(text)) % (2 ** 32))
+        return rng.random(self.dim).tolist()
+
+
+def _module(index_type: str, cache_path=None) -> IndexConstructionModule:
+    # 跳过 __init__，避免加载真实嵌入模型
+    module = object.__new__(IndexConstructionModule)
+    module.embeddings = _FakeEmbeddings()
+    module.embedding_model = None
+    module.embedding_cache = EmbeddingCache(str(cache_path), namespace="fake") if cache_path else None
+    module.output_dim = _FakeEmbeddings.dim
+    module.index_params = VectorIndexParams(index_type=index_type)
+    module.vectorstore = None
+    return module
+
+
+@pytest.mark.parametrize("use_cache", [False, True])
+def test_embed_texts_empty_returns_empty_matrix(tmp_path, use_cache):
+    vectors = _module("flat", tmp_path if use_cache else None).embed_texts([])
+
+    assert vectors.shape == (0, _FakeEmbeddings.dim)
+    assert vectors.dtype == np.float32
+
+
+@pytest.mark.parametrize("use_cache", [False, True])
+def test_delete_all_documents_from_rebuilt_index_type(tmp_path, use_cache):
+    module = _module("hnsw", tmp_path if use_cache else None)
+    chunks = [Document(page_content=f"text {i}", metadata={"chunk_id": f"c{i}"}) for i in range(3)]
+    module.build_vector_index(chunks)
+
+    module.delete_documents(["c0", "c1", "c2"])
+
+    assert module.vectorstore.index.ntotal == 0
+    assert module.vectorstore.index_to_docstore_id == {}
+
+
+def test_delete_all_then_add_on_ivf_index():
+    module = _module("ivf_flat")
+    # 向量数足够训练单个聚类中心，确实建立IVF索引
+    chunks = [Document(page_content=f"text {i}", metadata={"chunk_id": f"c{i}", "category": "骨折"}) for i in range(40)]
+    module.build_vector_index(chunks)
+    assert "IVF" in type(module.vectorstore.index).__name__
+
+    module.delete_documents([chunk.metadata["chunk_id"] for chunk in chunks])
+    assert module.vectorstore.index.ntotal == 0
+    assert module.vector_bitmaps.num_docs == 0
+
+    # 全部删除后重建为空索引，仍可继续添加
+    new_chunks = [Document(page_content=f"new {i}", metadata={"chunk_id": f"n{i}", "category": "感染"}) for i in range(2)]
+    module.add_documents(new_chunks)
+    assert module.vectorstore.index.ntotal == 2
+    assert sorted(module.vectorstore.index_to_docstore_id.values()) == ["n0", "n1"]
+    assert list(module.vector_bitmaps.mask({"category": "感染"})) == [True, True]
+
+
+def test_vector_bitmaps_follow_incremental_changes_and_persist(tmp_path):
+    module = _module("flat")
+    module.index_save_path = str(tmp_path)
+    chunks = [Document(page_content=f"text {i}", metadata={"chunk_id": f"c{i}", "category": "骨折" if i % 2 else "感染"})
+              for i in range(6)]
+    module.build_vector_index(chunks[:4])
+
+    module.delete_documents(["c1", "c2"])
+    module.add_documents(chunks[4:])
+
+    rebuilt = IndexConstructionModule.build_vector_bitmaps(module.vectorstore)
+    for value in ("骨折", "感染"):
+        assert list(module.vector_bitmaps.mask({"category": value})) == list(rebuilt.mask({"category": value}))
+
+    module.vector_bitmaps.save(str(tmp_path))
+    loaded = MetadataBitmapIndex.load(str(tmp_path))
+    assert list(loaded.mask({"category": "骨折"})) == list(rebuilt.mask({"category": "骨折"}))
+
+
+def test_docstore_shares_chunk_objects(tmp_path):
+    module = _module("flat")
+    chunks = [Document(page_content=f"text {i}", metadata={"chunk_id": f"c{i}"}) for i in range(3)]
+    module.build_vector_index(chunks[:2])
+    module.add_documents(chunks[2:])
+
+    store = module.vectorstore.docstore._dict
+    assert all(store[chunk.metadata["chunk_id"]] is chunk for chunk in chunks)
+
+    # 热启动时子块从文档存储另行加载，替换后docstore引用同一批对象
+    reloaded = [Document(page_content=chunk.page_content, metadata=dict(chunk.metadata)) for chunk in chunks]
+    reloaded[0] = Document(page_content="changed", metadata={"chunk_id": "c0"})
+    assert module.share_chunk_documents(reloaded) == 2
+    assert store["c0"] is chunks[0]
+    assert store["c1"] is reloaded[1]
+
+    # 不支持直接删除的索引按剩余子块重建后，docstore仍引用原子块对象
+    module.index_params = VectorIndexParams(index_type="hnsw")
+    module.delete_documents(["c1"])
+    store = module.vectorstore.docstore._dict
+    assert store["c0"] is chunks[0] and store["c2"] is reloaded[2]
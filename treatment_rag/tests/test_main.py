@@ -0,0 +1,216 @@
+import asyncio
+import threading
+
+import pytest
+from langchain_core.documents import Document
+
+import rag_modules.embedding_registry as embedding_registry
+from config import RAGConfig
+from main import RecipeRAGSystem
+from rag_modules.embedding_registry import EmbeddingModelRegistry
+from rag_modules.index_construction import IndexConstructionModule
+
+MODEL_NAME = "fake-model"
+
+
+class _FakeSentenceTransformer:
+    loads = 0
+
+    def __init__(self, model_name):
+        _FakeSentenceTransformer.loads += 1
+
+    def get_sentence_embedding_dimension(self):
+        return 8
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    monkeypatch.setattr(embedding_registry, "SentenceTransformer", _FakeSentenceTransformer)
+    _FakeSentenceTransformer.loads = 0
+    yield
+    while EmbeddingModelRegistry.ref_count(MODEL_NAME):
+        EmbeddingModelRegistry.release(MODEL_NAME)
+
+
+def _system(tmp_path) -> RecipeRAGSystem:
+    # 跳过 __init__，只装配 close() 涉及的模块
+    system = object.__new__(RecipeRAGSystem)
+    system.async_executor = None
+    system.search_executor = None
+    system.case_report_retrieval_module = None
+    system.guideline_retrieval_module = None
+    system.index_module = IndexConstructionModule(MODEL_NAME, str(tmp_path / "case_report"))
+    system.guideline_index_module = IndexConstructionModule(MODEL_NAME, str(tmp_path / "guidelines"))
+    return system
+
+
+def test_close_releases_shared_embedding_model(fake_model, tmp_path):
+    system = _system(tmp_path)
+    assert _FakeSentenceTransformer.loads == 1
+    assert EmbeddingModelRegistry.ref_count(MODEL_NAME) == 2
+
+    system.close()
+
+    assert EmbeddingModelRegistry.ref_count(MODEL_NAME) == 0
+    assert system.index_module.embedding_model is None
+    assert system.guideline_index_module.embedding_model is None
+
+
+def test_close_is_idempotent(fake_model, tmp_path):
+    system = _system(tmp_path)
+    system.close()
+    system.close()
+
+    assert EmbeddingModelRegistry.ref_count(MODEL_NAME) == 0
+    # 卸载后再次获取会重新加载模型
+    IndexConstructionModule(MODEL_NAME, str(tmp_path / "again"))
+    assert _FakeSentenceTransformer.loads == 2
+
+
+def test_index_modules_share_query_cache(fake_model, tmp_path):
+    first = IndexConstructionModule(MODEL_NAME, str(tmp_path / "a"), query_cache_mb=1)
+    second = IndexConstructionModule(MODEL_NAME, str(tmp_path / "b"), query_cache_mb=1)
+    truncated = IndexConstructionModule(MODEL_NAME, str(tmp_path / "c"), embedding_dim=4, query_cache_mb=1)
+
+    assert first.query_cache is not None
+    assert second.query_cache is first.query_cache
+    assert second.embeddings.query_cache is first.query_cache
+    # 截断维度不同的向量不能互相命中
+    assert truncated.query_cache is not first.query_cache
+
+    for module in (first, second, truncated):
+        module.release_embeddings()
+    assert EmbeddingModelRegistry.ref_count(MODEL_NAME) == 0
+
+    # 模型卸载后缓存一并丢弃，重新加载时得到新的缓存
+    reloaded = IndexConstructionModule(MODEL_NAME, str(tmp_path / "d"), query_cache_mb=1)
+    assert reloaded.query_cache is not first.query_cache
+
+
+def test_query_cache_stats(fake_model, tmp_path):
+    system = _system(tmp_path)
+    assert system.query_cache_stats() is None
+    system.close()
+
+    system.index_module = IndexConstructionModule(MODEL_NAME, str(tmp_path / "a"), query_cache_mb=1)
+    system.guideline_index_module = IndexConstructionModule(MODEL_NAME, str(tmp_path / "b"), query_cache_mb=1)
+    system.index_module.query_cache.get("腰椎间盘突出")
+
+    assert system.query_cache_stats()["misses"] == 1
+    system.close()
+
+
+class _FakeGeneration:
+    def __init__(self, rewritten_query: str):
+        self.rewritten_query = rewritten_query
+
+    def analyze_query(self, question):
+        return "detail", self.rewritten_query
+
+    async def aanalyze_query(self, question):
+        return self.analyze_query(question)
+
+    def generate_step_by_step_answer(self, question, docs, chunks):
+        return "|".join(chunk.page_content for chunk in chunks)
+
+    async def agenerate_step_by_step_answer(self, question, docs, chunks):
+        return self.generate_step_by_step_answer(question, docs, chunks)
+
+
+class _FakeRetrieval:
+    def __init__(self, fail_first: bool = False):
+        self.fail_first = fail_first
+        self.queries = []
+        self.bm25_index = type("_Index", (), {"fingerprint": "f"})()
+
+    def hybrid_search(self, query, top_k=3):
+        self.queries.append(query)
+        if self.fail_first and len(self.queries) == 1:
+            raise RuntimeError("预检索失败")
+        return [Document(page_content=f"结果:{query}", metadata={"case_report_id": "X", "parent_id": "p1"})]
+
+    def close(self):
+        pass
+
+
+class _FakeDataModule:
+    @staticmethod
+    def get_parent_documents(chunks):
+        return chunks
+
+
+class _FakeQueryEmbeddings:
+    VECTORS = {"腰痛怎么治": [1.0, 0.0], "腰痛如何治疗": [0.99, 0.05], "颈椎病手术": [0.0, 1.0]}
+
+    def embed_query(self, text):
+        return self.VECTORS[text]
+
+
+class _FakeIndexModule:
+    embeddings = _FakeQueryEmbeddings()
+
+    def release_embeddings(self):
+        pass
+
+
+def _speculative_system(rewritten_query: str, fail_first: bool = False) -> RecipeRAGSystem:
+    # 跳过 __init__，只装配问答流程涉及的模块
+    system = object.__new__(RecipeRAGSystem)
+    system.config = RAGConfig(speculative_retrieval=True, combined_query_analysis=True)
+    system.async_executor = None
+    system.search_executor = None
+    system.pending_blocking_tasks = 0
+    system._pending_lock = threading.Lock()
+    system.answer_cache = None
+    system.query_router = None
+    system.generation_module = _FakeGeneration(rewritten_query)
+    system.case_report_retrieval_module = system.guideline_retrieval_module = _FakeRetrieval(fail_first)
+    system.case_report_data_module = _FakeDataModule()
+    system.index_module = _FakeIndexModule()
+    system.guideline_index_module = None
+    return system
+
+
+def _ask(system, use_async: bool):
+    if use_async:
+        return asyncio.run(system.aask_question("腰痛怎么治"))
+    return system.ask_question("腰痛怎么治")
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+@pytest.mark.parametrize("rewritten_query", ["腰痛怎么治", "腰痛如何治疗"])
+def test_speculative_result_reused_for_same_or_similar_rewrite(rewritten_query, use_async):
+    system = _speculative_system(rewritten_query)
+    try:
+        answer = _ask(system, use_async)
+    finally:
+        system.close()
+
+    # 只用原问题检索一次，不再按重写后的查询重新检索
+    assert system.case_report_retrieval_module.queries == ["腰痛怎么治"]
+    assert answer == "结果:腰痛怎么治"
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_speculative_result_discarded_for_different_rewrite(use_async):
+    system = _speculative_system("颈椎病手术")
+    try:
+        answer = _ask(system, use_async)
+    finally:
+        system.close()
+
+    assert system.case_report_retrieval_module.queries[-1] == "颈椎病手术"
+    assert answer == "结果:颈椎病手术"
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_failed_speculative_search_falls_back_to_rewritten_query(use_async):
+    system = _speculative_system("腰痛怎么治", fail_first=True)
+    try:
+        answer = _ask(system, use_async)
+    finally:
+        system.close()
+
+    assert system.case_report_retrieval_module.queries == ["腰痛怎么治", "腰痛怎么治"]
+    assert answer == "结果:腰痛怎么治"
+    assert system.pending_blocking_tasks == 0
@@ -0,0 +1,73 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from rag_modules.metadata_bitmap import MetadataBitmapIndex
+
+
+def _docs():
+    return [
+        Document(page_content="", metadata={"category": "骨折", "doc_type": "case"}),
+        Document(page_content="", metadata={"category": "感染", "doc_type": "case"}),
+        None,  # 向量库中缺失的文档
+        Document(page_content="", metadata={"category": "骨折", "doc_type": "guideline", "tags": ["a"]}),
+    ] + [Document(page_content="", metadata={"category": "其他类型疾病"}) for _ in range(6)]
+
+
+def test_mask_single_value_and_list_union():
+    index = MetadataBitmapIndex.build(_docs())
+
+    assert list(np.flatnonzero(index.mask({"category": "骨折"}))) == [0, 3]
+    assert list(np.flatnonzero(index.mask({"category": ["骨折", "感染"]}))) == [0, 1, 3]
+    assert not index.mask({"category": "不存在"}).any()
+
+
+def test_mask_intersects_fields():
+    index = MetadataBitmapIndex.build(_docs())
+
+    assert list(np.flatnonzero(index.mask({"category": "骨折", "doc_type": "case"}))) == [0]
+
+
+def test_packed_mask_uses_little_bit_order_across_bytes():
+    index = MetadataBitmapIndex.build(_docs())
+
+    packed = index.packed_mask({"category": "其他类型疾病"})
+
+    assert len(packed) == 2
+    assert list(np.flatnonzero(np.unpackbits(packed, count=index.num_docs, bitorder='little'))) == list(range(4, 10))
+
+
+def test_unindexed_field_returns_none():
+    index = MetadataBitmapIndex.build(_docs(), fields=("category",))
+
+    assert not index.supports({"doc_type": "case"})
+    assert index.mask({"category": "骨折", "doc_type": "case"}) is None
+    assert index.packed_mask({"doc_type": "case"}) is None
+
+
+def _assert_same(index: MetadataBitmapIndex, expected: MetadataBitmapIndex):
+    assert index.num_docs == expected.num_docs
+    for field, values in expected.bitmaps.items():
+        assert set(index.bitmaps[field]) == set(values)
+        for value in values:
+            assert list(index.mask({field: value})) == list(expected.mask({field: value}))
+
+
+def test_append_and_delete_rows_match_rebuild():
+    docs = _docs()
+    index = MetadataBitmapIndex.build(docs[:3])
+
+    index.append(docs[3:])
+    _assert_same(index, MetadataBitmapIndex.build(docs))
+
+    index.delete_rows([1, 4])
+    _assert_same(index, MetadataBitmapIndex.build([doc for i, doc in enumerate(docs) if i not in (1, 4)]))
+    # 取值不再出现时移除其位图
+    assert "感染" not in index.bitmaps["category"]
+
+
+def test_save_load_round_trip(tmp_path):
+    index = MetadataBitmapIndex.build(_docs())
+    index.save(str(tmp_path))
+
+    _assert_same(MetadataBitmapIndex.load(str(tmp_path)), index)
+    assert MetadataBitmapIndex.load(str(tmp_path / "missing")) is None
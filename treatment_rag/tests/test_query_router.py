@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from rag_modules.query_router import EmbeddingQueryRouter
+
+# 按关键词映射到固定方向的假嵌入，保证路由结果可预测
+KEYWORD_AXES = {"推荐": 0, "步骤": 1, "什么是": 2}
+
+
+class _FakeEmbeddings:
+    def __init__(self):
+        self.document_calls = 0
+
+    def embed_query(self, text):
+        vector = np.full(4, 0.01, dtype=np.float32)
+        for keyword, axis in KEYWORD_AXES.items():
+            if keyword in text:
+                vector[axis] = 1.0
+        if not any(keyword in text for keyword in KEYWORD_AXES):
+            vector[3] = 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        self.document_calls += 1
+        return [self.embed_query(text) for text in texts]
+
+
+EXAMPLES = {
+    "list": ["推荐几种膏药", "推荐治疗方法"],
+    "detail": ["康复操的步骤", "手术步骤"],
+    "general": ["什么是椎管狭窄", "什么是骨质疏松"],
+}
+
+
+@pytest.fixture
+def router():
+    return EmbeddingQueryRouter(_FakeEmbeddings(), examples=EXAMPLES)
+
+
+@pytest.mark.parametrize("query, label", [
+    ("推荐几种治疗颈椎病的药", "list"),
+    ("小燕飞的步骤", "detail"),
+    ("什么是腰椎滑脱", "general"),
+])
+def test_route_confident(router, query, label):
+    route, margin = router.route(query)
+
+    assert route == label
+    assert margin >= router.min_margin
+
+
+def test_route_low_confidence_returns_none(router):
+    route, _ = router.route("腰痛")
+
+    assert route is None
+
+
+def test_route_reuses_query_vector_and_prototypes(router):
+    embeddings = router.embeddings
+    vector = embeddings.embed_query("推荐")
+
+    router.route("任意文本", query_vector=vector)
+    route, _ = router.route("任意文本", query_vector=vector)
+
+    assert route == "list"
+    assert embeddings.document_calls == len(EXAMPLES)
+
+
+def test_add_examples_rebuilds_prototypes(router):
+    router.route("推荐")
+    router.add_examples("detail", ["具体步骤"])
+    router.route("推荐")
+
+    assert router.embeddings.document_calls == 2 * len(EXAMPLES)
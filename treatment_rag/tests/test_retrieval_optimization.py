@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from rag_modules.retrieval_optimization import RetrievalOptimizationModule
+
+
+def _chunk(chunk_id: str) -> Document:
+    return Document(page_content=f"text {chunk_id}", metadata={"chunk_id": chunk_id, "parent_id": "p"})
+
+
+def test_rrf_rerank_scores_copies_not_shared_docs():
+    a, b, c = _chunk("a"), _chunk("b"), _chunk("c")
+    module = object.__new__(RetrievalOptimizationModule)
+
+    reranked = module._rrf_rerank([a, b], [b, c])
+
+    assert [doc.metadata["chunk_id"] for doc in reranked] == ["b", "a", "c"]
+    assert reranked[0].metadata["rrf_score"] == 1 / 61 + 1 / 62
+    # 共享的docstore/BM25文档对象不被修改
+    assert all("rrf_score" not in doc.metadata for doc in (a, b, c))
+    assert all(doc is not original for doc, original in zip(reranked, (b, a, c)))
+
+
+def test_vector_document_skips_missing_docstore_ids():
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+
+    class _Store:
+        docstore = InMemoryDocstore({"a": _chunk("a")})
+        index_to_docstore_id = {0: "a", 1: "missing"}
+
+    module = object.__new__(RetrievalOptimizationModule)
+    module.vectorstore = _Store()
+
+    assert module._vector_document(0).metadata["chunk_id"] == "a"
+    # docstore 对缺失ID返回提示字符串而不是Document
+    assert module._vector_document(1) is None
+    assert module._vector_document(2) is None
+
+
+class _FakeEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        rng = np.random.default_rng(sum(map(ord, text)))
+        return rng.random(8).tolist()
+
+
+def _vectorstore(chunks):
+    return FAISS.from_documents(chunks, _FakeEmbeddings())
+
+
+def test_shared_executor_survives_module_close():
+    chunks = [_chunk(chunk_id) for chunk_id in "abcd"]
+    vectorstore = _vectorstore(chunks)
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        first = RetrievalOptimizationModule(vectorstore, chunks, executor=executor)
+        first.close()
+        # 知识库刷新时旧模块被关闭，新模块继续使用同一线程池
+        second = RetrievalOptimizationModule(vectorstore, chunks, executor=executor)
+        assert second.executor is executor
+        assert len(second.hybrid_search("text a", top_k=2)) == 2
+        second.close()
+        assert executor.submit(lambda: 1).result() == 1
+    finally:
+        executor.shutdown()
+
+
+def test_module_closes_only_its_own_executor():
+    chunks = [_chunk(chunk_id) for chunk_id in "ab"]
+    vectorstore = _vectorstore(chunks)
+
+    owned = RetrievalOptimizationModule(vectorstore, chunks)
+    owned.close()
+    assert owned.executor._shutdown
+
+    sequential = RetrievalOptimizationModule(vectorstore, chunks, concurrent=False)
+    assert sequential.executor is None
+    assert len(sequential.hybrid_search("text a", top_k=2)) == 2
+    sequential.close()
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+
+import server
+from config import RAGConfig
+
+
+class _FakeSystem:
+    """只实现服务端用到的接口的RAG系统替身"""
+
+    def __init__(self, config=None, answer_delay: float = 0.0):
+        self.config = config
+        self.answer_delay = answer_delay
+        self.case_report_retrieval_module = object()
+        self.pending_blocking_tasks = 0
+        self.answer_cache = None
+        self.closed = 0
+
+    def query_cache_stats(self):
+        return {"entries": 1, "hits": 2, "misses": 1}
+
+    async def aask_question(self, question, stream=False):
+        await asyncio.sleep(self.answer_delay)
+        if not stream:
+            return f"回答: {question}"
+
+        async def chunks():
+            yield "第一段"
+            yield "第二段"
+        return chunks()
+
+    async def asearch(self, query, top_k=None):
+        return [Document(page_content="正文", metadata={"chunk_id": "c1", "score": 0.5, "ignored": object()})]
+
+    def close(self):
+        self.closed += 1
+
+
+def _wait_for_status(client, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        health = client.get("/health").json()
+        if health["status"] == status:
+            return health
+        time.sleep(0.01)
+    pytest.fail(f"服务状态未变为 {status}")
+
+
+def test_health_ask_and_search_when_ready():
+    system = _FakeSystem()
+    with TestClient(server.create_app(RAGConfig(), system)) as client:
+        health = client.get("/health").json()
+        assert health["status"] == "ok"
+        assert health["query_cache"]["hits"] == 2
+
+        assert client.post("/ask", json={"question": "腰痛"}).json()["answer"] == "回答: 腰痛"
+        results = client.post("/search", json={"query": "腰痛"}).json()["results"]
+        assert results == [{"content": "正文", "metadata": {"chunk_id": "c1", "score": 0.5}}]
+    # 服务关闭时释放RAG系统
+    assert system.closed == 1
+
+
+def test_stream_emits_deltas_then_done():
+    with TestClient(server.create_app(RAGConfig(), _FakeSystem())) as client:
+        body = client.post("/ask/stream", json={"question": "腰痛"}).text
+
+    assert body.count("data: {\"delta\"") == 2
+    assert body.rstrip().endswith("event: done\ndata: {}")
+
+
+def test_rejects_when_blocking_backlog_is_full():
+    system = _FakeSystem()
+    config = RAGConfig(max_pending_blocking_tasks=2)
+    with TestClient(server.create_app(config, system)) as client:
+        system.pending_blocking_tasks = 2
+        response = client.post("/ask", json={"question": "腰痛"})
+        health = client.get("/health").json()
+
+    assert response.status_code == 503
+    assert health["rejected"] == 1
+
+
+def test_slow_request_times_out():
+    config = RAGConfig(request_timeout=0.05)
+    with TestClient(server.create_app(config, _FakeSystem(answer_delay=1.0))) as client:
+        response = client.post("/ask", json={"question": "腰痛"})
+        assert response.status_code == 504
+        assert client.get("/health").json()["in_flight"] == 0
+
+
+def test_background_build_reports_starting_then_ok(monkeypatch):
+    release_build = threading.Event()
+
+    class _SlowSystem(_FakeSystem):
+        def initialize_system(self):
+            release_build.wait(5)
+
+        def build_knowledge_base(self):
+            pass
+
+    monkeypatch.setattr(server, "RecipeRAGSystem", _SlowSystem)
+    with TestClient(server.create_app(RAGConfig())) as client:
+        assert client.get("/health").json()["status"] == "starting"
+        assert client.post("/ask", json={"question": "腰痛"}).status_code == 503
+
+        release_build.set()
+        _wait_for_status(client, "ok")
+        assert client.post("/ask", json={"question": "腰痛"}).status_code == 200
+
+
+def test_failed_build_reports_error_and_releases_system(monkeypatch):
+    built = []
+
+    class _BrokenSystem(_FakeSystem):
+        def __init__(self, config=None):
+            super().__init__(config)
+            built.append(self)
+
+        def initialize_system(self):
+            raise RuntimeError("模型加载失败")
+
+    monkeypatch.setattr(server, "RecipeRAGSystem", _BrokenSystem)
+    with TestClient(server.create_app(RAGConfig())) as client:
+        _wait_for_status(client, "error")
+        response = client.post("/ask", json={"question": "腰痛"})
+
+    assert response.status_code == 503
+    assert "模型加载失败" in response.json()["detail"]
+    assert built[0].closed == 1
@@ -0,0 +1,113 @@
+import pytest
+
+from rag_modules.tokenization import MixedLanguageTokenizer, TokenCache, get_tokenizer, light_stem
+
+
+@pytest.fixture
+def tokenizer():
+    return MixedLanguageTokenizer()
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("颈椎C4-C5节段突出", ["c4-c5", "c4", "c5"]),
+    ("腰椎L5/S1突出", ["l5-s1", "l5", "s1"]),
+    ("cervical C4-C5 disc", ["c4-c5", "c4", "c5"]),
+    ("T12-L1骨折", ["t12-l1", "t12", "l1"]),
+])
+def test_spine_segments_kept_together(tokenizer, text, expected):
+    tokens = tokenizer(text)
+    start = tokens.index(expected[0])
+    assert tokens[start:start + len(expected)] == expected
+
+
+def test_segment_inside_cjk_matches_english(tokenizer):
+    chinese = set(tokenizer("颈椎C4-C5节段突出"))
+    english = set(tokenizer("cervical C4-C5 herniation"))
+    assert {"c4-c5", "c4", "c5"} <= chinese & english
+
+
+def test_acronym_next_to_cjk(tokenizer):
+    assert "mri" in tokenizer("MRI显示脊髓受压")
+    assert "nsaid" in tokenizer("口服NSAIDs治疗")
+
+
+def test_cjk_ngrams_and_stopwords(tokenizer):
+    tokens = tokenizer("腰痛 the pain")
+    assert {"腰", "痛", "腰痛", "pain"} <= set(tokens)
+    assert "the" not in tokens
+
+
+@pytest.mark.parametrize("singular, plural", [
+    ("disease", "diseases"),
+    ("case", "cases"),
+    ("fuse", "fused"),
+    ("fuse", "fusing"),
+    ("treat", "treated"),
+    ("study", "studies"),
+    ("class", "classes"),
+    ("stop", "stopped"),
+    ("box", "boxes"),
+])
+def test_light_stem_merges_inflections(singular, plural):
+    assert light_stem(singular) == light_stem(plural)
+
+
+def test_light_stem_keeps_short_words():
+    assert light_stem("use") == "use"
+    assert light_stem("uses") == "use"
+    assert light_stem("need") == "need"
+
+
+def test_get_tokenizer_accepts_config_alias():
+    assert isinstance(get_tokenizer("mixed"), MixedLanguageTokenizer)
+    assert isinstance(get_tokenizer(MixedLanguageTokenizer.name), MixedLanguageTokenizer)
+    with pytest.raises(ValueError):
+        get_tokenizer("unknown")
+
+
+def _fail_tokenizer(text):
+    raise AssertionError(f"不应重新分词: {text}")
+
+
+def test_token_cache_load_is_lazy(tmp_path):
+    cache = TokenCache.load(str(tmp_path), "mixed-v2")
+
+    # 未查询前不读取磁盘，也不视为有变化
+    assert not cache._loaded
+    cache.save(str(tmp_path))
+    assert not list(tmp_path.iterdir())
+
+
+def test_token_cache_round_trip_and_prune(tmp_path, tokenizer):
+    texts = ["颈椎C4-C5节段突出", "lumbar disc herniation"]
+    cache = TokenCache.load(str(tmp_path), tokenizer.name)
+    expected = [cache.tokenize(text, tokenizer) for text in texts]
+    cache.prune({TokenCache.text_key(text) for text in texts})
+    cache.save(str(tmp_path))
+
+    reloaded = TokenCache.load(str(tmp_path), tokenizer.name)
+    assert [reloaded.tokenize(text, _fail_tokenizer) for text in texts] == expected
+    assert (reloaded.hits, reloaded.misses) == (2, 0)
+
+    # 内容未变化时不重写
+    mtime = (tmp_path / TokenCache.IDS_FILE).stat().st_mtime_ns
+    reloaded.prune({TokenCache.text_key(text) for text in texts})
+    reloaded.save(str(tmp_path))
+    assert (tmp_path / TokenCache.IDS_FILE).stat().st_mtime_ns == mtime
+
+    reloaded.prune({TokenCache.text_key(texts[0])})
+    reloaded.save(str(tmp_path))
+    pruned = TokenCache.load(str(tmp_path), tokenizer.name)
+    assert pruned.tokenize(texts[0], _fail_tokenizer) == expected[0]
+    assert pruned.tokenize(texts[1], tokenizer) == expected[1]
+    assert pruned.misses == 1
+
+
+def test_token_cache_ignores_other_tokenizer(tmp_path, tokenizer):
+    cache = TokenCache.load(str(tmp_path), tokenizer.name)
+    cache.tokenize("腰椎", tokenizer)
+    cache.save(str(tmp_path))
+
+    other = TokenCache.load(str(tmp_path), "whitespace")
+    assert other.tokenize("腰椎", str.split) == ["腰椎"]
+    assert other.misses == 1
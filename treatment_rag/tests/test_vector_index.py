@@ -0,0 +1,36 @@
+import faiss
+import numpy as np
+
+from rag_modules.vector_index import VectorIndexParams, create_index, ensure_direct_map, filtered_search, train_index
+
+
+def _ivf_index(vectors: np.ndarray) -> faiss.Index:
+    index = create_index(vectors.shape[1], len(vectors), VectorIndexParams(index_type="ivf_flat", nlist=8))
+    train_index(index, vectors, sample_size=len(vectors))
+    return index
+
+
+def test_ensure_direct_map_before_add_keeps_map_in_sync():
+    vectors = np.random.default_rng(0).random((400, 8), dtype=np.float32)
+    index = _ivf_index(vectors)
+    ensure_direct_map(index)
+    index.add(vectors)
+
+    assert faiss.extract_index_ivf(index).direct_map.type != faiss.DirectMap.NoMap
+    np.testing.assert_allclose(index.reconstruct_batch(np.array([3, 399])), vectors[[3, 399]])
+    # 重复调用不重建
+    ensure_direct_map(index)
+
+
+def test_filtered_search_exact_path_on_ivf():
+    vectors = np.random.default_rng(1).random((400, 8), dtype=np.float32)
+    index = _ivf_index(vectors)
+    ensure_direct_map(index)
+    index.add(vectors)
+
+    mask = np.zeros(len(vectors), dtype=bool)
+    mask[::2] = True
+    ids = filtered_search(index, vectors[10], 3, np.packbits(mask, bitorder='little'))
+
+    assert ids[0] == 10
+    assert all(i % 2 == 0 for i in ids)